@@ -0,0 +1,223 @@
+# action_memory.py
+from __future__ import annotations
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple, Union
+from urllib.parse import urlsplit
+
+# keys that hold live handles rather than element attributes
+_VOLATILE_KEYS = ("element",)
+
+
+class ActionStore:
+    """
+    Per-domain memory of the element attributes that completed a step.
+
+    One row per (domain, action, element); the element is stored exactly as
+    it was handed to `click_button_by_attrs` / `add_text_to_field` (minus live
+    handles). Confidence rises on success and halves on failure, and decays
+    with a `half_life` in days, so a redesigned shop stops being trusted;
+    entries below `min_confidence` are evicted and at most `max_per_action`
+    are kept for each domain and action.
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path] = "./action_memory.sqlite3",
+        *,
+        half_life: float = 30.0,
+        min_confidence: float = 0.15,
+        max_per_action: int = 5,
+    ) -> None:
+        self.path = str(path)
+        self.half_life = half_life
+        self.min_confidence = min_confidence
+        self.max_per_action = max_per_action
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS actions ("
+                " domain TEXT NOT NULL, action TEXT NOT NULL, fingerprint TEXT NOT NULL, attrs TEXT NOT NULL,"
+                " confidence REAL NOT NULL, successes INTEGER NOT NULL, failures INTEGER NOT NULL, updated REAL NOT NULL,"
+                " PRIMARY KEY (domain, action, fingerprint))"
+            )
+
+    def recall(self, url: str, action: str) -> List[Any]:
+        """Remembered elements for *action* on *url*'s domain, most trusted first."""
+        domain, now = domain_of(url), time.time()
+        with self._lock, self._conn:
+            rows = self._conn.execute(
+                "SELECT fingerprint, attrs, confidence, updated FROM actions WHERE domain = ? AND action = ?",
+                (domain, action),
+            ).fetchall()
+            kept = []
+            for fp, attrs, confidence, updated in rows:
+                current = self._decayed(confidence, updated, now)
+                if current < self.min_confidence:
+                    self._conn.execute(
+                        "DELETE FROM actions WHERE domain = ? AND action = ? AND fingerprint = ?", (domain, action, fp)
+                    )
+                else:
+                    kept.append((current, json.loads(attrs)))
+        kept.sort(key=lambda row: -row[0])
+        return [attrs for _, attrs in kept]
+
+    def success(self, url: str, action: str, item: Any) -> None:
+        """Store *item* for *action* on *url*'s domain, or raise its confidence."""
+        domain, item, now = domain_of(url), _portable(item), time.time()
+        fp = fingerprint(item)
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT confidence, updated FROM actions WHERE domain = ? AND action = ? AND fingerprint = ?",
+                (domain, action, fp),
+            ).fetchone()
+            if row is None:
+                confidence = 0.6
+            else:
+                confidence = self._decayed(*row, now)
+                confidence += (1.0 - confidence) * 0.5
+            self._conn.execute(
+                "INSERT INTO actions (domain, action, fingerprint, attrs, confidence, successes, failures, updated)"
+                " VALUES (?, ?, ?, ?, ?, 1, 0, ?)"
+                " ON CONFLICT (domain, action, fingerprint) DO UPDATE SET"
+                " attrs = excluded.attrs, confidence = excluded.confidence, successes = successes + 1, updated = excluded.updated",
+                (domain, action, fp, json.dumps(item, sort_keys=True), confidence, now),
+            )
+            self._trim(domain, action)
+
+    def failure(self, url: str, action: str, item: Any) -> None:
+        """Halve the confidence of a remembered element; no-op for elements never stored."""
+        domain, now = domain_of(url), time.time()
+        fp = fingerprint(item)
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT confidence, updated FROM actions WHERE domain = ? AND action = ? AND fingerprint = ?",
+                (domain, action, fp),
+            ).fetchone()
+            if row is None:
+                return
+            confidence = self._decayed(*row, now) * 0.5
+            if confidence < self.min_confidence:
+                self._conn.execute(
+                    "DELETE FROM actions WHERE domain = ? AND action = ? AND fingerprint = ?", (domain, action, fp)
+                )
+            else:
+                self._conn.execute(
+                    "UPDATE actions SET confidence = ?, failures = failures + 1, updated = ?"
+                    " WHERE domain = ? AND action = ? AND fingerprint = ?",
+                    (confidence, now, domain, action, fp),
+                )
+
+    def invalidate(self, url: Optional[str] = None, action: Optional[str] = None) -> None:
+        """Forget everything, one domain, or one action of one domain."""
+        with self._lock, self._conn:
+            if url is None:
+                self._conn.execute("DELETE FROM actions")
+            elif action is None:
+                self._conn.execute("DELETE FROM actions WHERE domain = ?", (domain_of(url),))
+            else:
+                self._conn.execute("DELETE FROM actions WHERE domain = ? AND action = ?", (domain_of(url), action))
+
+    def _decayed(self, confidence: float, updated: float, now: float) -> float:
+        return confidence * 0.5 ** (max(0.0, now - updated) / (self.half_life * 86400))
+
+    def _trim(self, domain: str, action: str) -> None:
+        # caller holds the lock
+        self._conn.execute(
+            "DELETE FROM actions WHERE domain = ? AND action = ? AND fingerprint NOT IN ("
+            " SELECT fingerprint FROM actions WHERE domain = ? AND action = ? ORDER BY confidence DESC LIMIT ?)",
+            (domain, action, domain, action, self.max_per_action),
+        )
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM actions").fetchone()[0]
+
+
+class ActionMemory:
+    """
+    One job's view of an `ActionStore`, with that job's hit/miss counts.
+
+    `candidates` yields the remembered elements that are present on the
+    current page first; the LLM selection is only requested once those are
+    exhausted. Callers report each attempt back with `success` / `failure`.
+    """
+
+    def __init__(self, store: ActionStore) -> None:
+        self.store = store
+        self.stats: Dict[str, Dict[str, int]] = {}
+
+    async def candidates(
+        self,
+        url: str,
+        action: str,
+        available: Sequence[Any],
+        select: Callable[[], Awaitable[Sequence[Any]]],
+    ) -> AsyncIterator[Tuple[Any, bool]]:
+        """
+        (element, remembered) pairs to try for *action*, remembered ones first.
+
+        *available* is what the page offers right now; a remembered element
+        is only tried if it is still among them (a cheap check, no model
+        call). *select* runs the usual LLM prompt and is awaited lazily.
+        """
+        stats = self.stats.setdefault(action, {"steps": 0, "recalled": 0, "hits": 0, "misses": 0, "llm_selections": 0})
+        stats["steps"] += 1
+        on_page = {fingerprint(item): item for item in available}
+        tried = set()
+        for remembered in self.store.recall(url, action):
+            fp = fingerprint(remembered)
+            if fp in on_page:
+                tried.add(fp)
+                stats["recalled"] += 1
+                yield on_page[fp], True
+        stats["llm_selections"] += 1
+        for item in await select():
+            if fingerprint(item) not in tried:
+                yield item, False
+
+    def success(self, url: str, action: str, item: Any, remembered: bool = False) -> None:
+        if remembered:
+            self.stats[action]["hits"] += 1
+        self.store.success(url, action, item)
+
+    def failure(self, url: str, action: str, item: Any, remembered: bool = False) -> None:
+        if remembered:
+            self.stats[action]["misses"] += 1
+        self.store.failure(url, action, item)
+
+    def summary(self) -> Dict[str, Any]:
+        """Per-action counts plus the share of steps that skipped the LLM selection."""
+        out: Dict[str, Any] = {action: dict(s) for action, s in self.stats.items()}
+        steps = sum(s["steps"] for s in self.stats.values())
+        selections = sum(s["llm_selections"] for s in self.stats.values())
+        out["llm_skipped_rate"] = round(1 - selections / steps, 3) if steps else 0.0
+        return out
+
+
+def domain_of(url: str) -> str:
+    host = (urlsplit(url if "://" in url else f"https://{url}").hostname or "").lower()
+    return host[4:] if host.startswith("www.") else host
+
+
+def fingerprint(item: Any) -> str:
+    """Stable identity of an element as the page reports it, ignoring live handles."""
+    return hashlib.sha256(json.dumps(_portable(item), sort_keys=True, default=str).encode("utf-8")).hexdigest()[:32]
+
+
+def _portable(item: Any) -> Any:
+    if isinstance(item, dict):
+        return {k: _portable(v) for k, v in item.items() if k not in _VOLATILE_KEYS}
+    if isinstance(item, (list, tuple)):
+        return [_portable(v) for v in item]
+    if isinstance(item, (str, int, float, bool)) or item is None:
+        return item
+    return str(item)
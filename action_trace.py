@@ -0,0 +1,143 @@
+# action_trace.py
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+from action_memory import _portable, domain_of
+
+TRACE_VERSION = 1
+
+
+class ActionTrace:
+    """
+    The browser actions that got a job from the shop to an applied promo.
+
+    Steps are plain dicts, replayable without the model:
+
+        {"op": "navigate", "step": "product", "url": ...}
+        {"op": "click", "step": "add_to_cart", "button": ...}
+        {"op": "click", "step": "cart_navigation", "attrs": {...}}
+        {"op": "fill", "step": "promo_field", "attrs": {...}}
+
+    `button` steps go through `select_and_click_button`, `attrs` steps through
+    `click_button_by_attrs` / `add_text_to_field`; the promo text itself is not
+    stored, it comes from the job. Steps for a product are recorded into a
+    pending segment that is only kept (`commit`) once the product is in the cart.
+    """
+
+    def __init__(self, url: str = "", promo: str = "", promo_criteria: Optional[str] = None) -> None:
+        self.url = url
+        self.promo = promo
+        self.promo_criteria = promo_criteria
+        self.steps: List[Dict[str, Any]] = []
+        self._pending: Optional[List[Dict[str, Any]]] = None
+
+    # -----------------------------------------------------------------------
+    # recording
+    # -----------------------------------------------------------------------
+
+    def record(self, op: str, step: str, **fields: Any) -> Dict[str, Any]:
+        entry = {"op": op, "step": step, **{k: _portable(v) for k, v in fields.items() if v is not None}}
+        (self._pending if self._pending is not None else self.steps).append(entry)
+        return entry
+
+    def begin(self) -> None:
+        """Start a segment whose steps are dropped unless committed."""
+        self._pending = []
+
+    def commit(self) -> None:
+        if self._pending is not None:
+            self.steps.extend(self._pending)
+        self._pending = None
+
+    def discard(self) -> None:
+        self._pending = None
+
+    # -----------------------------------------------------------------------
+    # serialization
+    # -----------------------------------------------------------------------
+
+    @property
+    def complete(self) -> bool:
+        """True when the trace reaches a promo application (worth replaying)."""
+        return any(s["step"] == "apply_button" for s in self.steps)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "version": TRACE_VERSION,
+            "url": self.url,
+            "promo": self.promo,
+            "promo_criteria": self.promo_criteria,
+            "recorded": round(time.time()),
+            "steps": self.steps,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ActionTrace":
+        if data.get("version") != TRACE_VERSION:
+            raise ValueError(f"unsupported trace version {data.get('version')!r}")
+        trace = cls(data.get("url", ""), data.get("promo", ""), data.get("promo_criteria"))
+        trace.steps = list(data.get("steps") or [])
+        return trace
+
+    def __len__(self) -> int:
+        return len(self.steps)
+
+    def __repr__(self) -> str:
+        return f"<ActionTrace {domain_of(self.url) if self.url else '?'} steps={len(self.steps)}>"
+
+
+class TraceStore:
+    """Latest complete trace per (domain, promo code), one JSON file each under `root`."""
+
+    def __init__(self, root: Union[str, Path] = "./traces") -> None:
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def save(self, trace: ActionTrace) -> Optional[Path]:
+        if not trace.complete:
+            return None
+        path = self._path(trace.url, trace.promo)
+        tmp = path.with_suffix(f".{os.getpid()}.part")
+        tmp.write_text(json.dumps(trace.to_dict(), ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, path)
+        return path
+
+    def load(self, url: str, promo: str) -> Optional[ActionTrace]:
+        path = self._path(url, promo)
+        try:
+            return ActionTrace.from_dict(json.loads(path.read_text(encoding="utf-8")))
+        except FileNotFoundError:
+            return None
+        except (ValueError, KeyError) as e:
+            print(f"unreadable trace {path}: {e}")
+            return None
+
+    def _path(self, url: str, promo: str) -> Path:
+        digest = hashlib.sha256(f"{domain_of(url)}\n{promo.strip().upper()}".encode("utf-8")).hexdigest()[:16]
+        return self.root / f"{domain_of(url)}_{digest}.json"
+
+
+def trace_from_job(job: Dict[str, Any]) -> Optional[ActionTrace]:
+    """A trace shipped with the job itself (inline, or inside the stored output), if any."""
+    data = job.get("trace")
+    if data is None:
+        output = job.get("text_file_data") or job.get("output")
+        if isinstance(output, str):
+            try:
+                output = json.loads(output)
+            except ValueError:
+                output = None
+        data = output.get("trace") if isinstance(output, dict) else None
+    if not isinstance(data, dict):
+        return None
+    try:
+        return ActionTrace.from_dict(data)
+    except (ValueError, TypeError) as e:
+        print(f"job trace ignored: {e}")
+        return None
@@ -2,6 +2,16 @@ import asyncio
 import time
 import random
 
+from browser_pool import is_pooled
+from action_memory import fingerprint
+from action_trace import ActionTrace
+from call_graph import CallGraph
+from crawl_frontier import CrawlFrontier, ParallelCrawler
+from image_store import capture_screenshot, capture_screenshot_sync
+from link_scorer import HopTimer, rank_links, summarize_hops
+from page_readiness import READINESS, settle, settle_sync
+from sitemap_discovery import discover_products
+from url_tools import dedupe_urls, resolve_href, resolve_links, same_site, url_key
 from prompts import ( _get_product_details, _get_product_options, _get_essential_customizations
                     , _get_overlay_close_buttons, _get_customization_buttons, _get_add_to_cart_buttons, 
                     _get_cart_checkout_options, _get_promo_fields, _get_apply_buttons, _has_overlay, 
@@ -9,8 +19,8 @@ from prompts import ( _get_product_details, _get_product_options, _get_essential
                     _is_product_added, _needs_more_quantity, _is_url_valid, _cart_or_checkout_reached, 
                     _customization_required, _is_promo_entered, _is_promo_applied, _is_product_applicable, 
                     _has_promo_field, _sift_link_options, _product_link_filter, _cause_of_failure, 
-                    _make_valid_url, _generate_criterion, _verify_criterion, _make_valid_url_oneoff, 
-                    _customization_option_selections, _final_outcome, 
+                    _make_valid_url, _make_valid_url_oneoff, _generate_criterion, _verify_criterion, _make_valid_urls, 
+                    _customization_option_selections, _final_outcome, _analyze_product, _plan_product, 
                     )
 
 
@@ -20,11 +30,43 @@ def format_url(url):
     return url
 
 
+# only this many of a page's links (best scored first) are shown to the link prompts
+LINK_TOP_K = 20
+# product pages handed to the cart phase, from the crawl or the sitemaps (each costs several model calls)
+MAX_PRODUCT_LINKS = 10
+# times the quantity prompt may ask for one more of a product before we move on
+MAX_QUANTITY_CHECKS = 3
+
+
+def _page_hrefs(possible_links):
+    return [link["href"] if isinstance(link, dict) else link for link in possible_links]
+
+
+def _merge_ranked(ranked, extra, top_k):
+    return dedupe_urls([s.url for s in sorted(ranked + extra, key=lambda s: -s.score)])[:top_k]
+
+
+def rank_page_links_sync(link_agent, page_url, possible_links, promo_criteria = None, base_url = None, top_k = LINK_TOP_K):
+    """
+    Best `top_k` canonical URLs among the links of *page_url*, ranked locally by
+    `link_scorer`. Hrefs that cannot be resolved locally go to the model (in one
+    call) only when the page does not already yield `top_k` candidates.
+    """
+    ranked = rank_links(possible_links, page_url, base_url=base_url, promo_criteria=promo_criteria)
+    if len(ranked) < top_k:
+        _, ambiguous = resolve_links(page_url, _page_hrefs(possible_links))
+        if ambiguous:
+            fixed = _make_valid_urls(link_agent, page_url, ambiguous)
+            extra = rank_links(list(fixed.values()), page_url, base_url=base_url, promo_criteria=promo_criteria)
+            return _merge_ranked(ranked, extra, top_k)
+    return [s.url for s in ranked[:top_k]]
+
+
 def generate_criterion(path_stem, url, desc, promo, agent_s, promo_agent, verifier_agent, DEBUG = False, attempts = 4):
     add_on = ""
     img_path = f"{path_stem}landing_page.png"
-    agent_s.navigate_to_url(url); time.sleep(4)
-    agent_s.take_screenshot(img_path)
+    agent_s.navigate_to_url(url); settle_sync(agent_s, 4, "criterion_landing")
+    capture_screenshot_sync(agent_s, img_path)
     all_text = agent_s.get_body_text()
     while attempts > 0:
         criteria = _generate_criterion(promo_agent, desc, promo, img_path, add_on)
@@ -43,147 +85,85 @@ def generate_criterion(path_stem, url, desc, promo, agent_s, promo_agent, verifi
     return criteria, verifier_resp
 
 
-async def generate_links_fallback(url, promo_criteria, agent_p, link_agent, hops = 5):
-    to_browse = []
-    to_add = []
-    browsed = [url]
-    add_on = ""
-
-    source_url_dict = {}
-    base_url = url
-
-    await agent_p.initialize_driver()
-    await agent_p.navigate_to_url(url)
-
-    hop_i = 0
-    tried_twice = []
-
-    while hops>0:
-        hop_i += 1
-        agent_p.log_and_print(f"Attempting hop {hop_i}")
-        possible_links = await agent_p.get_possible_links()
-        try:
-            # need to properly form URLs
-            link_base_hrefs = [link["href"] for link in possible_links]
-            if len(link_base_hrefs) > 10:
-                agent_p.log_and_print("More than 7 links found on page, filtering down")
-                link_base_hrefs_filtered = _filter_product_links(link_agent, link_base_hrefs)
-                if len(link_base_hrefs_filtered) <= 4:
-                    link_base_hrefs_filtered = link_base_hrefs[:10]
-                elif len(link_base_hrefs_filtered) > 10:
-                    link_base_hrefs_filtered = random.sample(link_base_hrefs_filtered, 10)
-                agent_p.log_and_print(f"Remaining links: {link_base_hrefs_filtered}")
-            else:
-                agent_p.log_and_print(f"Only {len(link_base_hrefs)} links found:\n{link_base_hrefs}", level='warning')
-                link_base_hrefs_filtered = link_base_hrefs.copy()
-            if len(link_base_hrefs_filtered) > 7:
-                  link_base_hrefs_filtered = link_base_hrefs_filtered[:7]
-            link_hrefs = [_make_valid_url_oneoff( link_agent, base_url, href) for href in link_base_hrefs_filtered]
-            agent_p.log_and_print(f"Links: {link_hrefs}", level='metadata')
-            for href in link_hrefs:
-                valid_href = False
-                for base_href in link_base_hrefs:
-                    if base_href in href:
-                        valid_href = True
-                        break
-                if not valid_href:
-                    # link_hrefs.remove(href)
-                    agent_p.log_and_print(f"Found possibly invalid href as {href}", level='warning')
-        except Exception as e:
-            agent_p.log_and_print("Faced exception as {e}", level='error')
-            link_hrefs = []
-
-        if (hop_i == 1) and len(link_hrefs) < 1:
-            raise Exception("No links found on landing page")
-
-        hits = 0
-        if len(link_hrefs) >= 1 :
-            link_resp = _sift_link_options(link_agent, link_hrefs, promo_criteria, add_on)
-            for line in link_resp.split('\n'):
-                if line.startswith('ADD:') and hop_i != 1:
-                    new_url = line[4:].strip()
-                    if new_url not in link_hrefs:
-                        agent_p.log_and_print(f"URL hallucination detected with url: {new_url}", level='warning')
-                    elif new_url not in to_add:
-                        hits += 1
-                        to_add.append(new_url)
-                        source_url_dict[new_url] = url
-                elif line.startswith('BROWSE:'):
-                    new_url = line[7:].strip()
-                    if new_url not in link_hrefs:
-                        agent_p.log_and_print(f"URL hallucination detected with url: {new_url}", level='warning')
-                    elif (new_url not in browsed) and (new_url not in to_browse):
-                        hits += 1
-                        to_browse.append(new_url)
-        if hits == 0:
+async def generate_links_fallback(url, promo_criteria, agent_p, link_agent, hops = 5, hop_stats = None, concurrency = 3):
+    """
+    Playwright link discovery: a best-first crawl over up to `hops + 1` pages,
+    `concurrency` of them loading at once in separate tabs (see `ParallelCrawler`).
+    Returns (product links, {link: page it was found on}, unvisited queue, visited pages).
+    """
+    if not is_pooled(agent_p):
+        await agent_p.initialize_driver()
+
+    fresh = False  # the retry re-asks the model instead of replaying the answers that found nothing
+
+    async def sift(link_hrefs, add_on):
+        return await _sift_link_options.acall(link_agent, link_hrefs, promo_criteria, add_on, cache=False if fresh else None)
+
+    def new_crawler():
+        return ParallelCrawler(
+            agent_p.page.context, sift,
+            promo_criteria=promo_criteria, concurrency=concurrency, max_pages=hops + 1, enough=MAX_PRODUCT_LINKS,
+            log=lambda msg: agent_p.log_and_print(msg, level='metadata'),
+        )
+
+    crawler = new_crawler()
+    before = link_agent.token_totals["input_tokens"]
+    to_add = await crawler.crawl(url, hop_stats)
+    if not to_add:
+        # nothing found (often a bot wall or a wedged page): retry once from a clean browser
+        agent_p.log_and_print("Crawl found no product links, retrying once in a fresh browser", level='warning')
+        if is_pooled(agent_p):
+            # a fresh pooled context gives the same clean slate without relaunching
+            await agent_p.browser_pool.renew(agent_p)
+        else:
             await agent_p.close_driver()
             await asyncio.sleep(10)
             await agent_p.initialize_driver()
-            await asyncio.sleep(5)
-            if url not in tried_twice:
-                to_browse += [url]
-                tried_twice += [url]
-        if len(to_browse) > 1:
-          next_url_idx = random.randint(0, len(to_browse)-1)
-        else:
-          next_url_idx = 0
-        _next_url = to_browse.pop(next_url_idx) if to_browse else None
-        if _next_url:
+        fresh = True
+        crawler = new_crawler()
+        to_add = await crawler.crawl(url, hop_stats)
+    agent_p.crawl_summary = dict(crawler.stats, input_tokens=link_agent.token_totals["input_tokens"] - before)
+    agent_p.log_and_print(f"Parallel crawl: {agent_p.crawl_summary}", level='metadata')
 
-            try:
-                # try the playwright version, fallback to selenium version
-                current_url = agent_p.page.url
-            except:
-                current_url = agent_p.driver.current_url
-            if not _is_url_valid(link_agent, current_url, _next_url):
-                next_url = _make_valid_url(link_agent, current_url, _next_url)
-                agent_p.log_and_print(f"URL {_next_url} was incomplete, attempting fixing to {next_url}")
-            else:
-                next_url = _next_url
-
-            browsed.append(next_url)
-            await agent_p.navigate_to_url(next_url)
-            url = next_url
-            hops -= 1
-            if len(to_add) >= 10:
-                hops = 0
-        else:
-            if (len(to_add) < 5) and add_on == "":
-                print("Entered contingency prompt stance", level='warning')
-                add_on = f"\nIf no relevant product or page links are found, you must find BROWSE links that are likely to lead to the products you're looking for."
-            else:
-                hops = 0
     if len(to_add)>4:
         links = "\n".join(to_add)
-        link_resp = _product_link_filter(link_agent, links)
-        r_to_add = link_resp.split("\n")
+        link_resp = await _product_link_filter.acall(link_agent, links)
+        # only links the crawl actually found (they carry a source page)
+        r_to_add = [u for u in dedupe_urls(resolve_href(url, u.strip()) or u.strip() for u in link_resp.split("\n") if u.strip()) if u in crawler.sources] or to_add
     else:
         r_to_add = to_add
 
-    agent_p.close_driver()
-    return r_to_add, source_url_dict, to_browse, browsed
+    if not is_pooled(agent_p):
+        agent_p.close_driver()
+    return r_to_add, crawler.sources, crawler.frontier.pending_urls(), crawler.browsed
 
-def generate_links(url, promo_criteria, agent_s, link_agent, hops = 5):
-    to_browse = []
+def generate_links(url, promo_criteria, agent_s, link_agent, hops = 5, hop_stats = None):
+    # one Selenium driver, so pages are visited one at a time, but best first
+    to_browse = CrawlFrontier()
+    to_browse.mark_seen(url)
     to_add = []
+    added = set()
     browsed = [url]
     add_on = ""
 
     source_url_dict = {}
+    base_url = url
 
     agent_s.initialize_driver()
     agent_s.navigate_to_url(url)
 
     hop_i = 0
-    tried_twice = []
+    tried_twice = set()
 
     while hops>0:
         hop_i += 1
         print(f"Attempting hop {hop_i}")
 
+        hop_timer = HopTimer(hop_i, link_agent)
         possible_links = agent_s.get_possible_links()
         try:
-            link_hrefs = [link["href"] for link in possible_links]
+            link_hrefs = rank_page_links_sync(link_agent, agent_s.driver.current_url, possible_links, promo_criteria, base_url)
+            hop_timer.links(possible_links, link_hrefs, agent_s.driver.current_url)
         except:
             link_hrefs = []
 
@@ -192,23 +172,25 @@ def generate_links(url, promo_criteria, agent_s, link_agent, hops = 5):
         
         hits = 0
         if len(link_hrefs) >= 1 :
+            # links arrive best first; their rank is their priority in the frontier
+            link_rank = {href: len(link_hrefs) - i for i, href in enumerate(link_hrefs)}
             link_resp = _sift_link_options(link_agent, link_hrefs, promo_criteria, add_on)
             for line in link_resp.split('\n'):
                 if line.startswith('ADD:') and hop_i != 1:
-                    new_url = line[4:].strip()
-                    if new_url not in link_hrefs:
+                    new_url = resolve_href(url, line[4:].strip()) or line[4:].strip()
+                    if new_url not in link_rank:
                         print(f"URL hallucination detected with url: {new_url}")
-                    elif new_url not in to_add:
+                    elif url_key(new_url) not in added:
                         hits += 1
+                        added.add(url_key(new_url))
                         to_add.append(new_url)
                         source_url_dict[new_url] = url
                 elif line.startswith('BROWSE:'):
-                    new_url = line[7:].strip()
-                    if new_url not in link_hrefs:
+                    new_url = resolve_href(url, line[7:].strip()) or line[7:].strip()
+                    if new_url not in link_rank:
                         print(f"URL hallucination detected with url: {new_url}")
-                    elif (new_url not in browsed) and (new_url not in to_browse):
+                    elif to_browse.push(new_url, link_rank[new_url]):
                         hits += 1
-                        to_browse.append(new_url)
                 
         if hits == 0:
             agent_s.close_driver()
@@ -216,13 +198,10 @@ def generate_links(url, promo_criteria, agent_s, link_agent, hops = 5):
             agent_s.initialize_driver()
             time.sleep(5)
             if url not in tried_twice:
-                to_browse += [url]
-                tried_twice += [url]
-        if len(to_browse) > 1:
-          next_url_idx = random.randint(0, len(to_browse)-1)
-        else:
-          next_url_idx = 0
-        _next_url = to_browse.pop(next_url_idx) if to_browse else None
+                to_browse.push(url, force=True)
+                tried_twice.add(url)
+        _next = to_browse.pop()
+        _next_url = _next.url if _next else None
         if _next_url:
 
             try:
@@ -230,17 +209,16 @@ def generate_links(url, promo_criteria, agent_s, link_agent, hops = 5):
                 current_url = agent_s.page.url
             except:
                 current_url = agent_s.driver.current_url
-            if not _is_url_valid(link_agent, current_url, _next_url):
+            next_url = resolve_href(current_url, _next_url)
+            if next_url is None:
                 next_url = _make_valid_url(link_agent, current_url, _next_url)
                 print(f"URL {_next_url} was incomplete, attempting fixing to {next_url}")
-            else:
-                next_url = _next_url
 
             browsed.append(next_url)
             agent_s.navigate_to_url(next_url)
             url = next_url
             hops -= 1
-            if len(to_add) >= 10:
+            if len(to_add) >= MAX_PRODUCT_LINKS:
                 hops = 0
         else:
             if (len(to_add) < 5) and add_on == "":
@@ -248,30 +226,67 @@ def generate_links(url, promo_criteria, agent_s, link_agent, hops = 5):
                 add_on = f"\nIf no relevant product or page links are found, you must find BROWSE links that are likely to lead to the products you're looking for."
             else:
                 hops = 0
+        hop_stat = hop_timer.finish(hop_stats)
+        print(f"Hop {hop_i} stats: {hop_stat}")
     if len(to_add)>4:
         links = "\n".join(to_add)
         link_resp = _product_link_filter(link_agent, links)
-        r_to_add = link_resp.split("\n")
+        r_to_add = dedupe_urls(u.strip() for u in link_resp.split("\n") if u.strip())
     else:
         r_to_add = to_add
 
     agent_s.close_driver()
-    return r_to_add, source_url_dict, to_browse, browsed
+    return r_to_add, source_url_dict, to_browse.pending_urls(), browsed
+
+async def _action_candidates(agent_p, page_url, action, available, select):
+    """(element, remembered) pairs for a step: elements that worked on this shop before, then the LLM's picks."""
+    memory = getattr(agent_p, "action_memory", None)
+    if memory is None:
+        for item in await select():
+            yield item, False
+        return
+    async for pair in memory.candidates(page_url, action, available, select):
+        yield pair
+
+
+def _trace(agent_p, op, step, **fields):
+    # replayable record of the actions that worked (see action_trace.ActionTrace)
+    trace = getattr(agent_p, "trace", None)
+    if trace is not None:
+        trace.record(op, step, **fields)
+
+
+def _cost_phase(llm_agent, phase):
+    # model calls from here on are attributed to `phase` in the job's cost ledger (see cost_budget.JobBudget)
+    budget = getattr(llm_agent, "budget", None)
+    if budget is not None:
+        budget.phase = phase
+
+
+def _remember_action(agent_p, page_url, action, item, remembered, worked):
+    memory = getattr(agent_p, "action_memory", None)
+    if memory is None:
+        return
+    if worked:
+        memory.success(page_url, action, item, remembered)
+    else:
+        memory.failure(page_url, action, item, remembered)
+
 
 # --------------------------- specific action tasks --------------------------- #
 async def apply_customization(agent_p, shopping_agent, product_idx, cstm, options):
     before_img = f"{agent_p.path_stem}product_{product_idx}_cstm_{cstm}.png"
-    await agent_p.take_screenshot(before_img) ; await asyncio.sleep(4)
+    await capture_screenshot(agent_p, before_img) ; await settle(agent_p, 4, "screenshot")
 
     page_buttons = await agent_p.list_available_buttons()
-    cstm_buttons_to_attempt = _get_customization_buttons(shopping_agent, cstm, options, page_buttons)
+    cstm_buttons_to_attempt = await _get_customization_buttons.acall(shopping_agent, cstm, options, page_buttons)
     # random.shuffle(cstm_buttons_to_attempt)
 
     starting_url = agent_p.page.url
     cstm_applied = False
     for btn in cstm_buttons_to_attempt:
         agent_p.log_and_print(f"Attempting button {btn} for {cstm}")
-        await agent_p.select_and_click_button(btn, only_one = False) ; await asyncio.sleep(4)
+        await agent_p.select_and_click_button(btn, only_one = False) ; await settle(agent_p, 4, "click")
 
         if starting_url != agent_p.page.url:
             agent_p.log_and_print(f"Failed to use button {btn} for {cstm} and went to another page, returning back.", level='warning')
@@ -279,12 +294,13 @@ async def apply_customization(agent_p, shopping_agent, product_idx, cstm, option
             continue
 
         after_img = f"{agent_p.path_stem}product_{product_idx}_cstm_{cstm}_{btn}.png"
-        await agent_p.take_screenshot(after_img) ; await asyncio.sleep(4)
+        await capture_screenshot(agent_p, after_img) ; await settle(agent_p, 4, "screenshot")
 
-        cstm_applied = _is_customization_applied(shopping_agent, cstm, before_img, after_img)
+        cstm_applied = await _is_customization_applied.acall(shopping_agent, cstm, before_img, after_img)
 
         if cstm_applied:
             agent_p.log_and_print(f"Successfully used button {btn} for {cstm}")
+            _trace(agent_p, "click", "customization", button=btn, cstm=cstm, options=options)
             break
         else:
             agent_p.log_and_print(f"Failed to use button {btn} for {cstm}")
@@ -294,9 +310,9 @@ async def apply_customization(agent_p, shopping_agent, product_idx, cstm, option
 async def attempt_clearing_overlay(agent_p, shopping_agent, product_idx, fs_idx = 6, overlay_image_path = None):
     if overlay_image_path is None:
         overlay_image_path = f"{agent_p.path_stem}"+str(random.randint(0,100000))+".png"
-        agent_p.take_screenshot(overlay_image_path)
+        await capture_screenshot(agent_p, overlay_image_path)
     page_buttons = await agent_p.list_available_buttons()
-    close_buttons = _get_overlay_close_buttons(shopping_agent, page_buttons, overlay_image_path)
+    close_buttons = await _get_overlay_close_buttons.acall(shopping_agent, page_buttons, overlay_image_path)
 
     buttons_to_click = close_buttons
     pressed_buttons = []
@@ -310,18 +326,18 @@ async def attempt_clearing_overlay(agent_p, shopping_agent, product_idx, fs_idx
             pressed_buttons += [button]
 
         agent_p.log_and_print(f"Attempting to press {button}")
-        await agent_p.select_and_click_button(button, only_one = False) ; await asyncio.sleep(4)
+        await agent_p.select_and_click_button(button, only_one = False) ; await settle(agent_p, 4, "click")
 
         # ensure that the url stayed the same
         if starting_url != agent_p.page.url:
             agent_p.log_and_print(f'Accidently moved away from URL {starting_url} to URL {agent_p.page.url}', level='warning')
-            await agent_p.navigate(starting_url) ; await asyncio.sleep(4)
+            await agent_p.navigate(starting_url) ; await settle(agent_p, 4, "navigate")
 
         updated_image_attempt_button = f"{agent_p.path_stem}product_{product_idx}_{fs_idx}_{button}.png"
-        await agent_p.take_screenshot(updated_image_attempt_button) ; await asyncio.sleep(4)
-        overlay_detected = _has_overlay(shopping_agent, updated_image_attempt_button)
+        await capture_screenshot(agent_p, updated_image_attempt_button) ; await settle(agent_p, 4, "screenshot")
+        overlay_detected = await _has_overlay.acall(shopping_agent, updated_image_attempt_button)
         if not overlay_detected:
-            await agent_p.take_screenshot(f"{agent_p.path_stem}product_{product_idx}_cleared_overlay_{fs_idx}.png")
+            await capture_screenshot(agent_p, f"{agent_p.path_stem}product_{product_idx}_cleared_overlay_{fs_idx}.png")
             return not(overlay_detected)
     return not(overlay_detected)
 
@@ -331,28 +347,34 @@ async def attempt_to_add_product(agent_p, shopping_agent, product_idx, img_suffi
     page_buttons = await agent_p.list_available_buttons()
 
     cart_attempt_image = f"{agent_p.path_stem}product_{product_idx}_q{quantity}_beforeAdding.png"
-    await agent_p.take_screenshot(cart_attempt_image) ; await asyncio.sleep(4)
+    await capture_screenshot(agent_p, cart_attempt_image) ; await settle(agent_p, 4, "screenshot")
+
+    async def select():
+        adding_btns = await _get_add_to_cart_buttons.acall(shopping_agent, page_buttons)
+        random.shuffle(adding_btns)
+        agent_p.log_and_print(f"Identified buttons for adding product to cart: {adding_btns}", level='metadata')
+        return adding_btns
 
-    adding_btns = _get_add_to_cart_buttons(shopping_agent, page_buttons)
-    random.shuffle(adding_btns)
-    agent_p.log_and_print(f"Identified buttons for adding product to cart: {adding_btns}", level='metadata')
     add_bttn_image = cart_attempt_image # This is just a fallback to be on the safer side
-    for btn in adding_btns:
-        agent_p.log_and_print(f"Attempting button {btn} for adding product to cart")
-        await agent_p.select_and_click_button(btn, only_one = True) ; await asyncio.sleep(4)
+    async for btn, remembered in _action_candidates(agent_p, starting_url, "add_to_cart", page_buttons, select):
+        agent_p.log_and_print(f"Attempting {'remembered ' if remembered else ''}button {btn} for adding product to cart")
+        await agent_p.select_and_click_button(btn, only_one = True) ; await settle(agent_p, 4, "click")
 
         if starting_url != agent_p.page.url:
             agent_p.log_and_print(f"Failed to use button {btn} for adding product to cart and went to another page, returning back.", level='warning')
+            _remember_action(agent_p, starting_url, "add_to_cart", btn, remembered, False)
             await agent_p.navigate(starting_url)
             continue
 
         add_bttn_image = f"{agent_p.path_stem}product_{product_idx}_q{quantity}_addtocart_{btn}.png"
-        await agent_p.take_screenshot(add_bttn_image) ; await asyncio.sleep(4)
+        await capture_screenshot(agent_p, add_bttn_image) ; await settle(agent_p, 4, "screenshot")
 
-        product_added = _is_product_added(shopping_agent, cart_attempt_image, add_bttn_image)
+        product_added = await _is_product_added.acall(shopping_agent, cart_attempt_image, add_bttn_image)
+        _remember_action(agent_p, starting_url, "add_to_cart", btn, remembered, product_added)
 
         if product_added:
             agent_p.log_and_print(f"Successfully added product!!")
+            _trace(agent_p, "click", "add_to_cart", button=btn)
             return product_added, add_bttn_image
         else:
             agent_p.log_and_print(f"Failed to use button {btn} for adding product")
@@ -368,23 +390,27 @@ async def navigate_to_cart_checkout(agent_p, shopping_agent, scenario_ = "cart",
 
     cart_img_path = starting_page_img
 
-    await agent_p.take_screenshot(starting_page_img)
+    await capture_screenshot(agent_p, starting_page_img)
 
     page_buttons_full_all = await agent_p.get_buttons_full()
     page_links = await agent_p.get_possible_links()
     all_items = page_buttons_full_all + page_links
 
-    nav_options = _get_cart_checkout_options(shopping_agent, all_items)
-    agent_p.log_and_print(f"Identified options for moving to cart/check s-{scenario_}: {nav_options}", level='metadata')
+    async def select():
+        nav_options = await _get_cart_checkout_options.acall(shopping_agent, all_items)
+        agent_p.log_and_print(f"Identified options for moving to cart/check s-{scenario_}: {nav_options}", level='metadata')
+        return nav_options
+
+    action = f"{scenario_}_navigation"
     try_idx = 0
-    for option in nav_options:
+    async for option, remembered in _action_candidates(agent_p, starting_url, action, all_items, select):
 
         try_idx += 1
 
         if 'href' in option.keys():
             href = option['href']
             c_url = agent_p.page.url
-            formed_link = _make_valid_url_oneoff( shopping_agent, c_url, href)
+            formed_link = resolve_href(c_url, href) or await _make_valid_url_oneoff.acall( shopping_agent, c_url, href)
             await agent_p.navigate(formed_link)
 
         else:
@@ -394,12 +420,19 @@ async def navigate_to_cart_checkout(agent_p, shopping_agent, scenario_ = "cart",
             await agent_p.click_button_by_attrs(option)
 
         # ideally should be at the cart/checkout page now
-        await asyncio.sleep(8)
+        await settle(agent_p, 8, "cart_navigation")
         cart_img_path = f"{agent_p.path_stem}possible_cartcheckout_page_s-{scenario_}_t{try_idx}.png"
-        await agent_p.take_screenshot(cart_img_path)
+        await capture_screenshot(agent_p, cart_img_path)
 
-        if _cart_or_checkout_reached(shopping_agent, starting_page_img, cart_img_path, scenario_):
+        reached = await _cart_or_checkout_reached.acall(shopping_agent, starting_page_img, cart_img_path, scenario_)
+        _remember_action(agent_p, starting_url, action, option, remembered, reached)
+        if reached:
             agent_p.log_and_print(f"Successfully navigated to cart/checkout s-{scenario_} using option: {option}")
+            _trace(agent_p, "navigate", f"{scenario_}_start", url=starting_url)
+            if 'href' in option.keys():
+                _trace(agent_p, "navigate", action, url=formed_link)
+            else:
+                _trace(agent_p, "click", action, attrs=option)
             return cart_img_path
             break
         else:
@@ -410,19 +443,96 @@ async def navigate_to_cart_checkout(agent_p, shopping_agent, scenario_ = "cart",
     return cart_img_path
   
   
+async def _product_analysis(agent_p, shopping_agent, img_path, page_text):
+    """
+    (details, options, essentials, preselected) of a product page. With
+    `shopping_agent.structured_outputs` this is one JSON-schema call;
+    otherwise, or when its reply does not validate, the separate free-text
+    prompts (preselected is then None and asked per customization later).
+    """
+    if getattr(shopping_agent, "structured_outputs", False):
+        analysis = await _analyze_product.acall(shopping_agent, img_path, page_text)
+        if analysis is not None:
+            named = [o for o in analysis["options"] if o["name"].strip()]
+            details = {k: analysis[k] for k in ("productName", "price", "category")}
+            details["validProduct"] = str(analysis["validProduct"]).lower()
+            return (details,
+                    {o["name"]: ", ".join(o["values"]) for o in named},
+                    {o["name"]: o["essential"] for o in named},
+                    {o["name"]: o["preselected"] for o in named})
+        agent_p.log_and_print("Structured product analysis did not validate, using the separate prompts", level='warning')
+
+    # details and options are independent; essentials only needs the options
+    details_graph = CallGraph()
+    details_graph.add("details", lambda: _get_product_details.acall(shopping_agent, img_path, page_text))
+    details_graph.add("options", lambda: _get_product_options.acall(shopping_agent, img_path))
+    details_graph.add("essentials", lambda options: _get_essential_customizations.acall(shopping_agent, img_path, options), after=("options",))
+    analysis = await details_graph.run()
+    agent_p.log_and_print(f"Product analysis took {details_graph.elapsed:.1f}s ({details_graph.serial_time:.1f}s if run serially)")
+    return analysis["details"], analysis["options"], analysis["essentials"], None
+
+
+async def _product_plan(agent_p, shopping_agent, verifier_agent, img_path, promo_criteria, details_dict, custmizations_dict, preselected, added_products):
+    """
+    (applicable, applicability text, {cstm: {"required", "options", "preselected"}}).
+    Structured mode answers applicability and every customization in one
+    call; a reply that does not validate, or misses an option, falls back to
+    the applicability prompt plus three questions per customization.
+    """
+    if getattr(shopping_agent, "structured_outputs", False):
+        plan = await _plan_product.acall(verifier_agent, promo_criteria, details_dict, custmizations_dict, added_products, img_path)
+        answers = {c["name"].strip().lower(): c for c in plan["customizations"]} if plan is not None else {}
+        if plan is not None and all(cstm.strip().lower() in answers for cstm in custmizations_dict):
+            return plan["applicable"], plan["reason"], {
+                cstm: {"required": answers[cstm.strip().lower()]["required"],
+                       "options": answers[cstm.strip().lower()]["selection"],
+                       "preselected": (preselected or {}).get(cstm, False)}
+                for cstm in custmizations_dict
+            }
+        agent_p.log_and_print("Structured product plan did not validate, using the separate prompts", level='warning')
+
+    applicable_bool, promo_resp = await _is_product_applicable.acall(verifier_agent, promo_criteria, details_dict)
+    if not applicable_bool:
+        return applicable_bool, promo_resp, {}
+
+    async def if_required(required, ask):
+        return await ask() if required else None
+
+    # Customizations are independent of each other and asked about concurrently; the option
+    # selection and preselection questions wait for their customization to turn out required.
+    cstm_graph = CallGraph()
+    for i, cstm in enumerate(custmizations_dict.keys()):
+        required = f"required_{i}"
+        cstm_graph.add(required, lambda cstm=cstm: _customization_required.acall(shopping_agent, promo_criteria, details_dict, added_products, cstm))
+        cstm_graph.add(f"options_{i}", lambda cstm=cstm, required=required, **deps: if_required(
+            deps[required], lambda: _customization_option_selections.acall(shopping_agent, img_path, promo_criteria, cstm, custmizations_dict[cstm])), after=(required,))
+        if preselected is None:
+            cstm_graph.add(f"preselected_{i}", lambda cstm=cstm, required=required, **deps: if_required(
+                deps[required], lambda: _is_preselected.acall(shopping_agent, cstm, img_path)), after=(required,))
+    cstm_answers = await cstm_graph.run()
+    if custmizations_dict:
+        agent_p.log_and_print(f"Customization analysis took {cstm_graph.elapsed:.1f}s ({cstm_graph.serial_time:.1f}s if run serially)")
+    return applicable_bool, promo_resp, {
+        cstm: {"required": cstm_answers[f"required_{i}"],
+               "options": cstm_answers[f"options_{i}"],
+               "preselected": cstm_answers[f"preselected_{i}"] if preselected is None else preselected.get(cstm, False)}
+        for i, cstm in enumerate(custmizations_dict.keys())
+    }
+
+
 async def process_product(agent_p, shopping_agent, verifier_agent, product_idx, product_link, link_source, promo_criteria, added_products, attempt_overlay_clear = True):
     # navigate to product page
-    await agent_p.navigate(product_link) ; await asyncio.sleep(4)
-    await agent_p.take_screenshot(f"{agent_p.path_stem}product_{product_idx}_landing_page_initial.png") ; await asyncio.sleep(4)
+    await agent_p.navigate(product_link) ; await settle(agent_p, 4, "navigate")
+    await capture_screenshot(agent_p, f"{agent_p.path_stem}product_{product_idx}_landing_page_initial.png") ; await settle(agent_p, 4, "screenshot")
 
     # ------------------------------- Clearing Overlays -------------------------------- #
     # During first run, we need to check and clear popups and overlays
     if attempt_overlay_clear:
         attempt_overlay_clear = False
-        overlay_detected = _has_overlay(shopping_agent, f"{agent_p.path_stem}product_{product_idx}_landing_page_initial.png")
+        overlay_detected = await _has_overlay.acall(shopping_agent, f"{agent_p.path_stem}product_{product_idx}_landing_page_initial.png")
 
         overlay_image_path = f"{agent_p.path_stem}product_{product_idx}_landing_page_updated.png"
-        await agent_p.take_screenshot(overlay_image_path) ; await asyncio.sleep(4)
+        await capture_screenshot(agent_p, overlay_image_path) ; await settle(agent_p, 4, "screenshot")
 
         failsafe_attempts = 2
         while overlay_detected:
@@ -430,8 +540,8 @@ async def process_product(agent_p, shopping_agent, verifier_agent, product_idx,
 
             # Double check
             updated_image_attempt = f"{agent_p.path_stem}product_{product_idx}_landing_page_updated_{failsafe_attempts}.png"
-            await agent_p.take_screenshot(updated_image_attempt) ; await asyncio.sleep(4)
-            overlay_detected = _has_overlay(shopping_agent, updated_image_attempt)
+            await capture_screenshot(agent_p, updated_image_attempt) ; await settle(agent_p, 4, "screenshot")
+            overlay_detected = await _has_overlay.acall(shopping_agent, updated_image_attempt)
 
             failsafe_attempts -= 1
             if failsafe_attempts <= 0:
@@ -442,14 +552,12 @@ async def process_product(agent_p, shopping_agent, verifier_agent, product_idx,
     # -------------------------------- Getting Details --------------------------------- #
     # This assumes that there is no overlay
     landing_page_img_path = f"{agent_p.path_stem}product_{product_idx}_landing_page.png"
-    await agent_p.take_screenshot(landing_page_img_path) ; await asyncio.sleep(4)
+    await capture_screenshot(agent_p, landing_page_img_path) ; await settle(agent_p, 4, "screenshot")
 
     page_text = await agent_p.page.evaluate("() => document.body.innerText")
     page_buttons = await agent_p.list_available_buttons()
 
-    details_dict        = _get_product_details(shopping_agent, landing_page_img_path, page_text)
-    custmizations_dict  = _get_product_options(shopping_agent, landing_page_img_path)
-    essentials          = _get_essential_customizations(shopping_agent, landing_page_img_path, custmizations_dict)
+    details_dict, custmizations_dict, essentials, preselected = await _product_analysis(agent_p, shopping_agent, landing_page_img_path, page_text)
 
     details_dict.update({
         'link': product_link,
@@ -464,7 +572,8 @@ async def process_product(agent_p, shopping_agent, verifier_agent, product_idx,
 
     # ------------------------------ Applicability Check ------------------------------- #
 
-    applicable_bool, promo_resp = _is_product_applicable(verifier_agent, promo_criteria, details_dict)
+    applicable_bool, promo_resp, cstm_plan = await _product_plan(agent_p, shopping_agent, verifier_agent, landing_page_img_path, promo_criteria,
+                                                                 details_dict, custmizations_dict, preselected, added_products)
     details_dict['applicability'] = promo_resp
 
     agent_p.log_and_print(f"Product Applicability: {promo_resp}")
@@ -480,17 +589,17 @@ async def process_product(agent_p, shopping_agent, verifier_agent, product_idx,
     # Add an option so that applying customizations is done through function calling
     cstm_applied_dict = {}
 
-    for cstm in custmizations_dict.keys():
-        if not _customization_required(shopping_agent, promo_criteria, details_dict, added_products, cstm):
+    # Applying customizations stays serial, it drives the browser.
+    for cstm, answer in cstm_plan.items():
+        if not answer["required"]:
             agent_p.log_and_print(f"{cstm} is not required for product {product_idx}")
             continue
         else:
-            all_options = custmizations_dict[cstm]
-            options = _customization_option_selections(shopping_agent, landing_page_img_path, promo_criteria, cstm, all_options)
+            options = answer["options"]
             agent_p.log_and_print(f"{cstm} is required for product {product_idx}, ideally set to {options}")
 
         cstm_applied_dict[cstm] = False
-        if _is_preselected(shopping_agent, cstm, landing_page_img_path):
+        if answer["preselected"]:
             agent_p.log_and_print(f"{cstm} is already preselected for product {product_idx}")
             # continue
         cstm_applied_dict[cstm] = await apply_customization(agent_p, shopping_agent, product_idx, cstm, options)
@@ -520,14 +629,16 @@ async def process_product(agent_p, shopping_agent, verifier_agent, product_idx,
             quantity += 1
             details_dict['quantity_added'] = 1 + details_dict.get('quantity_added', 0)
             added_products += [details_dict]
-            quantity_required = _needs_more_quantity(shopping_agent, promo_criteria, details_dict)
+            quantity_required = await _needs_more_quantity.acall(shopping_agent, promo_criteria, details_dict)
 
-            while quantity_required:
+            checks = 1
+            while quantity_required and checks < MAX_QUANTITY_CHECKS:
+                checks += 1
                 agent_p.log_and_print('Trying to add the product once again to increase quantity.')
-                agent_p.navigate(starting_url)
-                quantity_required = _needs_more_quantity(shopping_agent, promo_criteria, details_dict)
+                await agent_p.navigate(starting_url)
+                quantity_required = await _needs_more_quantity.acall(shopping_agent, promo_criteria, details_dict)
         else:
-            failure_cause = _cause_of_failure(shopping_agent, add_bttn_image)
+            failure_cause = await _cause_of_failure.acall(shopping_agent, add_bttn_image)
             agent_p.log_and_print(f"Failure cause: {failure_cause}", level='warning')
             if 'None' not in failure_cause.lower()[:6]:
                 cstm = failure_cause.split(':', 1)[0]
@@ -545,7 +656,7 @@ async def process_product(agent_p, shopping_agent, verifier_agent, product_idx,
 
 
 
-async def add_products_to_cart(agent_p, shopping_agent, verifier_agent, all_product_links, product_link_sources, promo_criteria, base_url):
+async def add_products_to_cart(agent_p, shopping_agent, verifier_agent, all_product_links, product_link_sources, promo_criteria, base_url, ranked = False):
     criteria_met = False
     product_idx = 0
     attempt_overlay_clear = True
@@ -554,10 +665,10 @@ async def add_products_to_cart(agent_p, shopping_agent, verifier_agent, all_prod
     # ----------------------------- Starting Control Flow ------------------------------ #
 
     # navigate to landing page
-    await agent_p.__aenter__()
+    await _open_browser(agent_p)
     await agent_p.navigate(base_url)
-    await asyncio.sleep(20)
-    await agent_p.take_screenshot(f"{agent_p.path_stem}landing_page_initial.png") ; await asyncio.sleep(4)
+    await settle(agent_p, 20, "landing")
+    await capture_screenshot(agent_p, f"{agent_p.path_stem}landing_page_initial.png") ; await settle(agent_p, 4, "screenshot")
 
     product_links = all_product_links.copy()
 
@@ -568,13 +679,24 @@ async def add_products_to_cart(agent_p, shopping_agent, verifier_agent, all_prod
     # ---------------------------------------------------------------------------------- #
     for product_idx in range(len(product_links)):
         # Getting product link
-        product_link_idx = 0 if len(product_links) < 2 else random.randint(0, len(product_links)-1)
+        # ranked links (sitemap discovery) are tried best first
+        product_link_idx = 0 if (ranked or len(product_links) < 2) else random.randint(0, len(product_links)-1)
         product_link = product_links.pop(product_link_idx).strip()
         link_source = product_link_sources[product_link]
 
+        # a product's steps only enter the trace if it ends up in the cart
+        trace = getattr(agent_p, "trace", None)
+        if trace is not None:
+            trace.begin()
+            trace.record("navigate", "product", url=product_link)
+        n_added = len(added_products)
         added_products = await process_product(agent_p, shopping_agent, verifier_agent, product_idx, product_link, link_source, promo_criteria, added_products, attempt_overlay_clear)
+        if trace is not None and len(added_products) > n_added:
+            trace.commit()
+        elif trace is not None:
+            trace.discard()
 
-        criteria_met, met_desc = _criteria_met(shopping_agent, promo_criteria, added_products)
+        criteria_met, met_desc = await _criteria_met.acall(shopping_agent, promo_criteria, added_products)
         if criteria_met:
             agent_p.log_and_print(f"Criteria Met?: {met_desc}")
             break
@@ -584,59 +706,105 @@ async def add_products_to_cart(agent_p, shopping_agent, verifier_agent, all_prod
 
 async def attempt_applying_promo(agent_p, shopping_agent, promo, cart_img_path):
     # ----------------------------- Attempting Promo Code ------------------------------ #
+    page_url = agent_p.page.url
     all_text_fields = await agent_p.list_text_entry_fields()
-    likely_promo_fields = _get_promo_fields(shopping_agent, all_text_fields, cart_img_path)
 
-    if len(likely_promo_fields) <= 0:
-        agent_p.log_and_print("No reasonable promo entering fields found!!", level='error')
-        return False, "", ""
-
-        
     pre_promo_img = f"{agent_p.path_stem}prepromo.png"
-    await agent_p.take_screenshot(pre_promo_img)
+    await capture_screenshot(agent_p, pre_promo_img)
 
-    for pf_idx, promo_field in enumerate(likely_promo_fields):
-        agent_p.log_and_print(f"Attempting promo field {pf_idx}: {promo_field}")
+    select_fields = lambda: _get_promo_fields.acall(shopping_agent, all_text_fields, cart_img_path)
+    pf_idx = -1
+    async for promo_field, remembered in _action_candidates(agent_p, page_url, "promo_field", all_text_fields, select_fields):
+        pf_idx += 1
+        agent_p.log_and_print(f"Attempting {'remembered ' if remembered else ''}promo field {pf_idx}: {promo_field}")
         promo_field.pop('element', None)
-        await agent_p.add_text_to_field(promo_field, promo) ; await asyncio.sleep(4)
+        await agent_p.add_text_to_field(promo_field, promo) ; await settle(agent_p, 4, "text_entry")
 
         post_promo_img = f"{agent_p.path_stem}postpromo_{pf_idx}.png"
-        await agent_p.take_screenshot(post_promo_img)
+        await capture_screenshot(agent_p, post_promo_img)
 
-        promo_entered = _is_promo_entered(shopping_agent, pre_promo_img, post_promo_img)
+        promo_entered = await _is_promo_entered.acall(shopping_agent, pre_promo_img, post_promo_img)
+        _remember_action(agent_p, page_url, "promo_field", promo_field, remembered, promo_entered)
         if promo_entered:
             # attempt applying the promo
             agent_p.log_and_print("Promo Entered!!")
+            _trace(agent_p, "fill", "promo_field", attrs=promo_field)
             all_apply_buttons = await agent_p.get_buttons_full(include_elements = False)
-            likely_apply_buttons = _get_apply_buttons(shopping_agent, all_apply_buttons, post_promo_img)
-
-            if len(likely_apply_buttons) <= 0:
-                agent_p.log_and_print("No apply buttons found!!", level='error')
-                return False, "", ""
 
-            for ab_idx, apply_button in enumerate(likely_apply_buttons):
-                agent_p.log_and_print(f"Attempting apply button {ab_idx} for text field {pf_idx}: {apply_button}")
+            select_buttons = lambda: _get_apply_buttons.acall(shopping_agent, all_apply_buttons, post_promo_img)
+            ab_idx = -1
+            async for apply_button, remembered in _action_candidates(agent_p, page_url, "apply_button", all_apply_buttons, select_buttons):
+                ab_idx += 1
+                agent_p.log_and_print(f"Attempting {'remembered ' if remembered else ''}apply button {ab_idx} for text field {pf_idx}: {apply_button}")
                 apply_button.pop("element", None)
-                await agent_p.click_button_by_attrs(apply_button, only_one = True) ; await asyncio.sleep(12)
+                await agent_p.click_button_by_attrs(apply_button, only_one = True) ; await settle(agent_p, 12, "apply")
 
                 apply_promo_img = f"{agent_p.path_stem}promo-apply_{pf_idx}_{ab_idx}.png"
-                await agent_p.take_screenshot(apply_promo_img)
+                await capture_screenshot(agent_p, apply_promo_img)
 
-                if _is_promo_applied(shopping_agent, post_promo_img, apply_promo_img):
+                promo_applied = await _is_promo_applied.acall(shopping_agent, post_promo_img, apply_promo_img)
+                _remember_action(agent_p, page_url, "apply_button", apply_button, remembered, promo_applied)
+                if promo_applied:
                     agent_p.log_and_print("Promo Applied!!!!")
+                    _trace(agent_p, "click", "apply_button", attrs=apply_button)
                     return True, post_promo_img, apply_promo_img
                 else:
                     agent_p.log_and_print("Promo not applied")
+
+            if ab_idx < 0:
+                agent_p.log_and_print("No apply buttons found!!", level='error')
             break
         else:
             agent_p.log_and_print("Promo not entered", level='error')
+
+    if pf_idx < 0:
+        agent_p.log_and_print("No reasonable promo entering fields found!!", level='error')
     return False, "", ""
     # ---------------------------------------------------------------------------------- #
 
 
 
 
-async def process_job(url, desc, promo, agent_s, agent_p, shopping_agent, verifier_agent, compute_fin = True):
+def _usable_links(state):
+    rta, sta = state.get("rta"), state.get("sta")
+    return bool(rta) and isinstance(sta, dict) and all(isinstance(u, str) and u in sta for u in rta)
+
+
+async def _open_browser(agent_p):
+    # pooled agents arrive with a live page; standalone ones are opened once per job
+    if not is_pooled(agent_p) and not getattr(agent_p, "browser_open", False):
+        await agent_p.__aenter__()
+        agent_p.browser_open = True
+
+
+async def _restore_cart(agent_p, steps, base_url):
+    """Rebuild a checkpointed cart by replaying its recorded steps; False once the shop no longer matches them."""
+    await _open_browser(agent_p)
+    await agent_p.navigate(base_url) ; await settle(agent_p, 8, "landing")
+    for step in steps:
+        if step["op"] == "navigate":
+            await agent_p.navigate(step["url"]) ; await settle(agent_p, 4, "navigate")
+        elif not await _replay_step(agent_p, step, ""):
+            agent_p.log_and_print(f"Cart restore diverged at {step}", level='warning')
+            return False
+    return True
+
+
+async def _resume_cart_page(agent_p, state, base_url):
+    """Open the checkpointed cart/checkout URL; its screenshot path, or None if it is off-site or has no text fields."""
+    cart_url = state.get("cart_url")
+    if not cart_url or not same_site(cart_url, base_url):
+        return None
+    await agent_p.navigate(cart_url) ; await settle(agent_p, 8, "cart_navigation")
+    if not await agent_p.list_text_entry_fields():
+        return None
+    _trace(agent_p, "navigate", "cart_navigation", url=cart_url)
+    cart_img_path = f"{agent_p.path_stem}resumed_cart_page.png"
+    await capture_screenshot(agent_p, cart_img_path)
+    return cart_img_path
+
+
+async def process_job(url, desc, promo, agent_s, agent_p, shopping_agent, verifier_agent, compute_fin = True, criteria_cache = None, checkpoint = None):
     # agent_s = SeleniumAgent()
     # agent_p = PlaywrightAgent(headless=True)
  
@@ -645,18 +813,63 @@ async def process_job(url, desc, promo, agent_s, agent_p, shopping_agent, verifi
 
     url = format_url(url)
     stem = agent_p.path_stem
+    # each phase's output goes to the job checkpoint; a HELD retry resumes after the last one
+    resume = lambda phase: checkpoint.get(phase) if checkpoint is not None else None
+    done = lambda phase, **state: checkpoint.save(phase, **state) if checkpoint is not None else None
+
     # Phase 1
-    promo_criteria, p1_v_resp = generate_criterion(stem, url, desc, promo, agent_s, shopping_agent, verifier_agent, DEBUG=True)
+    _cost_phase(shopping_agent, "criteria")
+    state = resume("criteria")
+    cached = criteria_cache.get(url, promo, desc) if criteria_cache is not None and not state else None
+    agent_p.criteria_cached = cached is not None
+    if state:
+        promo_criteria, p1_v_resp = state["promo_criteria"], state["verification"]
+        agent_p.log_and_print("Resuming with the checkpointed promo criteria", level='metadata')
+    elif cached:
+        promo_criteria, p1_v_resp = cached
+        agent_p.log_and_print("Promo criteria taken from the criteria cache", level='metadata')
+    else:
+        # Selenium phases are blocking, keep them off the event loop so concurrent jobs keep moving
+        promo_criteria, p1_v_resp = await asyncio.to_thread(generate_criterion, stem, url, desc, promo, agent_s, shopping_agent, verifier_agent, DEBUG=True)
+        # only criteria the verifier accepted are worth reusing
+        if criteria_cache is not None and 'no' not in p1_v_resp[:4].lower():
+            criteria_cache.put(url, promo, desc, promo_criteria, p1_v_resp)
+    if not state:
+        done("criteria", promo_criteria=promo_criteria, verification=p1_v_resp)
     agent_p.log_and_print(promo_criteria)
+    agent_p.trace = ActionTrace(url, promo, promo_criteria)
 
     # Phase 2
-    try:
-        rta, sta, tb, br = generate_links(url, promo_criteria, agent_s, shopping_agent)
-        if len(rta)< 2:
-            raise Exception("Could not find sufficient links")
-    except:
-        agent_p.log_and_print(f"Failed to generate links from agent_s, opting for agent_p", level='warning')
-        rta, sta, tb, br = await generate_links_fallback(url, promo_criteria, agent_p, shopping_agent)
+    _cost_phase(shopping_agent, "links")
+    agent_p.crawl_hops = []
+    state = resume("links")
+    if state and not _usable_links(state):
+        agent_p.log_and_print("Checkpointed product links are unusable, rediscovering", level='warning')
+        checkpoint.drop("links")
+        state = None
+    if state:
+        rta, sta, from_sitemap = state["rta"], state["sta"], state["from_sitemap"]
+        agent_p.log_and_print(f"Resuming with {len(rta)} checkpointed product links", level='metadata')
+    else:
+        # fast path: products straight from the shop's sitemaps, no browser hops or link prompts
+        try:
+            rta, sta, agent_p.sitemap_stats = await asyncio.to_thread(discover_products, url, promo_criteria, MAX_PRODUCT_LINKS)
+        except Exception as e:
+            agent_p.log_and_print(f"Sitemap discovery failed, crawling instead: {e}", level='warning')
+            rta, sta = [], {}
+        from_sitemap = len(rta) >= 2
+        if from_sitemap:
+            agent_p.log_and_print(f"Found {len(rta)} products via sitemaps: {agent_p.sitemap_stats}", level='metadata')
+        else:
+            try:
+                rta, sta, tb, br = await asyncio.to_thread(generate_links, url, promo_criteria, agent_s, shopping_agent, hop_stats=agent_p.crawl_hops)
+                if len(rta)< 2:
+                    raise Exception("Could not find sufficient links")
+            except:
+                agent_p.log_and_print(f"Failed to generate links from agent_s, opting for agent_p", level='warning')
+                rta, sta, tb, br = await generate_links_fallback(url, promo_criteria, agent_p, shopping_agent, hop_stats=agent_p.crawl_hops)
+            agent_p.log_and_print(f"Link discovery: {summarize_hops(agent_p.crawl_hops)}", level='metadata')
+        done("links", rta=rta, sta=sta, from_sitemap=from_sitemap)
         
 
     all_product_links = rta.copy()
@@ -665,28 +878,164 @@ async def process_job(url, desc, promo, agent_s, agent_p, shopping_agent, verifi
     agent_p.log_and_print(product_link_sources, level='metadata')
 
     # Phase 3
-    added_products = await add_products_to_cart(agent_p, shopping_agent, verifier_agent, all_product_links, product_link_sources, promo_criteria, base_url)
+    _cost_phase(shopping_agent, "cart")
+    state = resume("cart")
+    if state:
+        # the cart lives in the browser session, so it is rebuilt from the recorded steps (no model calls)
+        if await _restore_cart(agent_p, state["steps"], base_url):
+            added_products = state["added_products"]
+            agent_p.trace.steps = list(state["steps"])
+            agent_p.log_and_print(f"Resumed with {len(added_products)} checkpointed products in the cart", level='metadata')
+        else:
+            agent_p.log_and_print("Checkpointed cart could not be rebuilt, adding products again", level='warning')
+            checkpoint.drop("cart")
+            state = None
+    if not state:
+        added_products = await add_products_to_cart(agent_p, shopping_agent, verifier_agent, all_product_links, product_link_sources, promo_criteria, base_url, ranked = from_sitemap)
+        done("cart", added_products=added_products, steps=list(agent_p.trace.steps))
 
     # Phase 4
     # -------------------------- Navigating to Cart/Checkout --------------------------- #
-    cart_img_path = await navigate_to_cart_checkout(agent_p, shopping_agent, scenario_ = "cart", starting_url = base_url)
-
-    if not _has_promo_field(shopping_agent, cart_img_path):
-        # TODO: check if any information needs to be put in before moving to checkout; if yes, then enter info, else move to checkout page
-        cart_img_path = await navigate_to_cart_checkout(agent_p, shopping_agent, scenario_ = "checkout")
+    _cost_phase(shopping_agent, "checkout")
+    state = resume("checkout")
+    cart_img_path = await _resume_cart_page(agent_p, state, base_url) if state else None
+    if state and cart_img_path is None:
+        agent_p.log_and_print("Checkpointed cart page is unusable, navigating again", level='warning')
+        checkpoint.drop("checkout")
+    if cart_img_path is None:
+        cart_img_path = await navigate_to_cart_checkout(agent_p, shopping_agent, scenario_ = "cart", starting_url = base_url)
+
+        if not await _has_promo_field.acall(shopping_agent, cart_img_path):
+            # TODO: check if any information needs to be put in before moving to checkout; if yes, then enter info, else move to checkout page
+            cart_img_path = await navigate_to_cart_checkout(agent_p, shopping_agent, scenario_ = "checkout")
+        done("checkout", cart_url=agent_p.page.url)
 
     # check if there needs to be information put in, if yes then fill text fields and select from selectors, else find promo area
     # selectors = await agent_p.list_select_fields()
     # ---------------------------------------------------------------------------------- #
+    _cost_phase(shopping_agent, "promo")
     promo_applied, pre_promo_img, apply_promo_img = await attempt_applying_promo(agent_p, shopping_agent, promo, cart_img_path)
     
     # closing
+    _cost_phase(shopping_agent, "outcome")
     if promo_applied:
         if compute_fin:
-            fin_out = _final_outcome(verifier_agent, promo_criteria, pre_promo_img, apply_promo_img)
+            fin_out = await _final_outcome.acall(verifier_agent, promo_criteria, pre_promo_img, apply_promo_img)
         else:
             fin_out = "Execution Succeeded"
     else:
       fin_out = "Execution Failed"
 
+    saved = getattr(agent_p, "readiness_saved", 0.0)
+    agent_p.log_and_print(f"Readiness waits saved {saved:.1f}s versus fixed sleeps this job; worker totals: {READINESS.report()}", level='metadata')
+
     return promo_applied, promo_criteria, added_products, fin_out, pre_promo_img, apply_promo_img
+
+
+# ------------------------------ trace replay (VERIFY) ------------------------------ #
+async def _replay_step(agent_p, step, promo):
+    """Perform one recorded click/fill if its element is still on the page; False on divergence."""
+    try:
+        if step["op"] == "fill":
+            available = await agent_p.list_text_entry_fields()
+        elif "button" in step:
+            available = await agent_p.list_available_buttons()
+        else:
+            available = await agent_p.get_buttons_full(include_elements = False) + await agent_p.get_possible_links()
+        target = step.get("button", step.get("attrs"))
+        if fingerprint(target) not in {fingerprint(item) for item in available}:
+            return False
+
+        if step["op"] == "fill":
+            await agent_p.add_text_to_field(dict(target), promo) ; await settle(agent_p, 4, "text_entry")
+        elif "button" in step:
+            await agent_p.select_and_click_button(target, only_one = True) ; await settle(agent_p, 4, "click")
+        else:
+            await agent_p.click_button_by_attrs(dict(target), only_one = True)
+            await settle(agent_p, 12 if step["step"] == "apply_button" else 8, "replay_click")
+        return True
+    except Exception as e:
+        agent_p.log_and_print(f"Replay of {step['step']} failed: {e}", level='warning')
+        return False
+
+
+async def process_verification(url, desc, promo, agent_p, shopping_agent, verifier_agent, trace, compute_fin = True):
+    """
+    Re-verify a promo by replaying a recorded `ActionTrace` instead of rerunning
+    the four phases. Recorded elements are checked against the live page (no
+    model call); only a step that diverges falls back to its LLM/vision
+    counterpart. Returns the `process_job` tuple plus replay stats.
+    """
+    start = time.monotonic()
+    tokens_before = shopping_agent.token_totals["input_tokens"] + verifier_agent.token_totals["input_tokens"]
+    stats = {"steps": len(trace), "replayed": 0, "diverged": []}
+    promo_criteria = trace.promo_criteria or desc
+    stem = agent_p.path_stem
+    _cost_phase(shopping_agent, "replay")
+
+    await _open_browser(agent_p)
+    await agent_p.navigate(format_url(url)) ; await settle(agent_p, 8, "landing")
+
+    promo_applied, pre_promo_img, apply_promo_img = False, "", ""
+    product_idx = 0
+    finished = False
+    for i, step in enumerate(trace.steps):
+        if step["op"] == "navigate":
+            if step["step"] == "product":
+                product_idx += 1
+            await agent_p.navigate(step["url"]) ; await settle(agent_p, 4, "navigate")
+            stats["replayed"] += 1
+            continue
+
+        if step["step"] == "promo_field":
+            before_fill_img = f"{stem}verify_prepromo.png"
+            await capture_screenshot(agent_p, before_fill_img)
+        elif step["step"] == "apply_button":
+            pre_promo_img = f"{stem}verify_postpromo.png"
+            await capture_screenshot(agent_p, pre_promo_img)
+
+        if await _replay_step(agent_p, step, promo):
+            stats["replayed"] += 1
+            if step["step"] == "apply_button":
+                apply_promo_img = f"{stem}verify_promo-apply.png"
+                await capture_screenshot(agent_p, apply_promo_img)
+                # unchanged screenshots resolve without a model call
+                promo_applied = await _is_promo_applied.acall(shopping_agent, pre_promo_img, apply_promo_img)
+                finished = True
+                break
+            continue
+
+        # diverged: this step (and only this step) goes back to the model
+        agent_p.log_and_print(f"Replay diverged at step {i}: {step}", level='warning')
+        stats["diverged"].append(step["step"])
+        if step["step"] == "customization":
+            await apply_customization(agent_p, shopping_agent, f"verify_{product_idx}", step["cstm"], step["options"])
+        elif step["step"] == "add_to_cart":
+            await attempt_to_add_product(agent_p, shopping_agent, f"verify_{product_idx}")
+        elif step["step"].endswith("_navigation"):
+            await navigate_to_cart_checkout(agent_p, shopping_agent, scenario_ = step["step"].split("_")[0])
+        else:
+            # promo field or apply button: redo the whole promo entry on the current page
+            cart_img_path = f"{stem}verify_cart.png"
+            await capture_screenshot(agent_p, cart_img_path)
+            promo_applied, pre_promo_img, apply_promo_img = await attempt_applying_promo(agent_p, shopping_agent, promo, cart_img_path)
+            finished = True
+        if finished:
+            break
+
+    if not finished:
+        agent_p.log_and_print("Trace ended before the promo was applied", level='error')
+
+    _cost_phase(shopping_agent, "outcome")
+    if promo_applied:
+        if compute_fin:
+            fin_out = await _final_outcome.acall(verifier_agent, promo_criteria, pre_promo_img, apply_promo_img)
+        else:
+            fin_out = "Execution Succeeded"
+    else:
+        fin_out = "Execution Failed"
+
+    stats["seconds"] = round(time.monotonic() - start, 1)
+    stats["input_tokens"] = shopping_agent.token_totals["input_tokens"] + verifier_agent.token_totals["input_tokens"] - tokens_before
+    agent_p.log_and_print(f"Trace replay: {stats}", level='metadata')
+    return promo_applied, promo_criteria, fin_out, pre_promo_img, apply_promo_img, stats
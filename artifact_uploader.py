@@ -0,0 +1,234 @@
+# artifact_uploader.py
+from __future__ import annotations
+
+import gzip
+import json
+import os
+import queue
+import random
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional, Sequence, Tuple, Union
+
+from image_store import IMAGES
+from server_config import JOB_SERVER, JobServerClient
+
+CHUNK = 64 * 1024
+# output_dict entries that leave the JSON body and travel as gzip-compressed files
+LOG_KEYS = ("agent_p_log",)
+
+
+class MultipartStream:
+    """
+    multipart/form-data body produced from files on disk chunk by chunk.
+
+    Has a length, so requests sends it with a Content-Length header instead
+    of loading it into memory (and without base64-encoding the images).
+    """
+
+    def __init__(self, fields: Dict[str, str], files: Sequence[Tuple[str, Path, str]]) -> None:
+        self.boundary = uuid.uuid4().hex
+        self.fields = fields
+        self.files = list(files)
+
+    @property
+    def content_type(self) -> str:
+        return f"multipart/form-data; boundary={self.boundary}"
+
+    def _field_head(self, name: str) -> bytes:
+        return f'--{self.boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n'.encode("utf-8")
+
+    def _file_head(self, name: str, path: Path, mimetype: str) -> bytes:
+        return (
+            f'--{self.boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{path.name}"\r\n'
+            f"Content-Type: {mimetype}\r\n\r\n"
+        ).encode("utf-8")
+
+    def __len__(self) -> int:
+        size = len(f"--{self.boundary}--\r\n")
+        for name, value in self.fields.items():
+            size += len(self._field_head(name)) + len(value.encode("utf-8")) + 2
+        for name, path, mimetype in self.files:
+            size += len(self._file_head(name, path, mimetype)) + path.stat().st_size + 2
+        return size
+
+    def __iter__(self) -> Iterator[bytes]:
+        for name, value in self.fields.items():
+            yield self._field_head(name) + value.encode("utf-8") + b"\r\n"
+        for name, path, mimetype in self.files:
+            yield self._file_head(name, path, mimetype)
+            with open(path, "rb") as fp:
+                while True:
+                    chunk = fp.read(CHUNK)
+                    if not chunk:
+                        break
+                    yield chunk
+            yield b"\r\n"
+        yield f"--{self.boundary}--\r\n".encode("utf-8")
+
+
+class ArtifactUploader:
+    """
+    Background queue for job results.
+
+    `submit` returns immediately; a writer thread spools the result into
+    `spool_dir` (JSON body, gzip-compressed logs, screenshots copied from the
+    in-memory image store) and streams it to the server as multipart/form-data.
+    Failed uploads stay spooled and are retried with backoff, and results
+    spooled by a previous worker process are picked up again on start. If the
+    server rejects multipart bodies (400/404/405/415) the uploader falls back
+    to the JSON + base64 `update_job_status` call.
+    """
+
+    def __init__(
+        self,
+        client: JobServerClient = JOB_SERVER,
+        spool_dir: Union[str, Path] = "./job_artifacts/outbox",
+        *,
+        max_attempts: int = 8,
+        backoff: float = 2.0,
+        max_backoff: float = 300.0,
+    ) -> None:
+        self.client = client
+        self.spool_dir = Path(spool_dir)
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.multipart = True
+        self.stats = {"uploaded": 0, "retried": 0, "failed": 0, "bytes": 0}
+        self._queue: "queue.Queue[Optional[Tuple[Any, Future]]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+
+    # -----------------------------------------------------------------------
+    # public helpers
+    # -----------------------------------------------------------------------
+
+    def start(self) -> "ArtifactUploader":
+        if self._thread is None:
+            self.spool_dir.mkdir(parents=True, exist_ok=True)
+            for leftover in sorted(p for p in self.spool_dir.iterdir() if (p / "manifest.json").exists()):
+                self._queue.put((leftover, Future()))
+            self._thread = threading.Thread(target=self._run, name="artifact-uploader", daemon=True)
+            self._thread.start()
+        return self
+
+    def submit(
+        self,
+        job_id: Any,
+        status: str,
+        text: Optional[Dict[str, Any]] = None,
+        image_path: Optional[str] = None,
+        extra_images: Sequence[str] = (),
+    ) -> Future:
+        """Queue a status update with its artifacts; the Future resolves to True once the server has it."""
+        self.start()
+        future: Future = Future()
+        self._queue.put(({"job_id": job_id, "status": status, "text": text, "image_path": image_path,
+                          "extra_images": list(extra_images)}, future))
+        return future
+
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def drain(self, timeout: Optional[float] = None) -> None:
+        """Block until everything queued so far has been attempted."""
+        done = threading.Event()
+        self._queue.put((done, Future()))
+        done.wait(timeout)
+
+    # -----------------------------------------------------------------------
+    # internal helpers
+    # -----------------------------------------------------------------------
+
+    def _run(self) -> None:
+        while True:
+            item, future = self._queue.get()
+            if isinstance(item, threading.Event):
+                item.set()
+                continue
+            try:
+                spool = item if isinstance(item, Path) else self._spool(item)
+                future.set_result(self._deliver(spool))
+            except Exception as e:
+                print(f"artifact upload error: {e}")
+                future.set_result(False)
+
+    def _spool(self, item: Dict[str, Any]) -> Path:
+        """Write one result to its own spool folder so it survives failures and restarts."""
+        spool = self.spool_dir / f"{int(time.time() * 1000)}_{item['job_id']}"
+        spool.mkdir(parents=True, exist_ok=True)
+        text = dict(item["text"]) if item["text"] is not None else None
+        files = []
+        for key in LOG_KEYS:
+            if text is not None and key in text:
+                path = spool / f"{key}.json.gz"
+                with gzip.open(path, "wt", encoding="utf-8") as fp:
+                    json.dump(text.pop(key), fp, ensure_ascii=False, default=str)
+                files.append(["log_file" if key == "agent_p_log" else key, path.name, "application/gzip"])
+        images = [("image_file_data", item["image_path"])] if item["image_path"] else []
+        images += [(f"extra_image_{i}", p) for i, p in enumerate(item["extra_images"]) if p]
+        for name, src in images:
+            dst = spool / f"{name}{Path(src).suffix or '.png'}"
+            data = IMAGES.get(src)
+            if data is not None:
+                dst.write_bytes(data)
+            elif os.path.exists(src):
+                shutil.copyfile(src, dst)
+            else:
+                continue
+            files.append([name, dst.name, "image/png"])
+        manifest = {"job_id": item["job_id"], "status": item["status"], "text": text, "files": files, "attempts": 0}
+        (spool / "manifest.json").write_text(json.dumps(manifest, ensure_ascii=False, default=str), encoding="utf-8")
+        return spool
+
+    def _deliver(self, spool: Path) -> bool:
+        manifest_path = spool / "manifest.json"
+        manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+        while manifest["attempts"] < self.max_attempts:
+            manifest["attempts"] += 1
+            manifest_path.write_text(json.dumps(manifest, ensure_ascii=False, default=str), encoding="utf-8")
+            if self._send(spool, manifest):
+                self.stats["uploaded"] += 1
+                shutil.rmtree(spool, ignore_errors=True)
+                return True
+            self.stats["retried"] += 1
+            time.sleep(random.uniform(0, min(self.max_backoff, self.backoff * 2 ** manifest["attempts"])))
+        # kept on disk; the next worker start tries again
+        self.stats["failed"] += 1
+        print(f"giving up on upload {spool.name} for now after {manifest['attempts']} attempts")
+        return False
+
+    def _send(self, spool: Path, manifest: Dict[str, Any]) -> bool:
+        if not self.multipart:
+            return self._send_legacy(spool, manifest)
+        fields = {"job_id": str(manifest["job_id"]), "status": manifest["status"]}
+        if manifest["text"] is not None:
+            fields["text_file_data"] = json.dumps(manifest["text"], ensure_ascii=False, default=str)
+        body = MultipartStream(fields, [(name, spool / fname, mimetype) for name, fname, mimetype in manifest["files"]])
+        r = self.client._request(
+            "POST", "update", "/private_api/update", data=body,
+            headers={"Content-Type": body.content_type},
+        )
+        if r is not None and r.status_code in (400, 404, 405, 415):
+            print(f"server rejected a multipart upload ({r.status_code}), using JSON uploads")
+            self.multipart = False
+            return self._send_legacy(spool, manifest)
+        if r is not None and r.status_code == 200:
+            self.stats["bytes"] += len(body)
+            return True
+        return False
+
+    def _send_legacy(self, spool: Path, manifest: Dict[str, Any]) -> bool:
+        text = dict(manifest["text"]) if manifest["text"] is not None else None
+        image_path = None
+        for name, fname, _ in manifest["files"]:
+            if name == "log_file" and text is not None:
+                with gzip.open(spool / fname, "rt", encoding="utf-8") as fp:
+                    text["agent_p_log"] = json.load(fp)
+            elif name == "image_file_data":
+                image_path = str(spool / fname)
+        return self.client.update_job_status(manifest["job_id"], manifest["status"], text=text, image_path=image_path)
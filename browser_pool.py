@@ -0,0 +1,295 @@
+# browser_pool.py
+from __future__ import annotations
+
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional
+
+from playwright.async_api import Browser, BrowserContext, Page, Playwright, async_playwright
+
+
+class BrowserLease:
+    """One job's slice of the pool: an isolated browser context and its working page."""
+
+    def __init__(self, context: BrowserContext, page: Page, generation: int) -> None:
+        self.context = context
+        self.page = page
+        self.generation = generation
+        self.created = time.monotonic()
+        self.uses = 0
+
+    def __repr__(self) -> str:
+        return f"<BrowserLease gen={self.generation} uses={self.uses}>"
+
+
+class BrowserPool:
+    """
+    A single Chromium process per worker, shared by every job it runs:
+
+    • Warm, pre-created contexts so `acquire` is a queue pop, not a launch
+    • Each job gets its own BrowserContext (cookies, storage, cache isolated)
+    • Contexts are recycled (cleared) up to `max_context_uses`, then closed
+    • Health check on every hand-out; dead contexts are dropped and replaced
+    • If Chromium crashes it is relaunched in the background with backoff
+    """
+
+    # ---- construction ------------------------------------------------------
+
+    def __init__(
+        self,
+        *,
+        size: int = 1,
+        headless: bool = True,
+        max_context_uses: int = 1,
+        max_context_age: float = 1800.0,
+        health_timeout: float = 5.0,
+        launch_kwargs: Optional[Dict[str, Any]] = None,
+        context_kwargs: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        """
+        Parameters
+        ----------
+        size
+            Number of warm contexts kept ready (usually the worker concurrency).
+        headless
+            Launch Chromium headless.
+        max_context_uses
+            Jobs a context may serve before it is closed; 1 means a fresh
+            context per job, larger values clear cookies/permissions between jobs.
+        max_context_age
+            Seconds after which a context is retired regardless of use count.
+        health_timeout
+            Seconds a context has to answer the liveness probe.
+        launch_kwargs / context_kwargs
+            Forwarded to `chromium.launch` / `browser.new_context`.
+        """
+        self.size = max(1, size)
+        self.headless = headless
+        self.max_context_uses = max(1, max_context_uses)
+        self.max_context_age = max_context_age
+        self.health_timeout = health_timeout
+        self.launch_kwargs = launch_kwargs or {}
+        self.context_kwargs = context_kwargs or {}
+
+        self._playwright: Optional[Playwright] = None
+        self._browser: Optional[Browser] = None
+        self._generation = 0
+        self._idle: asyncio.Queue[BrowserLease] = asyncio.Queue()
+        self._browser_ready = asyncio.Event()
+        self._rebuild_task: Optional[asyncio.Task] = None
+        self._background: set[asyncio.Task] = set()
+        self._closing = False
+
+        self.stats = {
+            "launches": 0,
+            "contexts_created": 0,
+            "contexts_recycled": 0,
+            "contexts_discarded": 0,
+            "acquires": 0,
+        }
+
+    # -----------------------------------------------------------------------
+    # lifecycle
+    # -----------------------------------------------------------------------
+
+    async def start(self) -> "BrowserPool":
+        """Start Playwright and launch Chromium once; call before the first job."""
+        self._playwright = await async_playwright().start()
+        await self._launch()
+        return self
+
+    async def close(self) -> None:
+        """Close every context, the browser and Playwright itself."""
+        self._closing = True
+        self._browser_ready.clear()
+        for task in list(self._background):
+            task.cancel()
+        if self._rebuild_task:
+            self._rebuild_task.cancel()
+        while not self._idle.empty():
+            await self._close_lease(self._idle.get_nowait())
+        if self._browser and self._browser.is_connected():
+            await self._browser.close()
+        if self._playwright:
+            await self._playwright.stop()
+
+    async def __aenter__(self) -> "BrowserPool":
+        return await self.start()
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self.close()
+
+    # -----------------------------------------------------------------------
+    # leasing
+    # -----------------------------------------------------------------------
+
+    async def acquire(self) -> BrowserLease:
+        """Return a healthy, isolated context; waits if the browser is being rebuilt."""
+        while True:
+            await self._browser_ready.wait()
+            try:
+                lease = self._idle.get_nowait()
+            except asyncio.QueueEmpty:
+                # more jobs than warm contexts: the pool size is a soft limit
+                lease = await self._new_lease()
+
+            if await self._is_healthy(lease):
+                lease.uses += 1
+                self.stats["acquires"] += 1
+                return lease
+            await self._discard(lease)
+
+    async def release(self, lease: BrowserLease, *, discard: bool = False) -> None:
+        """Hand a context back; it is either cleared for reuse or closed and replaced."""
+        expired = (
+            lease.uses >= self.max_context_uses
+            or time.monotonic() - lease.created > self.max_context_age
+        )
+        if discard or expired or self._closing or not await self._is_healthy(lease):
+            await self._discard(lease)
+            return
+
+        try:
+            await self._reset(lease)
+        except Exception:
+            await self._discard(lease)
+            return
+        self.stats["contexts_recycled"] += 1
+        self._idle.put_nowait(lease)
+
+    @asynccontextmanager
+    async def lease(self) -> AsyncIterator[BrowserLease]:
+        """`async with pool.lease() as lease:` — acquire/release around a job."""
+        lease = await self.acquire()
+        try:
+            yield lease
+        finally:
+            await self.release(lease)
+
+    # -----------------------------------------------------------------------
+    # PlaywrightAgent integration
+    # -----------------------------------------------------------------------
+
+    def bind(self, agent_p, lease: BrowserLease) -> None:
+        """Point a PlaywrightAgent at a pooled context instead of its own browser."""
+        agent_p.playwright = self._playwright
+        agent_p.browser = self._browser
+        agent_p.context = lease.context
+        agent_p.page = lease.page
+        agent_p.browser_pool = self
+        agent_p.browser_lease = lease
+
+    async def renew(self, agent_p) -> None:
+        """
+        Swap a bound agent onto a fresh context (cheap stand-in for a driver restart).
+
+        The fresh context moves into the agent's existing BrowserLease, so the
+        `lease()` block around the job still releases exactly one lease.
+        """
+        lease = getattr(agent_p, "browser_lease", None)
+        fresh = await self.acquire()
+        if lease is None:
+            self.bind(agent_p, fresh)
+            return
+        old = BrowserLease(lease.context, lease.page, lease.generation)
+        lease.context, lease.page, lease.generation = fresh.context, fresh.page, fresh.generation
+        lease.created, lease.uses = fresh.created, fresh.uses
+        self.bind(agent_p, lease)
+        await self._discard(old)
+
+    # -----------------------------------------------------------------------
+    # internal helpers
+    # -----------------------------------------------------------------------
+
+    async def _launch(self) -> None:
+        assert self._playwright is not None
+        self._browser = await self._playwright.chromium.launch(headless=self.headless, **self.launch_kwargs)
+        self._browser.on("disconnected", self._on_disconnected)
+        self._generation += 1
+        self.stats["launches"] += 1
+        for _ in range(self.size - self._idle.qsize()):
+            self._idle.put_nowait(await self._new_lease())
+        self._browser_ready.set()
+
+    def _on_disconnected(self, browser: Browser) -> None:
+        if self._closing or browser is not self._browser:
+            return
+        print("BrowserPool: browser disconnected, rebuilding in background")
+        self._browser_ready.clear()
+        if self._rebuild_task is None or self._rebuild_task.done():
+            self._rebuild_task = asyncio.get_event_loop().create_task(self._rebuild())
+
+    async def _rebuild(self) -> None:
+        # leases from the dead browser are useless, drop them without touching them
+        while not self._idle.empty():
+            self._idle.get_nowait()
+            self.stats["contexts_discarded"] += 1
+        backoff = 1.0
+        while not self._closing:
+            try:
+                await self._launch()
+                return
+            except Exception as e:
+                print(f"BrowserPool: relaunch failed ({e}), retrying in {backoff:.0f}s")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 60.0)
+
+    async def _new_lease(self) -> BrowserLease:
+        assert self._browser is not None
+        context = await self._browser.new_context(**self.context_kwargs)
+        page = await context.new_page()
+        self.stats["contexts_created"] += 1
+        return BrowserLease(context, page, self._generation)
+
+    async def _is_healthy(self, lease: BrowserLease) -> bool:
+        if lease.generation != self._generation or self._browser is None or not self._browser.is_connected():
+            return False
+        if lease.page.is_closed():
+            return False
+        try:
+            await asyncio.wait_for(lease.page.evaluate("() => 1"), timeout=self.health_timeout)
+            return True
+        except Exception:
+            return False
+
+    async def _reset(self, lease: BrowserLease) -> None:
+        """Clear per-job state so a recycled context looks new to the next job."""
+        for page in lease.context.pages:
+            if page is not lease.page:
+                await page.close()
+        await lease.page.goto("about:blank")
+        await lease.context.clear_cookies()
+        await lease.context.clear_permissions()
+
+    async def _discard(self, lease: BrowserLease) -> None:
+        self.stats["contexts_discarded"] += 1
+        await self._close_lease(lease)
+        if not self._closing and self._browser_ready.is_set() and self._idle.qsize() < self.size:
+            # pre-warm the replacement off the job's critical path
+            task = asyncio.get_event_loop().create_task(self._replenish())
+            self._background.add(task)
+            task.add_done_callback(self._background.discard)
+
+    async def _replenish(self) -> None:
+        try:
+            self._idle.put_nowait(await self._new_lease())
+        except Exception as e:
+            print(f"BrowserPool: could not pre-warm context ({e})")
+
+    @staticmethod
+    async def _close_lease(lease: BrowserLease) -> None:
+        try:
+            await lease.context.close()
+        except Exception:
+            pass
+
+
+# ---------------------------------------------------------------------------
+# helper functions (module‑level)
+# ---------------------------------------------------------------------------
+
+
+def is_pooled(agent_p) -> bool:
+    """True if the agent's browser is owned by a BrowserPool (don't launch/close it)."""
+    return getattr(agent_p, "browser_pool", None) is not None
@@ -0,0 +1,71 @@
+# call_graph.py
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Sequence, Tuple
+
+
+class CallGraph:
+    """
+    Runs a set of awaitable calls (typically `prompt.acall(...)`) as soon as the
+    calls they depend on have finished.
+
+    Each node is registered with the names of the nodes it needs; its factory
+    receives their results as keyword arguments:
+
+        graph = CallGraph()
+        graph.add("options", lambda: _get_product_options.acall(agent, img))
+        graph.add("details", lambda: _get_product_details.acall(agent, img, text))
+        graph.add("essentials", lambda options: _get_essential_customizations.acall(agent, img, options), after=("options",))
+        results = await graph.run()
+
+    Independent nodes run concurrently, so the wall time approaches the longest
+    dependency chain instead of the sum of all calls.
+    """
+
+    def __init__(self) -> None:
+        self._nodes: Dict[str, Tuple[Callable[..., Awaitable[Any]], Tuple[str, ...]]] = {}
+        self.timings: Dict[str, float] = {}
+        self.elapsed: Optional[float] = None
+
+    def add(self, name: str, factory: Callable[..., Awaitable[Any]], after: Sequence[str] = ()) -> "CallGraph":
+        """Register *factory* under *name*; it is called with the results of the *after* nodes."""
+        if name in self._nodes:
+            raise ValueError(f"duplicate call graph node {name!r}")
+        missing = [dep for dep in after if dep not in self._nodes]
+        if missing:
+            # dependencies must be declared first, which also rules out cycles
+            raise ValueError(f"node {name!r} depends on undeclared {missing}")
+        self._nodes[name] = (factory, tuple(after))
+        return self
+
+    async def run(self) -> Dict[str, Any]:
+        """Execute every node; returns {name: result}. The first failure cancels the rest."""
+        start = time.monotonic()
+        tasks: Dict[str, asyncio.Task] = {}
+
+        async def _node(name: str, factory, after: Tuple[str, ...]) -> Any:
+            deps = {dep: await tasks[dep] for dep in after}
+            t0 = time.monotonic()
+            result = await factory(**deps)
+            self.timings[name] = time.monotonic() - t0
+            return result
+
+        for name, (factory, after) in self._nodes.items():
+            tasks[name] = asyncio.ensure_future(_node(name, factory, after))
+        try:
+            results = await asyncio.gather(*tasks.values())
+        finally:
+            for task in tasks.values():
+                task.cancel()
+            self.elapsed = time.monotonic() - start
+        return dict(zip(tasks, results))
+
+    @property
+    def serial_time(self) -> float:
+        """What the same calls would have taken back to back."""
+        return sum(self.timings.values())
+
+    def __repr__(self) -> str:
+        return f"<CallGraph nodes={len(self._nodes)} elapsed={self.elapsed or 0.0:.2f} serial={self.serial_time:.2f}>"
@@ -0,0 +1,187 @@
+# cost_budget.py
+from __future__ import annotations
+
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+# USD per 1M tokens: (input, cached input, output); reasoning tokens are billed as output
+PRICES: Dict[str, Tuple[float, float, float]] = {
+    "o1-2024-12-17":           (15.00, 7.50, 60.00),
+    "o1":                      (15.00, 7.50, 60.00),
+    "o3":                      ( 2.00, 0.50,  8.00),
+    "o4-mini-2025-04-16":      ( 1.10, 0.275, 4.40),
+    "o4-mini":                 ( 1.10, 0.275, 4.40),
+    "gpt-4.1-2025-04-14":      ( 2.00, 0.50,  8.00),
+    "gpt-4.1":                 ( 2.00, 0.50,  8.00),
+    "gpt-4.1-mini-2025-04-14": ( 0.40, 0.10,  1.60),
+    "gpt-4.1-mini":            ( 0.40, 0.10,  1.60),
+    "gpt-4o-2024-11-20":       ( 2.50, 1.25, 10.00),
+    "gpt-4o":                  ( 2.50, 1.25, 10.00),
+}
+
+# next cheaper model with the same (vision) capabilities; chains end at gpt-4.1-mini
+DOWNGRADES: Dict[str, str] = {
+    "o1-2024-12-17":      "o4-mini-2025-04-16",
+    "o1":                 "o4-mini-2025-04-16",
+    "o3":                 "o4-mini-2025-04-16",
+    "o4-mini-2025-04-16": "gpt-4.1-mini-2025-04-14",
+    "o4-mini":            "gpt-4.1-mini-2025-04-14",
+    "gpt-4o-2024-11-20":  "gpt-4.1-mini-2025-04-14",
+    "gpt-4o":             "gpt-4.1-mini-2025-04-14",
+    "gpt-4.1-2025-04-14": "gpt-4.1-mini-2025-04-14",
+    "gpt-4.1":            "gpt-4.1-mini-2025-04-14",
+}
+
+
+class BudgetExceeded(RuntimeError):
+    """Raised before a model call once the job's budget is spent; carries the cost report."""
+
+    def __init__(self, report: Dict[str, Any]) -> None:
+        super().__init__(f"LLM budget of ${report['limit_usd']:.2f} exhausted (spent ${report['spent_usd']:.4f})")
+        self.report = report
+
+
+class CostLedger:
+    """Tokens and USD per (phase, prompt type, model), from the usage of each API response."""
+
+    def __init__(self) -> None:
+        self.entries: Dict[Tuple[str, str, str], Dict[str, float]] = {}
+        self.cached_calls = 0
+        self.unpriced = set()
+        self._lock = threading.Lock()
+
+    def record(self, model: str, usage: Dict[str, Any], prompt_type: Optional[str] = None, phase: Optional[str] = None) -> float:
+        cost, known = call_cost(model, usage)
+        key = (phase or "unphased", prompt_type or "unnamed", model)
+        with self._lock:
+            entry = self.entries.setdefault(key, {"calls": 0, "input_tokens": 0, "cached_tokens": 0,
+                                                  "output_tokens": 0, "reasoning_tokens": 0, "usd": 0.0})
+            entry["calls"] += 1
+            entry["input_tokens"] += usage.get("input_tokens", 0)
+            entry["cached_tokens"] += _cached_tokens(usage)
+            entry["output_tokens"] += usage.get("output_tokens", 0)
+            entry["reasoning_tokens"] += _reasoning_tokens(usage)
+            entry["usd"] += cost
+            if not known:
+                self.unpriced.add(model)
+        return cost
+
+    def record_cached(self) -> None:
+        with self._lock:
+            self.cached_calls += 1
+
+    @property
+    def total(self) -> float:
+        with self._lock:
+            return sum(e["usd"] for e in self.entries.values())
+
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            by = {"phase": {}, "prompt": {}, "model": {}}
+            for (phase, prompt, model), entry in self.entries.items():
+                for axis, name in (("phase", phase), ("prompt", prompt), ("model", model)):
+                    agg = by[axis].setdefault(name, {"calls": 0, "usd": 0.0})
+                    agg["calls"] += entry["calls"]
+                    agg["usd"] += entry["usd"]
+            for axis in by.values():
+                for agg in axis.values():
+                    agg["usd"] = round(agg["usd"], 4)
+            return {
+                "spent_usd": round(sum(e["usd"] for e in self.entries.values()), 4),
+                "calls": sum(e["calls"] for e in self.entries.values()),
+                "cached_calls": self.cached_calls,
+                "by_phase": by["phase"],
+                "by_prompt": by["prompt"],
+                "by_model": by["model"],
+                "unpriced_models": sorted(self.unpriced),
+            }
+
+
+class JobBudget:
+    """
+    USD budget shared by every model wrapper working on one job.
+
+    `route` swaps the requested model for a cheaper one as the budget is used
+    up: one step down `DOWNGRADES` past `downgrade_at` of the limit, to the
+    end of the chain past `cheapest_at`. `check` raises `BudgetExceeded` once
+    the limit is reached, before the next call is sent. A limit of None or 0
+    only keeps the ledger. `phase` is set by the pipeline and attributes
+    calls in the ledger.
+    """
+
+    def __init__(self, limit_usd: Optional[float] = None, *, downgrade_at: float = 0.5, cheapest_at: float = 0.8) -> None:
+        self.limit_usd = limit_usd or None
+        self.downgrade_at = downgrade_at
+        self.cheapest_at = cheapest_at
+        self.ledger = CostLedger()
+        self.phase: Optional[str] = None
+        self.downgrades: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def spent(self) -> float:
+        return self.ledger.total
+
+    @property
+    def used(self) -> float:
+        """Fraction of the limit spent (0 without a limit)."""
+        return self.spent / self.limit_usd if self.limit_usd else 0.0
+
+    def route(self, model: str) -> str:
+        used = self.used
+        if used < self.downgrade_at:
+            return model
+        routed = DOWNGRADES.get(model, model)
+        while used >= self.cheapest_at and routed in DOWNGRADES:
+            routed = DOWNGRADES[routed]
+        if routed != model:
+            with self._lock:
+                key = f"{model}->{routed}"
+                self.downgrades[key] = self.downgrades.get(key, 0) + 1
+        return routed
+
+    def check(self) -> None:
+        if self.limit_usd and self.spent >= self.limit_usd:
+            raise BudgetExceeded(self.report())
+
+    def record(self, model: str, usage: Dict[str, Any], prompt_type: Optional[str] = None) -> float:
+        return self.ledger.record(model, usage, prompt_type, self.phase)
+
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            downgrades = dict(self.downgrades)
+        return dict(self.ledger.report(), limit_usd=self.limit_usd, used=round(self.used, 3), downgrades=downgrades)
+
+
+def price_of(model: str) -> Optional[Tuple[float, float, float]]:
+    """Price row for *model*; dated snapshots fall back to their family (longest matching prefix)."""
+    if model in PRICES:
+        return PRICES[model]
+    family = max((name for name in PRICES if model.startswith(name)), key=len, default=None)
+    return PRICES[family] if family else None
+
+
+def call_cost(model: str, usage: Dict[str, Any]) -> Tuple[float, bool]:
+    """(USD, priced?) for one response's usage."""
+    price = price_of(model)
+    if price is None:
+        return 0.0, False
+    cached = _cached_tokens(usage)
+    fresh = max(0, usage.get("input_tokens", 0) - cached)
+    return (fresh * price[0] + cached * price[1] + usage.get("output_tokens", 0) * price[2]) / 1e6, True
+
+
+def _detail(usage: Dict[str, Any], field: str, key: str) -> int:
+    details = usage.get(field)
+    if details is None:
+        return 0
+    value = details.get(key) if isinstance(details, dict) else getattr(details, key, None)
+    return value or 0
+
+
+def _cached_tokens(usage: Dict[str, Any]) -> int:
+    return _detail(usage, "input_tokens_details", "cached_tokens")
+
+
+def _reasoning_tokens(usage: Dict[str, Any]) -> int:
+    return _detail(usage, "output_tokens_details", "reasoning_tokens") or usage.get("reasoning_tokens", 0)
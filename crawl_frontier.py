@@ -0,0 +1,249 @@
+# crawl_frontier.py
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import time
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+from urllib.parse import urlsplit
+
+from link_scorer import HopTimer, rank_links
+from page_readiness import READINESS
+from url_tools import resolve_href, url_key
+
+# every anchor with its absolute href and visible text, in document order
+_LINKS_JS = """
+() => Array.from(document.querySelectorAll('a[href]')).map(a => ({
+    href: a.href,
+    text: (a.innerText || a.getAttribute('aria-label') || a.title || '').trim().slice(0, 120),
+}))
+"""
+
+
+class FrontierItem:
+    __slots__ = ("url", "score", "depth", "source")
+
+    def __init__(self, url: str, score: float, depth: int, source: Optional[str]) -> None:
+        self.url = url
+        self.score = score
+        self.depth = depth
+        self.source = source
+
+    def __repr__(self) -> str:
+        return f"<FrontierItem {self.score:.1f} d={self.depth} {self.url}>"
+
+
+class CrawlFrontier:
+    """
+    Best-first queue of pages to visit.
+
+    Highest score pops first (ties in insertion order); every URL is
+    deduplicated by `url_key`, so membership checks are O(1) set lookups.
+    """
+
+    def __init__(self) -> None:
+        self._heap: List[Tuple[float, int, FrontierItem]] = []
+        self._seq = itertools.count()
+        self.seen: Set[str] = set()
+
+    def push(self, url: str, score: float = 0.0, depth: int = 0, source: Optional[str] = None, *, force: bool = False) -> bool:
+        """Queue *url* unless it was queued before (or *force*); returns True if queued."""
+        key = url_key(url)
+        if key in self.seen and not force:
+            return False
+        self.seen.add(key)
+        heapq.heappush(self._heap, (-score, next(self._seq), FrontierItem(url, score, depth, source)))
+        return True
+
+    def mark_seen(self, url: str) -> None:
+        """Record *url* as visited without queueing it (e.g. the page already open)."""
+        self.seen.add(url_key(url))
+
+    def pop(self) -> Optional[FrontierItem]:
+        return heapq.heappop(self._heap)[2] if self._heap else None
+
+    def __contains__(self, url: str) -> bool:
+        return url_key(url) in self.seen
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def pending_urls(self) -> List[str]:
+        """Queued, unvisited URLs, best first."""
+        return [item.url for _, _, item in sorted(self._heap)]
+
+
+class DomainLimiter:
+    """Per-domain politeness: at most `per_domain` concurrent loads and `min_interval` between starts."""
+
+    def __init__(self, per_domain: int = 2, min_interval: float = 0.5) -> None:
+        self.per_domain = per_domain
+        self.min_interval = min_interval
+        self._slots: Dict[str, asyncio.Semaphore] = defaultdict(lambda: asyncio.Semaphore(self.per_domain))
+        self._next_start: Dict[str, float] = defaultdict(float)
+
+    @asynccontextmanager
+    async def slot(self, url: str) -> AsyncIterator[None]:
+        host = (urlsplit(url).hostname or "").lower()
+        async with self._slots[host]:
+            now = time.monotonic()
+            start = max(now, self._next_start[host])
+            self._next_start[host] = start + self.min_interval
+            if start > now:
+                await asyncio.sleep(start - now)
+            yield
+
+
+class ParallelCrawler:
+    """
+    Best-first link discovery over several Playwright pages at once.
+
+    Pages are taken from a `CrawlFrontier` and loaded concurrently in their own
+    tabs of the agent's browser context, subject to a `DomainLimiter`. Each
+    page's links are ranked locally and the top few are classified by *sift*
+    (an async callable returning `ADD:` / `BROWSE:` lines, as from
+    `_sift_link_options`); BROWSE links enter the frontier with their score,
+    ADD links are collected. The crawl stops as soon as `enough` ADD links are
+    found or `max_pages` pages have been loaded.
+    """
+
+    def __init__(
+        self,
+        context,
+        sift: Callable[[List[str], str], Awaitable[str]],
+        *,
+        promo_criteria: Optional[str] = None,
+        concurrency: int = 3,
+        per_domain: int = 2,
+        min_interval: float = 0.5,
+        max_pages: int = 6,
+        enough: int = 10,
+        top_k: int = 12,
+        browse_bonus: float = 3.0,
+        page_timeout: float = 30.0,
+        log: Callable[..., Any] = print,
+    ) -> None:
+        self.context = context
+        self.sift = sift
+        self.promo_criteria = promo_criteria
+        self.concurrency = concurrency
+        self.limiter = DomainLimiter(per_domain, min_interval)
+        self.max_pages = max_pages
+        self.enough = enough
+        self.top_k = top_k
+        self.browse_bonus = browse_bonus
+        self.page_timeout = page_timeout
+        self.log = log
+
+        self.frontier = CrawlFrontier()
+        self.to_add: List[str] = []
+        self.sources: Dict[str, str] = {}
+        self.browsed: List[str] = []
+        self.add_on = ""
+        self.stats: Dict[str, Any] = {}
+        self._add_keys: Set[str] = set()
+        self._retried: Set[str] = set()
+
+    @property
+    def found_enough(self) -> bool:
+        return len(self.to_add) >= self.enough
+
+    async def crawl(self, start_url: str, hop_stats: Optional[List[Dict[str, Any]]] = None) -> List[str]:
+        """Run until done or out of pages; returns the ADD links in discovery order."""
+        start = time.monotonic()
+        self.base_url = start_url
+        self.frontier.push(start_url, float("inf"))
+        in_flight: Set[asyncio.Task] = set()
+        try:
+            while True:
+                while len(in_flight) < self.concurrency and len(self.frontier) and len(self.browsed) < self.max_pages and not self.found_enough:
+                    item = self.frontier.pop()
+                    self.browsed.append(item.url)
+                    in_flight.add(asyncio.ensure_future(self._visit(item, hop_stats)))
+                if not in_flight:
+                    if self._contingency(start_url):
+                        continue
+                    break
+                finished, in_flight = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                for task in finished:
+                    if task.exception() is not None:
+                        self.log(f"Crawl page failed: {task.exception()}")
+                if self.found_enough:
+                    break
+        finally:
+            # early stop: pages still loading are no longer needed
+            for task in in_flight:
+                task.cancel()
+            await asyncio.gather(*in_flight, return_exceptions=True)
+            self.stats = {
+                "pages": len(self.browsed),
+                "found": len(self.to_add),
+                "queued": len(self.frontier),
+                "seconds": round(time.monotonic() - start, 2),
+            }
+        return self.to_add
+
+    # -----------------------------------------------------------------------
+    # internal helpers
+    # -----------------------------------------------------------------------
+
+    def _contingency(self, start_url: str) -> bool:
+        # same fallback as the serial crawler: push the model towards BROWSE links once
+        if len(self.to_add) < 5 and self.add_on == "" and len(self.browsed) < self.max_pages:
+            self.log("Entered contingency prompt stance")
+            self.add_on = "\nIf no relevant product or page links are found, you must find BROWSE links that are likely to lead to the products you're looking for."
+            return self.frontier.push(start_url, float("inf"), force=True)
+        return False
+
+    async def _visit(self, item: FrontierItem, hop_stats: Optional[List[Dict[str, Any]]]) -> None:
+        timer = HopTimer(len(self.browsed))
+        try:
+            links, page_url = await self._load(item.url)
+        except Exception as e:
+            self.log(f"Could not load {item.url}: {e}")
+            if item.url not in self._retried:
+                self._retried.add(item.url)
+                self.frontier.push(item.url, item.score - 1.0, item.depth, item.source, force=True)
+            return
+
+        ranked = rank_links(links, page_url, base_url=self.base_url, promo_criteria=self.promo_criteria, top_k=self.top_k)
+        candidates = {s.url: s for s in ranked}
+        timer.links(links, list(candidates), page_url)
+        if candidates:
+            reply = await self.sift(list(candidates), self.add_on)
+            self._take(reply, candidates, item, page_url)
+        stats = timer.finish(hop_stats)
+        self.log(f"Crawled {page_url} (depth {item.depth}): {stats}")
+
+    async def _load(self, url: str) -> Tuple[List[Dict[str, str]], str]:
+        async with self.limiter.slot(url):
+            page = await self.context.new_page()
+            try:
+                await page.goto(url, wait_until="domcontentloaded", timeout=self.page_timeout * 1000)
+                await READINESS.settle(page, 4, "crawl")
+                return await page.evaluate(_LINKS_JS), page.url
+            finally:
+                await page.close()
+
+    def _take(self, reply: str, candidates: Dict[str, Any], item: FrontierItem, page_url: str) -> None:
+        for line in (reply or "").split("\n"):
+            line = line.strip()
+            tag, _, value = line.partition(":")
+            if tag not in ("ADD", "BROWSE"):
+                continue
+            url = resolve_href(page_url, value.strip())
+            if url not in candidates:
+                self.log(f"URL hallucination detected with url: {value.strip()}")
+                continue
+            if tag == "ADD" and item.depth > 0:
+                # the landing page's own product links are skipped, like the serial crawler did
+                key = url_key(url)
+                if key not in self._add_keys:
+                    self._add_keys.add(key)
+                    self.to_add.append(url)
+                    self.sources[url] = page_url
+            elif tag == "BROWSE":
+                self.frontier.push(url, candidates[url].score + self.browse_bonus, item.depth + 1, page_url)
@@ -0,0 +1,62 @@
+# criteria_cache.py
+from __future__ import annotations
+
+import hashlib
+import json
+import re
+import threading
+from typing import Any, Dict, Optional, Tuple, Union
+
+from action_memory import domain_of
+from llm_cache import MemoryLRUCache, SQLiteCache
+
+_WS = re.compile(r"\s+")
+
+
+class CriteriaCache:
+    """
+    Verified promo criteria (Phase 1 output) keyed on the shop's domain, the
+    promo code and the promo description.
+
+    The key is normalized (no scheme / `www.`, code upper-cased, description
+    case- and whitespace-folded), so a HELD retry or a re-submitted promo
+    skips the landing-page screenshot and the generate/verify loop. Entries
+    expire with the backing store's TTL and can be dropped with `invalidate`.
+    """
+
+    def __init__(self, store: Union[SQLiteCache, MemoryLRUCache, None] = None) -> None:
+        self.store = store if store is not None else MemoryLRUCache(ttl=3 * 24 * 3600)
+        self.stats = {"hits": 0, "misses": 0}
+        self._lock = threading.Lock()
+
+    def get(self, url: str, promo: str, desc: str) -> Optional[Tuple[str, str]]:
+        """(criteria, verifier response) from an earlier run, or None."""
+        raw = self.store.get(criteria_key(url, promo, desc))
+        value = None
+        if raw is not None:
+            try:
+                data = json.loads(raw)
+                value = data["criteria"], data.get("verification", "")
+            except (ValueError, KeyError, TypeError):
+                value = None
+        with self._lock:
+            self.stats["hits" if value else "misses"] += 1
+        return value
+
+    def put(self, url: str, promo: str, desc: str, criteria: str, verification: str = "") -> None:
+        if not criteria:
+            return
+        self.store.set(criteria_key(url, promo, desc), json.dumps({"criteria": criteria, "verification": verification}))
+
+    def invalidate(self, url: str, promo: str, desc: str) -> None:
+        self.store.invalidate(criteria_key(url, promo, desc))
+
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.stats["hits"] + self.stats["misses"]
+            return dict(self.stats, hit_rate=round(self.stats["hits"] / total, 3) if total else 0.0)
+
+
+def criteria_key(url: str, promo: str, desc: str) -> str:
+    parts = (domain_of(url), (promo or "").strip().upper(), _WS.sub(" ", (desc or "").strip().lower()))
+    return "criteria:" + hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest()
@@ -0,0 +1,130 @@
+# image_profiles.py
+from __future__ import annotations
+
+import io
+import math
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+
+class ImageProfile:
+    """How an image is shipped to a vision prompt: size cap, encoding and API detail level."""
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        max_width: Optional[int] = None,
+        max_height: Optional[int] = None,
+        format: str = "PNG",
+        quality: Optional[int] = None,
+        detail: str = "auto",
+    ) -> None:
+        self.name = name
+        self.max_width = max_width
+        self.max_height = max_height
+        self.format = format.upper()
+        self.quality = quality
+        self.detail = detail
+
+    @property
+    def mimetype(self) -> str:
+        return {"PNG": "image/png", "JPEG": "image/jpeg", "WEBP": "image/webp"}[self.format]
+
+    @property
+    def passthrough(self) -> bool:
+        """True when the source PNG can be sent untouched."""
+        return self.max_width is None and self.max_height is None and self.format == "PNG"
+
+    def __repr__(self) -> str:
+        return f"<ImageProfile {self.name} {self.max_width}x{self.max_height} {self.format} q={self.quality} detail={self.detail}>"
+
+
+# Declared per prompt in prompts.py via `@llm_prompt(image_profile=...)`
+PROFILES: Dict[str, ImageProfile] = {
+    # fine print matters: option swatches, prices after a promo
+    "detailed": ImageProfile("detailed", detail="high"),
+    # whole-page reading: product details, buttons, before/after checks
+    "standard": ImageProfile("standard", max_width=1024, max_height=1024, format="JPEG", quality=85, detail="high"),
+    # coarse yes/no questions about the page as a whole
+    "check": ImageProfile("check", max_width=768, max_height=768, format="JPEG", quality=70, detail="low"),
+}
+
+
+def get_profile(profile) -> Optional[ImageProfile]:
+    """Accept a profile object, a registered profile name, or None."""
+    if profile is None or isinstance(profile, ImageProfile):
+        return profile
+    return PROFILES[profile]
+
+
+# ---------------------------------------------------------------------------
+# conversion
+# ---------------------------------------------------------------------------
+
+
+def render(data: bytes, profile: ImageProfile) -> Tuple[bytes, Tuple[int, int], Tuple[int, int]]:
+    """
+    Re-encode *data* for *profile*.
+
+    Returns (encoded bytes, original (w, h), rendered (w, h)). Large integer
+    downscales are done as a NumPy box filter over the whole array, the
+    remaining fractional step by Pillow.
+    """
+    with Image.open(io.BytesIO(data)) as im:
+        original = im.size
+        if profile.passthrough and im.format == "PNG":
+            return data, original, original
+        arr = np.asarray(im.convert("RGB"))
+
+    arr = _box_downscale(arr, profile.max_width, profile.max_height)
+    out = Image.fromarray(arr)
+    target = _fit(out.size, profile.max_width, profile.max_height)
+    if target != out.size:
+        out = out.resize(target, Image.LANCZOS)
+
+    buf = io.BytesIO()
+    save_kwargs = {"quality": profile.quality} if profile.quality and profile.format != "PNG" else {}
+    out.save(buf, format=profile.format, **save_kwargs)
+    return buf.getvalue(), original, out.size
+
+
+def image_size(data: bytes) -> Tuple[int, int]:
+    """(w, h) from the image header without decoding the pixels."""
+    with Image.open(io.BytesIO(data)) as im:
+        return im.size
+
+
+def _fit(size: Tuple[int, int], max_w: Optional[int], max_h: Optional[int]) -> Tuple[int, int]:
+    w, h = size
+    scale = min(1.0, (max_w or w) / w, (max_h or h) / h)
+    return (max(1, round(w * scale)), max(1, round(h * scale)))
+
+
+def _box_downscale(arr: np.ndarray, max_w: Optional[int], max_h: Optional[int]) -> np.ndarray:
+    h, w = arr.shape[:2]
+    factor = int(max(w / (max_w or w), h / (max_h or h)))
+    if factor < 2:
+        return arr
+    h2, w2 = (h // factor) * factor, (w // factor) * factor
+    blocks = arr[:h2, :w2].reshape(h2 // factor, factor, w2 // factor, factor, arr.shape[2])
+    return blocks.mean(axis=(1, 3)).round().astype(np.uint8)
+
+
+# ---------------------------------------------------------------------------
+# token estimates (tile model: 85 base + 170 per 512px tile at high detail)
+# ---------------------------------------------------------------------------
+
+
+def estimate_image_tokens(size: Tuple[int, int], detail: str = "auto") -> int:
+    """Approximate input tokens for one image of *size* at *detail*."""
+    if detail == "low":
+        return 85
+    w, h = size
+    scale = min(1.0, 2048 / max(w, h))
+    w, h = w * scale, h * scale
+    scale = min(1.0, 768 / min(w, h))
+    w, h = w * scale, h * scale
+    return 85 + 170 * math.ceil(w / 512) * math.ceil(h / 512)
@@ -0,0 +1,140 @@
+# image_store.py
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Dict, Optional, Set, Tuple, Union
+
+ImagePath = Union[str, Path]
+
+
+class ImageStore:
+    """
+    Screenshot bytes kept in memory under their artifact path.
+
+    Producers `put` the bytes they just captured and carry on; the file under
+    `job_artifacts/` is written by a background thread. Consumers (`read`,
+    the LLM wrapper, the screenshot diff) are served from memory and only hit
+    the disk for images that were never put or have since been evicted.
+    Eviction is LRU by total bytes and never drops an image whose file is
+    still being written.
+    """
+
+    def __init__(self, max_bytes: int = 256 * 1024 * 1024, writer_threads: int = 2) -> None:
+        self.max_bytes = max_bytes
+        self._images: "OrderedDict[str, Tuple[bytes, str]]" = OrderedDict()
+        self._pending: Dict[str, int] = {}          # outstanding writes per path
+        self._futures: Set[Future] = set()
+        self._size = 0
+        self._lock = threading.Lock()
+        self._writer = ThreadPoolExecutor(max_workers=writer_threads, thread_name_prefix="image-writer")
+
+    # -----------------------------------------------------------------------
+    # public helpers
+    # -----------------------------------------------------------------------
+
+    def put(self, path: ImagePath, data: bytes, persist: bool = True) -> str:
+        """Register *data* as the image at *path*; returns its SHA-256. Disk write is async."""
+        key = _key(path)
+        digest = hashlib.sha256(data).hexdigest()
+        with self._lock:
+            old = self._images.pop(key, None)
+            if old is not None:
+                self._size -= len(old[0])
+            self._images[key] = (data, digest)
+            self._size += len(data)
+            if persist:
+                self._pending[key] = self._pending.get(key, 0) + 1
+                future = self._writer.submit(self._write, key, data)
+                self._futures.add(future)
+                future.add_done_callback(self._futures.discard)
+            self._evict()
+        return digest
+
+    def get(self, path: ImagePath) -> Optional[bytes]:
+        """In-memory bytes for *path*, or None."""
+        item = self._lookup(path)
+        return item[0] if item else None
+
+    def digest(self, path: ImagePath) -> Optional[str]:
+        """SHA-256 recorded at `put` time, or None if the image is not in memory."""
+        item = self._lookup(path)
+        return item[1] if item else None
+
+    def read(self, path: ImagePath) -> Tuple[bytes, str]:
+        """(bytes, sha256) for *path*, from memory when possible, else from disk."""
+        item = self._lookup(path)
+        if item:
+            return item
+        data = Path(_key(path)).read_bytes()
+        return data, hashlib.sha256(data).hexdigest()
+
+    def flush(self, timeout: Optional[float] = None) -> None:
+        """Block until every queued artifact write has reached the disk."""
+        with self._lock:
+            pending = list(self._futures)
+        wait(pending, timeout=timeout)
+
+    # -----------------------------------------------------------------------
+    # internal helpers
+    # -----------------------------------------------------------------------
+
+    def _lookup(self, path: ImagePath) -> Optional[Tuple[bytes, str]]:
+        key = _key(path)
+        with self._lock:
+            item = self._images.get(key)
+            if item is not None:
+                self._images.move_to_end(key)
+            return item
+
+    def _write(self, key: str, data: bytes) -> None:
+        try:
+            os.makedirs(os.path.dirname(key), exist_ok=True)
+            tmp = f"{key}.{threading.get_ident()}.part"
+            with open(tmp, "wb") as fp:
+                fp.write(data)
+            os.replace(tmp, key)
+        except OSError as e:
+            print(f"artifact write failed for {key}: {e}")
+        finally:
+            with self._lock:
+                self._pending[key] -= 1
+                if not self._pending[key]:
+                    del self._pending[key]
+                self._evict()
+
+    def _evict(self) -> None:
+        # caller holds the lock
+        for key in list(self._images):
+            if self._size <= self.max_bytes:
+                break
+            if key in self._pending:
+                continue
+            data, _ = self._images.pop(key)
+            self._size -= len(data)
+
+
+def _key(path: ImagePath) -> str:
+    return os.path.abspath(os.path.expanduser(str(path)))
+
+
+# one store per worker process
+IMAGES = ImageStore()
+
+
+async def capture_screenshot(agent_p, path: ImagePath, **kwargs) -> bytes:
+    """Screenshot the agent's page into memory; the artifact file is written in the background."""
+    data = await agent_p.page.screenshot(**kwargs)
+    IMAGES.put(path, data)
+    return data
+
+
+def capture_screenshot_sync(agent_s, path: ImagePath) -> bytes:
+    """Selenium counterpart of `capture_screenshot`."""
+    data = agent_s.driver.get_screenshot_as_png()
+    IMAGES.put(path, data)
+    return data
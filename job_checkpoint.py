@@ -0,0 +1,104 @@
+# job_checkpoint.py
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+# in pipeline order; completing a phase invalidates everything recorded after it
+PHASES = ("criteria", "links", "cart", "checkout")
+
+
+class JobCheckpoint:
+    """
+    Outputs of the completed phases of one job, persisted after each phase so a
+    HELD retry resumes where the failed attempt stopped.
+
+    The file is bound to the job's inputs (url, promo, description): a
+    checkpoint written for different inputs, or older than `max_age`
+    seconds, is ignored. Callers still validate what they read back (a
+    restored cart, a cart URL) before trusting it, and `drop` a phase that
+    turned out to be stale.
+    """
+
+    def __init__(self, path: Union[str, Path], url: str, promo: str, desc: str, max_age: float = 24 * 3600) -> None:
+        self.path = Path(path)
+        self.max_age = max_age
+        self.inputs = hashlib.sha256(f"{url}\n{promo}\n{desc}".encode("utf-8")).hexdigest()
+        self.phases: Dict[str, Dict[str, Any]] = {}
+        self.resumed: List[str] = []
+        self._load()
+
+    @classmethod
+    def for_job(cls, job_id: Any, url: str, promo: str, desc: str, root: Union[str, Path, None] = None) -> "JobCheckpoint":
+        root = Path(root or os.environ.get("CHECKPOINT_DIR", "./job_artifacts/checkpoints"))
+        return cls(root / f"{job_id}.json", url, promo, desc)
+
+    # -----------------------------------------------------------------------
+    # public helpers
+    # -----------------------------------------------------------------------
+
+    def get(self, phase: str) -> Optional[Dict[str, Any]]:
+        """Saved output of *phase*, or None; a hit is remembered in `resumed`."""
+        data = self.phases.get(phase)
+        if data is not None and phase not in self.resumed:
+            self.resumed.append(phase)
+        return data
+
+    def save(self, phase: str, **data: Any) -> None:
+        """Persist *phase*'s output, dropping any later phases."""
+        self._forget_after(phase)
+        self.phases[phase] = data
+        self._write()
+
+    def drop(self, phase: str) -> None:
+        """Forget *phase* and everything after it (its state proved unusable)."""
+        self._forget_after(phase)
+        self.phases.pop(phase, None)
+        if phase in self.resumed:
+            self.resumed.remove(phase)
+        self._write()
+
+    def clear(self) -> None:
+        self.phases = {}
+        try:
+            self.path.unlink()
+        except FileNotFoundError:
+            pass
+
+    # -----------------------------------------------------------------------
+    # internal helpers
+    # -----------------------------------------------------------------------
+
+    def _forget_after(self, phase: str) -> None:
+        for later in PHASES[PHASES.index(phase) + 1:]:
+            self.phases.pop(later, None)
+
+    def _load(self) -> None:
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return
+        except ValueError as e:
+            print(f"unreadable checkpoint {self.path}: {e}")
+            return
+        if data.get("inputs") != self.inputs:
+            print(f"checkpoint {self.path} belongs to different job inputs, ignoring it")
+            return
+        if time.time() - data.get("updated", 0) > self.max_age:
+            print(f"checkpoint {self.path} is too old, ignoring it")
+            return
+        self.phases = {p: v for p, v in (data.get("phases") or {}).items() if p in PHASES}
+
+    def _write(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(f".{os.getpid()}.part")
+        payload = {"inputs": self.inputs, "updated": time.time(), "phases": self.phases}
+        tmp.write_text(json.dumps(payload, ensure_ascii=False, default=str), encoding="utf-8")
+        os.replace(tmp, self.path)
+
+    def __repr__(self) -> str:
+        return f"<JobCheckpoint {self.path.name} phases={list(self.phases)}>"
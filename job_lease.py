@@ -0,0 +1,228 @@
+# job_lease.py
+from __future__ import annotations
+
+import asyncio
+import os
+import random
+import socket
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional, Sequence
+
+from job_scheduler import JobScheduler
+from server_config import JOB_SERVER, JobServerClient
+
+
+class Lease:
+    """One job this worker holds, with the server-side lease that locks it (None on legacy servers)."""
+
+    def __init__(self, job: Dict[str, Any], job_type: str, lease_id: Optional[str] = None) -> None:
+        self.job = job
+        self.job_type = job_type
+        self.lease_id = lease_id
+        self.leased_at = time.monotonic()
+        self.lost = False
+
+    @property
+    def job_id(self) -> Any:
+        return self.job["job_id"]
+
+    def __repr__(self) -> str:
+        return f"<Lease job={self.job_id} {self.job_type} {self.lease_id or 'legacy'}{' LOST' if self.lost else ''}>"
+
+
+class LeaseManager:
+    """
+    Leases jobs in batches and keeps them alive while they run.
+
+    A background task keeps up to `prefetch` leased jobs buffered, so the next
+    job is already locked when a slot frees up; `next` hands them out. Every
+    lease, buffered or running, is renewed every `heartbeat` seconds until
+    `finish` (or the upload future passed to `finish_when`) lets go of it. A
+    worker that dies stops heartbeating and the server puts its jobs back in
+    their queue once `ttl` runs out.
+
+    With a `scheduler`, leases ask for the job types in the scheduler's order,
+    `next` starts the buffered job it picks, and jobs in retry backoff are
+    excluded (or handed straight back if the server leases them anyway).
+
+    Servers without the lease endpoints are handled with the old protocol:
+    `get_job` per type, then a QUEUED lock through `update_job_status`.
+    """
+
+    def __init__(
+        self,
+        client: JobServerClient = JOB_SERVER,
+        job_types: Sequence[str] = ("PENDING", "HELD"),
+        *,
+        prefetch: int = 1,
+        ttl: float = 120.0,
+        heartbeat: Optional[float] = None,
+        wait: float = 0,
+        idle_start: float = 5.0,
+        idle_max: float = 360.0,
+        worker_id: Optional[str] = None,
+        scheduler: Optional[JobScheduler] = None,
+    ) -> None:
+        self.client = client
+        self.scheduler = scheduler
+        self.job_types = list(job_types)
+        self.prefetch = max(1, prefetch)
+        self.ttl = ttl
+        self.heartbeat = heartbeat or ttl / 3
+        self.wait = wait
+        self.idle_start = idle_start
+        self.idle_max = idle_max
+        self.worker_id = worker_id or os.environ.get("WORKER_ID") or f"{socket.gethostname()}-{os.getpid()}"
+        self.leasing = True  # False once the server turns out not to support leases
+        self.stats = {"leased": 0, "batches": 0, "renewed": 0, "lost": 0, "released": 0, "deferred": 0, "idle_seconds": 0.0}
+        self._held: Dict[str, Lease] = {}
+        self._lock = threading.Lock()
+        self._ready: List[Lease] = []
+        self._available: Optional[asyncio.Event] = None
+        self._wanted: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+
+    # -----------------------------------------------------------------------
+    # public helpers
+    # -----------------------------------------------------------------------
+
+    async def start(self) -> "LeaseManager":
+        if not self._tasks:
+            self._available = asyncio.Event()
+            self._wanted = asyncio.Event()
+            self._tasks = [asyncio.create_task(self._fill()), asyncio.create_task(self._beat())]
+        return self
+
+    async def next(self) -> Lease:
+        """The next leased job; waits while the queues are empty."""
+        while True:
+            self._ready = [lease for lease in self._ready if not lease.lost]
+            if self._ready:
+                lease = self.scheduler.pick(self._ready) if self.scheduler else self._ready[0]
+                self._ready.remove(lease)
+                self._wanted.set()
+                return lease
+            self._available.clear()
+            await self._available.wait()
+
+    def finish(self, lease: Lease) -> None:
+        """Stop renewing *lease*; the server ends it when the job's status is updated."""
+        if lease.lease_id is not None:
+            with self._lock:
+                self._held.pop(lease.lease_id, None)
+
+    def finish_when(self, lease: Lease, future: Future) -> None:
+        """Keep *lease* alive until *future* (the job's status upload) completes."""
+        future.add_done_callback(lambda _: self.finish(lease))
+
+    def held(self) -> int:
+        with self._lock:
+            return len(self._held)
+
+    def report(self) -> Dict[str, Any]:
+        return dict(self.stats, held=self.held(), buffered=len(self._ready),
+                    protocol="lease" if self.leasing else "legacy")
+
+    async def close(self) -> None:
+        """Stop leasing and hand buffered, unstarted jobs back to the server."""
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+        unstarted = [lease for lease in self._ready if lease.lease_id is not None and not lease.lost]
+        self._ready = []
+        if unstarted:
+            ids = [lease.lease_id for lease in unstarted]
+            for lease in unstarted:
+                self.finish(lease)
+            if await asyncio.to_thread(self.client.release_leases, self.worker_id, ids):
+                self.stats["released"] += len(ids)
+
+    # -----------------------------------------------------------------------
+    # internal helpers
+    # -----------------------------------------------------------------------
+
+    async def _fill(self) -> None:
+        idle = self.idle_start
+        while True:
+            missing = self.prefetch - len(self._ready)
+            if missing <= 0:
+                self._wanted.clear()
+                await self._wanted.wait()
+                continue
+
+            started = time.monotonic()
+            leases = await asyncio.to_thread(self._acquire, missing)
+            if leases:
+                self._ready.extend(leases)
+                self._available.set()
+                idle = self.idle_start
+                continue
+
+            if self.wait and time.monotonic() - started >= self.wait / 2:
+                # the server held the poll, so asking again right away is cheap
+                continue
+            pause = random.uniform(idle / 2, idle)
+            self.stats["idle_seconds"] += pause
+            await asyncio.sleep(pause)
+            idle = min(idle * 2, self.idle_max)
+
+    def _acquire(self, count: int) -> List[Lease]:
+        job_types = self.scheduler.order(self.job_types) if self.scheduler else self.job_types
+        if self.leasing:
+            exclude = self.scheduler.backing_off() if self.scheduler else ()
+            granted = self.client.lease_jobs(self.worker_id, job_types, count, self.ttl, wait=self.wait, exclude=exclude)
+            if granted is not None:
+                leases = [Lease(g["job"], g.get("job_type") or job_types[0], g.get("lease_id")) for g in granted]
+                if leases:
+                    self.stats["batches"] += 1
+                    self.stats["leased"] += len(leases)
+                leases = self._defer(leases)
+                with self._lock:
+                    self._held.update({lease.lease_id: lease for lease in leases if lease.lease_id is not None})
+                return leases
+            print("job server has no lease endpoint, locking jobs with get_job + QUEUED")
+            self.leasing = False
+
+        # legacy protocol: one job at a time, new work long-polled, retries checked in passing
+        for i, job_type in enumerate(job_types):
+            job = self.client.get_job(job_type, self.wait if i == 0 else 0)
+            if not job or (self.scheduler and not self.scheduler.eligible(job["job_id"])):
+                continue
+            if not self.client.update_job_status(job["job_id"], "QUEUED"):
+                # another worker locked it first
+                return []
+            self.stats["leased"] += 1
+            return [Lease(job, job_type)]
+        return []
+
+    def _defer(self, leases: List[Lease]) -> List[Lease]:
+        """Hand back jobs still in retry backoff (servers that ignore `exclude`)."""
+        if self.scheduler is None:
+            return leases
+        early = [lease for lease in leases if not self.scheduler.eligible(lease.job_id)]
+        if early:
+            self.stats["deferred"] += len(early)
+            self.client.release_leases(self.worker_id, [lease.lease_id for lease in early if lease.lease_id is not None])
+        return [lease for lease in leases if lease not in early]
+
+    async def _beat(self) -> None:
+        while True:
+            await asyncio.sleep(self.heartbeat)
+            with self._lock:
+                ids = list(self._held)
+            if not ids:
+                continue
+            lost = await asyncio.to_thread(self.client.renew_leases, self.worker_id, ids, self.ttl)
+            if lost is None:
+                # transient failure; the ttl leaves room for a few more beats
+                continue
+            self.stats["renewed"] += len(ids) - len(lost)
+            for lease_id in lost:
+                with self._lock:
+                    lease = self._held.pop(lease_id, None)
+                if lease is not None:
+                    lease.lost = True
+                    self.stats["lost"] += 1
+                    print(f"lease on job {lease.job_id} expired, the server may hand it to another worker")
@@ -0,0 +1,190 @@
+# job_scheduler.py
+from __future__ import annotations
+
+import random
+import statistics
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+# relative share of worker time per queue when all of them have work
+DEFAULT_WEIGHTS = {"PENDING": 3.0, "HELD": 1.0, "VERIFY": 2.0}
+# starting guess of seconds per job, replaced by a moving average of real runs
+DEFAULT_COSTS = {"PENDING": 600.0, "HELD": 600.0, "VERIFY": 90.0}
+
+
+class JobScheduler:
+    """
+    Weighted fair queueing across job types, with aging and per-job retry backoff.
+
+    Every type has a virtual clock that advances by `cost / weight` each time
+    one of its jobs starts, where cost is the type's average run time. The
+    type with the smallest clock goes first, so shares follow the weights in
+    worker *time*: a short VERIFY job fits in between two long PENDING jobs.
+    A type that has waited longer than `starve_after` seconds since it was last
+    served gets `aging` seconds of credit per further second waited, so a light
+    weight can slow a queue down but never stall it. The default aging is a
+    tenth of the rate the virtual clocks advance at (1 / sum of the weights),
+    small enough that the weights still set the shares.
+
+    Failed (HELD) jobs get their own exponential backoff: until their
+    `not_before` passes they are excluded from leases, and the rest of the
+    worker carries on.
+    """
+
+    def __init__(
+        self,
+        weights: Optional[Dict[str, float]] = None,
+        costs: Optional[Dict[str, float]] = None,
+        *,
+        aging: Optional[float] = None,
+        starve_after: float = 1800.0,
+        retry_base: float = 300.0,
+        retry_max: float = 4 * 3600.0,
+        window: int = 200,
+    ) -> None:
+        self.weights = dict(DEFAULT_WEIGHTS, **(weights or {}))
+        self.costs = dict(DEFAULT_COSTS, **(costs or {}))
+        self.aging = 0.1 / sum(self.weights.values()) if aging is None else aging
+        self.starve_after = starve_after
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.window = window
+        self.vtime: Dict[str, float] = {t: 0.0 for t in self.weights}
+        self.clock = 0.0
+        self.last_served: Dict[str, float] = {t: time.monotonic() for t in self.weights}
+        self.retries: Dict[Any, Dict[str, float]] = {}  # job_id -> {"attempts", "not_before"}
+        self.latency: Dict[str, deque] = {t: deque(maxlen=window) for t in self.weights}
+        self.counts: Dict[str, int] = {t: 0 for t in self.weights}
+        self._lock = threading.Lock()
+
+    # -----------------------------------------------------------------------
+    # ordering
+    # -----------------------------------------------------------------------
+
+    def order(self, job_types: Iterable[str]) -> List[str]:
+        """*job_types* from most to least deserving right now."""
+        now = time.monotonic()
+        with self._lock:
+            return sorted(job_types, key=lambda t: self._priority(t, now))
+
+    def pick(self, leases: Sequence[Any]) -> Any:
+        """The leased job to start next: best type first, oldest job within it."""
+        now = time.monotonic()
+        with self._lock:
+            return min(leases, key=lambda l: (self._priority(l.job_type, now), -job_age(l.job, l.leased_at)))
+
+    def started(self, lease: Any) -> Dict[str, float]:
+        """Charge the job's type and record how long the job waited to start."""
+        job_type = lease.job_type
+        waited = job_age(lease.job, lease.leased_at)
+        with self._lock:
+            self._ensure(job_type)
+            start = max(self.vtime[job_type], self.clock)
+            self.clock = start
+            self.vtime[job_type] = start + self.costs[job_type] / self.weights[job_type]
+            self.last_served[job_type] = time.monotonic()
+            self.latency[job_type].append(waited)
+            self.counts[job_type] += 1
+        return {"queue_latency": round(waited, 1), "buffer_wait": round(time.monotonic() - lease.leased_at, 2)}
+
+    def finished(self, job_type: str, seconds: float) -> None:
+        """Fold a real run time into the type's cost estimate."""
+        with self._lock:
+            self._ensure(job_type)
+            self.costs[job_type] = 0.8 * self.costs[job_type] + 0.2 * max(seconds, 1.0)
+
+    # -----------------------------------------------------------------------
+    # retry backoff
+    # -----------------------------------------------------------------------
+
+    def failed(self, job_id: Any) -> float:
+        """Back *job_id* off; returns the seconds until it may run again."""
+        with self._lock:
+            entry = self.retries.setdefault(job_id, {"attempts": 0, "not_before": 0.0})
+            entry["attempts"] += 1
+            delay = min(self.retry_max, self.retry_base * 2 ** (entry["attempts"] - 1))
+            delay = random.uniform(delay / 2, delay)
+            entry["not_before"] = time.time() + delay
+        return delay
+
+    def succeeded(self, job_id: Any) -> None:
+        with self._lock:
+            self.retries.pop(job_id, None)
+
+    def eligible(self, job_id: Any) -> bool:
+        with self._lock:
+            entry = self.retries.get(job_id)
+            return entry is None or entry["not_before"] <= time.time()
+
+    def backing_off(self) -> List[Any]:
+        now = time.time()
+        with self._lock:
+            return [job_id for job_id, entry in self.retries.items() if entry["not_before"] > now]
+
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            queues = {}
+            for job_type, waits in self.latency.items():
+                ordered = sorted(waits)
+                queues[job_type] = {
+                    "started": self.counts[job_type],
+                    "weight": self.weights[job_type],
+                    "avg_cost": round(self.costs[job_type], 1),
+                    "latency_mean": round(statistics.fmean(ordered), 1) if ordered else None,
+                    "latency_p95": round(ordered[int(0.95 * (len(ordered) - 1))], 1) if ordered else None,
+                }
+            return {"queues": queues, "backing_off": sum(1 for e in self.retries.values() if e["not_before"] > time.time())}
+
+    # -----------------------------------------------------------------------
+    # internal helpers (callers hold the lock)
+    # -----------------------------------------------------------------------
+
+    def _priority(self, job_type: str, now: float) -> float:
+        self._ensure(job_type)
+        starved = max(0.0, now - self.last_served[job_type] - self.starve_after)
+        return max(self.vtime[job_type], self.clock) - self.aging * starved
+
+    def _ensure(self, job_type: str) -> None:
+        if job_type not in self.vtime:
+            self.weights.setdefault(job_type, 1.0)
+            self.costs.setdefault(job_type, 600.0)
+            self.vtime[job_type] = self.clock
+            self.last_served[job_type] = time.monotonic()
+            self.latency[job_type] = deque(maxlen=self.window)
+            self.counts[job_type] = 0
+
+
+def job_age(job: Dict[str, Any], leased_at: float) -> float:
+    """
+    Seconds since the job entered its queue. Uses the server's timestamp
+    (`queued_at` / `updated_at` / `created_at`, epoch or ISO 8601) when the
+    job carries one, else the time it was leased.
+    """
+    for key in ("queued_at", "updated_at", "created_at"):
+        stamp = _epoch(job.get(key))
+        if stamp is not None:
+            return max(0.0, time.time() - stamp)
+    return max(0.0, time.monotonic() - leased_at)
+
+
+def parse_weights(spec: str) -> Dict[str, float]:
+    """Parse "PENDING=3,HELD=1,VERIFY=2" into {"PENDING": 3.0, ...}."""
+    weights = {}
+    for part in filter(None, (p.strip() for p in (spec or "").split(","))):
+        name, _, value = part.partition("=")
+        weights[name.strip().upper()] = float(value)
+    return weights
+
+
+def _epoch(value: Any) -> Optional[float]:
+    if isinstance(value, (int, float)):
+        return float(value) / (1000.0 if value > 1e11 else 1.0)
+    if isinstance(value, str) and value:
+        try:
+            return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+        except ValueError:
+            return None
+    return None
@@ -0,0 +1,79 @@
+import asyncio
+import time
+
+from job_lease import LeaseManager
+from local_job_server import LocalJobServer
+from server_config import JobServerClient
+
+# Runs lease managers against the in-memory job server: batch leasing with
+# prefetch, a worker that dies holding leases (its jobs go back to the queue
+# once the TTL runs out), a long job kept alive by heartbeats, and the
+# get_job + QUEUED fallback for servers without lease endpoints.
+
+jobs = [{"job_id": i, "url": f"https://shop{i}.example", "promo_code": f"CODE{i}", "description": ""} for i in range(6)]
+server = LocalJobServer(jobs).start()
+server.add_job({"job_id": 99, "url": "https://held.example", "promo_code": "RETRY", "description": ""}, status="HELD")
+
+
+def client():
+    return JobServerClient(server.url, retries=1, backoff=0.05)
+
+
+async def main():
+    # a worker leases a batch, then dies without heartbeating or releasing
+    dead = client().lease_jobs("dead-worker", ["PENDING"], count=2, ttl=1.0)
+    assert [g["job"]["job_id"] for g in dead] == [0, 1], dead
+    assert server.status[0] == server.status[1] == "QUEUED"
+
+    # a live worker: 2 slots, prefetching 2 more, short ttl kept alive by heartbeats
+    leases = await LeaseManager(client(), ("PENDING", "HELD"), prefetch=2, ttl=1.0, heartbeat=0.25,
+                                idle_start=0.1, idle_max=0.2, worker_id="live-worker").start()
+    first = [await leases.next(), await leases.next()]
+    await asyncio.sleep(0.05)
+    print(f"started {first}, buffered {leases.report()['buffered']}")
+    assert leases.report()["buffered"] == 2, "the next leases should be taken while jobs run"
+
+    # the jobs outlive the ttl several times over; heartbeats keep them ours
+    await asyncio.sleep(2.5)
+    assert not any(l.lost for l in first)
+    assert all(server.status[l.job_id] == "QUEUED" for l in first)
+    print(f"after 2.5 s with a 1 s ttl: {leases.report()}")
+    for lease in first:
+        server.update(lease.job_id, "PROCESSED", {})
+        leases.finish(lease)
+
+    # the dead worker's jobs have been swept back to PENDING and get picked up
+    seen = {l.job_id for l in first}
+    while len(seen) < 7:
+        lease = await leases.next()
+        seen.add(lease.job_id)
+        server.update(lease.job_id, "PROCESSED", {})
+        leases.finish(lease)
+    print(f"processed {sorted(seen)}")
+    assert {0, 1, 99} <= seen, "reclaimed and HELD jobs must be leased too"
+
+    await leases.close()
+    assert all(s == "PROCESSED" for s in server.status.values()), server.status
+
+    # unstarted prefetched jobs go back to their queue on shutdown
+    server.add_job({"job_id": 100, "url": "https://late.example", "promo_code": "LATE", "description": ""})
+    leases = await LeaseManager(client(), prefetch=1, ttl=5, idle_start=0.1, worker_id="closing-worker").start()
+    while leases.report()["buffered"] == 0:
+        await asyncio.sleep(0.05)
+    await leases.close()
+    print(f"released on close: {server.status[100]}")
+    assert server.status[100] == "PENDING"
+
+    # servers without lease endpoints: get_job + QUEUED lock
+    legacy = LocalJobServer([{"job_id": 7, "url": "https://old.example", "promo_code": "OLD", "description": ""}], leases=False).start()
+    leases = await LeaseManager(JobServerClient(legacy.url, retries=0), idle_start=0.1, worker_id="legacy-worker").start()
+    lease = await asyncio.wait_for(leases.next(), 5)
+    print(f"legacy protocol: {lease} status={legacy.status[7]}")
+    assert lease.job_id == 7 and lease.lease_id is None and legacy.status[7] == "QUEUED" and not leases.leasing
+    await leases.close()
+
+
+started = time.monotonic()
+asyncio.run(main())
+server.stop()
+print(f"lease smoke test passed in {time.monotonic() - started:.1f}s")
@@ -0,0 +1,217 @@
+# link_scorer.py
+from __future__ import annotations
+
+import re
+import time
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+from urllib.parse import urlsplit
+
+from url_tools import resolve_href, same_site, url_key
+
+# path patterns, checked against the lower-cased path
+_PRODUCT_PATH = re.compile(r"/(?:products?|p|dp|item|itm|gp/product|buy|pd)/[^/]+")
+_CATEGORY_PATH = re.compile(r"/(?:collections?|category|categories|c|shop|catalog|catalogue|department|dept|range|browse|store)(?:/|$)")
+_SKU_SLUG = re.compile(r"(?:^|[-_/])(?=[a-z0-9]*\d)(?=[a-z0-9]*[a-z])[a-z0-9]{5,}(?:\.html?)?$|(?:^|[-_/])\d{5,}(?:\.html?)?$")
+_LONG_SLUG = re.compile(r"[a-z0-9]+(?:-[a-z0-9]+){3,}(?:\.html?)?$")
+_NON_SHOPPING = re.compile(
+    r"/(?:account|login|log-in|signin|sign-in|register|signup|cart|checkout|basket|wishlist|search|blogs?|news|pages/"
+    r"(?:about|contact|faq|shipping|returns)|about|contact|faq|help|support|policies|policy|privacy|terms|legal|careers?|jobs|"
+    r"press|store-locator|stores|gift-?cards?|sitemap|cdn-cgi)(?:/|$|\?)"
+)
+_ASSET = re.compile(r"\.(?:pdf|jpe?g|png|gif|webp|svg|css|js|xml|json|zip|mp4)$")
+_PRICE = re.compile(r"(?:[$€£¥₹]\s?\d|\d[.,]\d{2}\s?(?:usd|eur|gbp)?\b)", re.I)
+_SHOPPING_WORDS = re.compile(r"\b(?:shop|buy|new|sale|best ?sellers?|collection|all products|view all|add to cart)\b", re.I)
+_WORD = re.compile(r"[a-z0-9]{3,}")
+_STOPWORDS = frozenset({
+    "the", "and", "for", "with", "any", "all", "off", "per", "one", "are", "not", "will", "your", "use", "code",
+    "promo", "promotion", "discount", "order", "orders", "product", "products", "applies", "apply", "specified",
+    "explicitly", "defined", "criteria", "description", "categories", "quantities", "prices", "specific",
+    "conditions", "effect", "none", "minimum", "purchase", "customer", "must", "enter", "checkout",
+})
+
+
+class ScoredLink:
+    """A resolved link with its heuristic score and a coarse kind (product / category / other)."""
+
+    __slots__ = ("url", "text", "score", "kind", "position")
+
+    def __init__(self, url: str, text: str, score: float, kind: str, position: float) -> None:
+        self.url = url
+        self.text = text
+        self.score = score
+        self.kind = kind
+        self.position = position
+
+    def __repr__(self) -> str:
+        return f"<ScoredLink {self.kind} {self.score:.1f} {self.url}>"
+
+
+def criteria_terms(promo_criteria: Optional[str]) -> frozenset:
+    """Content words of the promo criteria, used to favour links that mention them."""
+    if not promo_criteria:
+        return frozenset()
+    return frozenset(_stem(w) for w in _WORD.findall(promo_criteria.lower()) if w not in _STOPWORDS and not w.isdigit())
+
+
+def term_overlap(text: str, terms: Iterable[str]) -> int:
+    """Number of distinct criteria terms (see `criteria_terms`) that occur in *text*."""
+    return len({_stem(w) for w in _WORD.findall(text.lower())} & set(terms))
+
+
+def _stem(word: str) -> str:
+    # plural-insensitive matching is all the ranking needs ("shoes" ~ "shoe")
+    if len(word) > 4 and word.endswith("es") and word[-3] in "sxz":
+        return word[:-2]
+    return word[:-1] if len(word) > 3 and word.endswith("s") and not word.endswith("ss") else word
+
+
+def score_link(url: str, text: str, position: float, base_url: str, terms: Iterable[str] = ()) -> ScoredLink:
+    """
+    Score one resolved link; higher is more likely to lead to a buyable product.
+
+    *position* is the link's relative place in document order (0 = first,
+    1 = last), a stand-in for header / content / footer placement.
+    """
+    parts = urlsplit(url)
+    path = parts.path.lower()
+    text = (text or "").strip()
+    score, kind = 0.0, "other"
+
+    if not same_site(url, base_url):
+        score -= 10.0
+    if _ASSET.search(path):
+        score -= 10.0
+    if _NON_SHOPPING.search(path):
+        score -= 6.0
+
+    if _PRODUCT_PATH.search(path):
+        score, kind = score + 6.0, "product"
+    elif _CATEGORY_PATH.search(path):
+        score, kind = score + 4.0, "category"
+    last = path.rstrip("/").rsplit("/", 1)[-1]
+    if _SKU_SLUG.search(last):
+        score += 2.0
+        kind = "product" if kind == "other" else kind
+    elif _LONG_SLUG.search(last):
+        score += 1.0
+    if path in ("", "/"):
+        score -= 3.0
+
+    if _PRICE.search(text):
+        score, kind = score + 3.0, "product" if kind == "other" else kind
+    if _SHOPPING_WORDS.search(text):
+        score += 1.5
+    if terms:
+        score += 1.5 * min(3, term_overlap(f"{text} {path}", terms))
+
+    # main content sits between the navigation header and the footer
+    if position > 0.85:
+        score -= 1.5
+    elif 0.1 <= position <= 0.85:
+        score += 1.0
+    return ScoredLink(url, text, score, kind, position)
+
+
+def rank_links(
+    links: Sequence[Any],
+    page_url: str,
+    *,
+    base_url: Optional[str] = None,
+    promo_criteria: Optional[str] = None,
+    top_k: Optional[int] = None,
+    min_score: float = -5.0,
+) -> List[ScoredLink]:
+    """
+    Resolve, dedupe and rank the links of a page, best first.
+
+    *links* are the dicts returned by `get_possible_links()` (an `href` plus
+    whatever text the agent captured) or plain href strings. Links scoring
+    below *min_score* (off-site, account / policy pages, assets) are dropped.
+    """
+    terms = criteria_terms(promo_criteria)
+    site = base_url or page_url
+    scored: Dict[str, ScoredLink] = {}
+    n = max(1, len(links) - 1)
+    for i, link in enumerate(links):
+        href = link.get("href") if isinstance(link, dict) else link
+        url = resolve_href(page_url, href) if isinstance(href, str) else None
+        if url is None:
+            continue
+        item = score_link(url, _link_text(link), i / n, site, terms)
+        key = url_key(url)
+        if item.score >= min_score and (key not in scored or item.score > scored[key].score):
+            scored[key] = item
+    ranked = sorted(scored.values(), key=lambda s: (-s.score, s.position))
+    return ranked[:top_k] if top_k else ranked
+
+
+def looks_like_product(url: str) -> bool:
+    """URL shape of a product page: a product path segment or a SKU-like slug outside category/account pages."""
+    path = urlsplit(url).path.lower()
+    if _PRODUCT_PATH.search(path):
+        return True
+    last = path.rstrip("/").rsplit("/", 1)[-1]
+    return bool(_SKU_SLUG.search(last)) and not _NON_SHOPPING.search(path) and not _CATEGORY_PATH.search(path)
+
+
+def _link_text(link: Any) -> str:
+    if not isinstance(link, dict):
+        return ""
+    for key in ("text", "innerText", "inner_text", "title", "aria_label", "aria-label", "alt"):
+        if link.get(key):
+            return str(link[key])
+    return ""
+
+
+# ---------------------------------------------------------------------------
+# per-hop reporting
+# ---------------------------------------------------------------------------
+
+
+def estimate_list_tokens(items: Iterable[Any]) -> int:
+    """Rough prompt tokens (~4 characters per token) of a link list as sent to the model."""
+    return sum(len(str(item)) + 2 for item in items) // 4
+
+
+class HopTimer:
+    """Measures one crawl hop: wall time, links seen vs sent, estimated and actual prompt tokens."""
+
+    def __init__(self, hop: int, llm_agent=None) -> None:
+        self.hop = hop
+        self.llm_agent = llm_agent
+        self.start = time.monotonic()
+        self.tokens_start = _input_tokens(llm_agent)
+        self.stats: Dict[str, Any] = {"hop": hop}
+
+    def links(self, raw: Sequence[Any], sent: Sequence[Any], page_url: str) -> None:
+        """Record the page's full link list (what used to be sent) against the compact one actually sent."""
+        hrefs = [link.get("href") if isinstance(link, dict) else link for link in raw]
+        self.stats.update({
+            "links_found": len(raw),
+            "links_sent": len(sent),
+            "est_link_tokens_full": estimate_list_tokens((resolve_href(page_url, h) or h) if isinstance(h, str) else "" for h in hrefs),
+            "est_link_tokens_sent": estimate_list_tokens(sent),
+        })
+
+    def finish(self, into: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+        self.stats["seconds"] = round(time.monotonic() - self.start, 2)
+        if self.llm_agent is not None:
+            # omitted for concurrent hops: they share the agent, so their deltas would overlap
+            self.stats["input_tokens"] = _input_tokens(self.llm_agent) - self.tokens_start
+        if into is not None:
+            into.append(self.stats)
+        return self.stats
+
+
+def summarize_hops(hop_stats: Sequence[Dict[str, Any]]) -> Dict[str, Any]:
+    """Totals over a crawl's hops for the job output."""
+    keys = ("links_found", "links_sent", "est_link_tokens_full", "est_link_tokens_sent", "input_tokens", "seconds")
+    totals = {k: round(sum(h.get(k) or 0 for h in hop_stats), 2) for k in keys}
+    totals["hops"] = len(hop_stats)
+    totals["avg_hop_seconds"] = round(totals["seconds"] / len(hop_stats), 2) if hop_stats else 0.0
+    return totals
+
+
+def _input_tokens(llm_agent) -> int:
+    totals = getattr(llm_agent, "token_totals", None)
+    return totals.get("input_tokens", 0) if totals else 0
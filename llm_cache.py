@@ -0,0 +1,162 @@
+# llm_cache.py
+from __future__ import annotations
+
+import base64
+import functools
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple, Union
+
+
+_WS = re.compile(r"\s+")
+_DATA_URL = re.compile(r"^data:[^;]+;base64,")
+
+
+def cache_key(payload: Dict[str, Any]) -> str:
+    """
+    Content address of a request payload.
+
+    Covers the model, instructions, reasoning/text settings and every input
+    message; text is whitespace-normalized and each attached image is
+    reduced to the SHA-256 of its bytes, so re-encoding the same screenshot
+    or reflowing a prompt still hits.
+    """
+    return hashlib.sha256(
+        json.dumps(_normalize(payload), sort_keys=True, ensure_ascii=False, default=str).encode("utf-8")
+    ).hexdigest()
+
+
+def _normalize(value: Any) -> Any:
+    if isinstance(value, dict):
+        if value.get("type") == "input_image" and isinstance(value.get("image_url"), str):
+            return {"type": "input_image", "sha256": image_digest(value["image_url"])}
+        return {k: _normalize(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    if isinstance(value, str):
+        return _WS.sub(" ", value).strip()
+    return value
+
+
+@functools.lru_cache(maxsize=128)
+def image_digest(image_url: str) -> str:
+    """
+    SHA-256 of the image bytes behind a base64 data URL (or of the URL itself).
+    Memoized: encoded parts are shared objects whose str hash is cached.
+    """
+    m = _DATA_URL.match(image_url)
+    if not m:
+        return hashlib.sha256(image_url.encode("utf-8")).hexdigest()
+    return hashlib.sha256(base64.b64decode(image_url[m.end():])).hexdigest()
+
+
+class MemoryLRUCache:
+    """In-process LRU of serialized responses, bounded by entry count and optional TTL."""
+
+    def __init__(self, max_entries: int = 512, ttl: Optional[float] = None) -> None:
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            created, value = item
+            if self.ttl is not None and time.time() - created > self.ttl:
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str) -> None:
+        with self._lock:
+            self._data[key] = (time.time(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key: Optional[str] = None) -> None:
+        with self._lock:
+            if key is None:
+                self._data.clear()
+            else:
+                self._data.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class SQLiteCache:
+    """
+    On-disk response store shared across jobs (and worker restarts).
+
+    Entries expire after `ttl` seconds; once the stored values exceed
+    `max_bytes` the least recently used ones are evicted.
+    """
+
+    def __init__(self, path: Union[str, Path] = "./llm_cache.sqlite3", ttl: float = 7 * 24 * 3600, max_bytes: int = 256 * 1024 * 1024) -> None:
+        self.path = str(path)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY, value TEXT NOT NULL,"
+                " created REAL NOT NULL, accessed REAL NOT NULL, size INTEGER NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses(accessed)")
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT value FROM responses WHERE key = ? AND created > ?", (key, now - self.ttl)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            return row[0]
+
+    def set(self, key: str, value: str) -> None:
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, created, accessed, size) VALUES (?, ?, ?, ?, ?)",
+                (key, value, now, now, len(value)),
+            )
+            self._evict(now)
+
+    def invalidate(self, key: Optional[str] = None) -> None:
+        with self._lock, self._conn:
+            if key is None:
+                self._conn.execute("DELETE FROM responses")
+            else:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+
+    def _evict(self, now: float) -> None:
+        self._conn.execute("DELETE FROM responses WHERE created <= ?", (now - self.ttl,))
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self._conn.execute("SELECT key, size FROM responses ORDER BY accessed ASC").fetchall():
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
@@ -0,0 +1,220 @@
+# local_job_server.py
+"""
+In-memory stand-in for the job server's private API, for smoke tests and
+running a worker locally (`python local_job_server.py jobs.json`).
+
+Speaks both protocols the worker uses: get_job + QUEUED locking, and batch
+leases with heartbeats. Expired leases are swept on every request, which puts
+a dead worker's jobs back in the queue they came from. Updates may be JSON
+(base64 image) or multipart/form-data (the artifact uploader).
+"""
+from __future__ import annotations
+
+import argparse
+import email.parser
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterable, List, Optional
+
+
+class LocalJobServer:
+    def __init__(self, jobs: Iterable[Dict[str, Any]] = (), host: str = "127.0.0.1", port: int = 0, leases: bool = True) -> None:
+        self.leases_enabled = leases
+        self.jobs: Dict[Any, Dict[str, Any]] = {}
+        self.status: Dict[Any, str] = {}
+        self.leases: Dict[str, Dict[str, Any]] = {}  # lease_id -> {job_id, worker_id, expires, queue}
+        self.updates: List[Dict[str, Any]] = []
+        self._cond = threading.Condition()
+        for job in jobs:
+            self.add_job(job)
+        self.httpd = ThreadingHTTPServer((host, port), self._handler())
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "LocalJobServer":
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def add_job(self, job: Dict[str, Any], status: Optional[str] = None) -> None:
+        with self._cond:
+            self.jobs[job["job_id"]] = dict(job)
+            self.status[job["job_id"]] = status or job.get("status", "PENDING")
+            self._cond.notify_all()
+
+    # -----------------------------------------------------------------------
+    # API
+    # -----------------------------------------------------------------------
+
+    def get_job(self, job_type: str, wait: float = 0) -> Optional[Dict[str, Any]]:
+        with self._cond:
+            job_id = self._wait_for(lambda: self._first(job_type), wait)
+            return dict(self.jobs[job_id], job_type=job_type) if job_id is not None else None
+
+    def lease(self, worker_id: str, job_types: List[str], count: int, ttl: float, wait: float = 0,
+              exclude: Iterable[Any] = ()) -> List[Dict[str, Any]]:
+        skip = set(exclude)
+        with self._cond:
+            self._wait_for(lambda: next((j for t in job_types if (j := self._first(t, skip)) is not None), None), wait)
+            granted = []
+            for job_type in job_types:
+                while len(granted) < count:
+                    job_id = self._first(job_type, skip)
+                    if job_id is None:
+                        break
+                    lease_id = uuid.uuid4().hex
+                    self.leases[lease_id] = {"job_id": job_id, "worker_id": worker_id, "expires": time.monotonic() + ttl, "queue": job_type}
+                    self.status[job_id] = "QUEUED"
+                    granted.append({"lease_id": lease_id, "job_type": job_type, "expires_in": ttl, "job": dict(self.jobs[job_id])})
+            return granted
+
+    def heartbeat(self, worker_id: str, lease_ids: List[str], ttl: float) -> List[str]:
+        with self._cond:
+            self._sweep()
+            lost = []
+            for lease_id in lease_ids:
+                lease = self.leases.get(lease_id)
+                if lease is None or lease["worker_id"] != worker_id:
+                    lost.append(lease_id)
+                else:
+                    lease["expires"] = time.monotonic() + ttl
+            return lost
+
+    def release(self, worker_id: str, lease_ids: List[str]) -> None:
+        with self._cond:
+            for lease_id in lease_ids:
+                lease = self.leases.get(lease_id)
+                if lease is not None and lease["worker_id"] == worker_id:
+                    del self.leases[lease_id]
+                    self.status[lease["job_id"]] = lease["queue"]
+            self._cond.notify_all()
+
+    def update(self, job_id: Any, status: str, fields: Dict[str, Any]) -> bool:
+        with self._cond:
+            self._sweep()
+            if job_id not in self.jobs:
+                return False
+            if status == "QUEUED" and self.status[job_id] == "QUEUED":
+                return False  # already locked by someone else
+            self.status[job_id] = status
+            # a status update ends the job's lease
+            for lease_id in [k for k, v in self.leases.items() if v["job_id"] == job_id]:
+                del self.leases[lease_id]
+            self.updates.append(dict(fields, job_id=job_id, status=status))
+            self._cond.notify_all()
+            return True
+
+    # -----------------------------------------------------------------------
+    # internal helpers (callers hold the condition's lock)
+    # -----------------------------------------------------------------------
+
+    def _first(self, job_type: str, skip: Iterable[Any] = ()) -> Optional[Any]:
+        self._sweep()
+        return next((job_id for job_id, status in self.status.items() if status == job_type and job_id not in skip), None)
+
+    def _wait_for(self, probe, wait: float):
+        deadline = time.monotonic() + wait
+        found = probe()
+        while found is None and time.monotonic() < deadline:
+            self._cond.wait(min(0.5, deadline - time.monotonic()))
+            found = probe()
+        return found
+
+    def _sweep(self) -> None:
+        now = time.monotonic()
+        for lease_id, lease in list(self.leases.items()):
+            if lease["expires"] < now:
+                del self.leases[lease_id]
+                if self.status.get(lease["job_id"]) == "QUEUED":
+                    self.status[lease["job_id"]] = lease["queue"]
+                    self._cond.notify_all()
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                path = self.path.split("?")[0]
+                if path != "/private_api/update":
+                    data = json.loads(body or b"{}")
+                if path == "/private_api/get_job":
+                    job = server.get_job(data["job_type"], float(data.get("wait", 0)))
+                    return self._json(200, job or {"message": "no job"})
+                if path == "/private_api/lease" and server.leases_enabled:
+                    granted = server.lease(data["worker_id"], data["job_types"], int(data.get("count", 1)),
+                                           float(data.get("ttl", 120)), float(data.get("wait", 0)), data.get("exclude", ()))
+                    return self._json(200, {"leases": granted})
+                if path == "/private_api/heartbeat" and server.leases_enabled:
+                    return self._json(200, {"lost": server.heartbeat(data["worker_id"], data["lease_ids"], float(data.get("ttl", 120)))})
+                if path == "/private_api/release" and server.leases_enabled:
+                    server.release(data["worker_id"], data["lease_ids"])
+                    return self._json(200, {})
+                if path == "/private_api/update":
+                    fields = _form(self.headers.get("Content-Type", ""), body)
+                    ok = server.update(_job_id(fields.get("job_id")), fields.get("status"), fields)
+                    return self._json(200 if ok else 409, {"ok": ok})
+                self._json(404, {"error": "not found"})
+
+            def do_GET(self):
+                if self.path.split("?")[0] == "/private_api/get_next_job":
+                    return self._json(200, server.get_job("PENDING") or {"message": "no job"})
+                self._json(404, {"error": "not found"})
+
+            def _json(self, code, payload):
+                data = json.dumps(payload, default=str).encode("utf-8")
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+def _form(content_type: str, body: bytes) -> Dict[str, Any]:
+    if not content_type.startswith("multipart/"):
+        return json.loads(body or b"{}")
+    message = email.parser.BytesParser().parsebytes(f"Content-Type: {content_type}\r\n\r\n".encode("utf-8") + body)
+    fields: Dict[str, Any] = {}
+    for part in message.get_payload():
+        name = part.get_param("name", header="content-disposition")
+        payload = part.get_payload(decode=True)
+        fields[name] = payload if part.get_filename() else payload.decode("utf-8")
+    return fields
+
+
+def _job_id(value: Any) -> Any:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return value
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in for the job server")
+    parser.add_argument("jobs", nargs="?", help="JSON file with a list of jobs (job_id, url, promo_code, description)")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--no-leases", action="store_true", help="only speak the get_job + QUEUED protocol")
+    args = parser.parse_args()
+    jobs = json.load(open(args.jobs, encoding="utf-8")) if args.jobs else []
+    server = LocalJobServer(jobs, port=args.port, leases=not args.no_leases)
+    print(f"serving {len(jobs)} jobs on {server.url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
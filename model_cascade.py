@@ -0,0 +1,134 @@
+# model_cascade.py
+from __future__ import annotations
+
+import re
+import threading
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from cost_budget import BudgetExceeded
+
+CONFIDENCE_INSTRUCTIONS = (
+    " Then, on a new last line, write 'Confidence: N' where N (0-100) is how certain you are of this answer."
+)
+_CONFIDENCE = re.compile(r"^\W*confidence\W*(\d{1,3})\W*%?\W*$", re.IGNORECASE | re.MULTILINE)
+
+# returned by `attempt` when the caller has to ask the regular model
+ESCALATE = object()
+
+
+class ModelCascade:
+    """
+    Cheap-first answering for prompts with a checkable reply (yes/no, selections).
+
+    The prompt goes to `cheap_model` (a non-reasoning model) first, with an
+    extra instruction to end on a `Confidence: N` line. The cheap answer is
+    used when it is well formed (the spec's `well_formed` check) and N reaches
+    the prompt's threshold; otherwise the caller escalates to the prompt's own
+    model. Escalations are counted per prompt type (low confidence, malformed,
+    error) so thresholds can be tuned from the reports.
+    """
+
+    def __init__(
+        self,
+        cheap_model: str = "gpt-4.1-mini-2025-04-14",
+        threshold: int = 80,
+        thresholds: Optional[Dict[str, int]] = None,
+        exclude: Iterable[str] = (),
+    ) -> None:
+        self.cheap_model = cheap_model
+        self.threshold = threshold
+        self.thresholds = dict(thresholds or {})
+        self.exclude = set(exclude)
+        self.stats: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def applies(self, spec: Any, prompt_type: Optional[str]) -> bool:
+        return spec.well_formed is not None and prompt_type not in self.exclude and "model" not in spec.request
+
+    def request(self, spec: Any, call_options: Dict[str, Any]) -> Dict[str, Any]:
+        """Wrapper call arguments for the cheap attempt."""
+        request = {**call_options, **spec.request, "model": self.cheap_model}
+        request.pop("reasoning", None)
+        request["instructions"] = (request.get("instructions") or "") + CONFIDENCE_INSTRUCTIONS
+        return request
+
+    def attempt(self, llm_agent: Any, spec: Any, call_options: Dict[str, Any]) -> Any:
+        """Parsed cheap answer, or ESCALATE."""
+        prompt_type = call_options.get("prompt_type")
+        try:
+            text = llm_agent(spec.prompt, **self.request(spec, call_options)).output_text
+        except BudgetExceeded:
+            raise
+        except Exception as e:
+            return self._escalate(prompt_type, "error", e)
+        return self._judge(spec, prompt_type, text)
+
+    async def aattempt(self, llm_agent: Any, spec: Any, call_options: Dict[str, Any]) -> Any:
+        prompt_type = call_options.get("prompt_type")
+        try:
+            text = (await llm_agent.acall(spec.prompt, **self.request(spec, call_options))).output_text
+        except BudgetExceeded:
+            raise
+        except Exception as e:
+            return self._escalate(prompt_type, "error", e)
+        return self._judge(spec, prompt_type, text)
+
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            out = {}
+            for prompt_type, entry in self.stats.items():
+                asked = entry["cheap"]
+                kept = asked - entry["escalated"]
+                out[prompt_type] = dict(
+                    entry,
+                    escalation_rate=round(entry["escalated"] / asked, 3) if asked else 0.0,
+                    mean_confidence=round(entry["confidence_sum"] / kept, 1) if kept else None,
+                    threshold=self.thresholds.get(prompt_type, self.threshold),
+                )
+                del out[prompt_type]["confidence_sum"]
+            return out
+
+    # -----------------------------------------------------------------------
+    # internal helpers
+    # -----------------------------------------------------------------------
+
+    def _judge(self, spec: Any, prompt_type: Optional[str], text: str) -> Any:
+        answer, confidence = split_confidence(text)
+        try:
+            well_formed = spec.well_formed(answer)
+        except Exception:
+            well_formed = False
+        if not well_formed:
+            return self._escalate(prompt_type, "malformed")
+        if confidence is None or confidence < self.thresholds.get(prompt_type, self.threshold):
+            return self._escalate(prompt_type, "low_confidence")
+        with self._lock:
+            entry = self._entry(prompt_type)
+            entry["cheap"] += 1
+            entry["confidence_sum"] += confidence
+        return spec.parse(answer)
+
+    def _escalate(self, prompt_type: Optional[str], reason: str, error: Optional[Exception] = None) -> Any:
+        if error is not None:
+            print(f"cheap model call failed for {prompt_type}: {error}")
+        with self._lock:
+            entry = self._entry(prompt_type)
+            entry["cheap"] += 1
+            entry["escalated"] += 1
+            entry[reason] += 1
+        return ESCALATE
+
+    def _entry(self, prompt_type: Optional[str]) -> Dict[str, Any]:
+        return self.stats.setdefault(prompt_type or "unnamed", {
+            "cheap": 0, "escalated": 0, "low_confidence": 0, "malformed": 0, "error": 0, "confidence_sum": 0,
+        })
+
+
+def split_confidence(text: str) -> Tuple[str, Optional[int]]:
+    """(reply without its confidence line, confidence 0-100 or None)."""
+    matches = list(_CONFIDENCE.finditer(text or ""))
+    if not matches:
+        return (text or "").strip(), None
+    last = matches[-1]
+    answer = (text[:last.start()] + text[last.end():]).strip()
+    return answer, min(100, int(last.group(1)))
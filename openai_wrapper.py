@@ -2,19 +2,27 @@
 from __future__ import annotations
 
 import base64
+import hashlib
 import os
 import threading
 import time
 import json
+from collections import OrderedDict, deque
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Sequence, Union
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
 
-from openai import OpenAI
+from openai import AsyncOpenAI, OpenAI
 from openai.types.chat import ChatCompletion
 from openai.types.responses import Response as ReasoningResponse
 
+from cost_budget import JobBudget
+from image_profiles import ImageProfile, estimate_image_tokens, get_profile, image_size, render
+from image_store import IMAGES
+from llm_cache import cache_key, image_digest
+
 ModelName = str
 UserContent = Union[str, Dict[str, Any], Sequence[Dict[str, Any]]]
+ImageInput = Union[str, Path, bytes, bytearray, memoryview, Any]   # path, raw bytes or BytesIO‑like
 
 rmdl = [
     "o1-2024-12-17",            # 15.0    60.0
@@ -30,15 +38,35 @@ smdl = [
     "gpt-4.1",
 ]
 
+# Prompt types whose answers must always be fresh: the reported verdict of a job, and
+# prompts re-asked in a loop with the same arguments (a cached "Yes" would repeat forever).
+DEFAULT_UNCACHED_PROMPTS = frozenset({"_final_outcome", "_needs_more_quantity"})
+
+# History retention modes (see `history_mode`).
+HISTORY_MODES = ("none", "ring", "tokens")
+
+_SUMMARY_INSTRUCTIONS = (
+    "You maintain the running memory of a browsing assistant's conversation. Merge the previous summary "
+    "and the new turns into one concise summary (under 200 words) that keeps every fact, decision, answer "
+    "and open question a later turn may rely on. Reply with the summary only."
+)
+
+
 class ChatGPTWrapper:
     """
     Thread‑safe wrapper around the OpenAI SDK that supports:
 
     • Synchronous or non‑blocking calls (ready flag + wait helper)
+    • Awaitable calls (`acall`) that keep the event loop free
     • Optional persistent history
     • Image and/or tool calling with a single entry point
     • Reasoning‑model and standard‑model routing
-    • Running + per‑call token accounting
+    • Running + per‑call token accounting, optionally costed against a job budget
+      that downgrades models as it runs out
+    • Optional content‑addressed response cache (memory LRU or SQLite)
+    • Per‑prompt image profiles (size, encoding, detail) with token estimates
+    • Bounded history (none / ring buffer / token budget), images kept as hashes,
+      with older turns folded into a running summary for persistent chats
     """
 
     # ---- class‑wide model catalogues (each with vision capability) ---------
@@ -57,6 +85,9 @@ class ChatGPTWrapper:
         "gpt-4.1",
     }
 
+    # evicted messages are summarized once at least this many have piled up
+    SUMMARY_BATCH = 6
+
     # ---- construction ------------------------------------------------------
 
     def __init__(
@@ -70,8 +101,17 @@ class ChatGPTWrapper:
         hold_for_response: bool = True,
         default_tools: Optional[List[Dict[str, Any]]] = None,
         openai_client: Optional[OpenAI] = None,
+        async_openai_client: Optional[AsyncOpenAI] = None,
         tool_executor = None,
-        api_key = None
+        api_key = None,
+        response_cache = None,
+        uncached_prompts: Optional[Sequence[str]] = None,
+        history_mode: Optional[str] = None,
+        history_max_messages: int = 20,
+        history_token_budget: int = 8000,
+        summarize_history: bool = True,
+        summary_model: ModelName = "gpt-4.1-mini-2025-04-14",
+        budget: Optional[JobBudget] = None,
     ) -> None:
         """
         Parameters
@@ -92,8 +132,37 @@ class ChatGPTWrapper:
             If provided, used when a call requests `tools=True`.
         openai_client
             Advanced: supply a pre‑configured OpenAI() instance.
+        async_openai_client
+            Advanced: supply a pre‑configured AsyncOpenAI() instance used by `acall`.
+        response_cache
+            Optional `llm_cache.MemoryLRUCache` / `llm_cache.SQLiteCache`; identical
+            requests are then answered from the cache instead of the API.
+        uncached_prompts
+            Prompt types (see `prompt_type` on calls) that always go to the API.
+            Defaults to `DEFAULT_UNCACHED_PROMPTS`.
+        history_mode
+            What completed turns are kept in `history`: "none", "ring" (the last
+            `history_max_messages` messages) or "tokens" (newest messages within
+            `history_token_budget` estimated tokens). Defaults to "tokens" when
+            `persistent_chat` is on, else "none". Retained images are replaced by
+            a short hash of their bytes.
+        history_max_messages
+            Message cap for "ring" mode; also bounds the raw responses kept.
+        history_token_budget
+            Estimated‑token cap for "tokens" mode.
+        summarize_history
+            With `persistent_chat`, fold messages that fall out of the history
+            into a running summary (via `summary_model`) sent ahead of it.
+        summary_model
+            Cheap model used to write that summary.
+        budget
+            Optional `cost_budget.JobBudget` (usually shared by all wrappers of a
+            job): every call is costed into its ledger, routed to a cheaper model
+            as the budget is used up, and refused with `BudgetExceeded` once it
+            is spent.
         """
         self.client = openai_client or OpenAI(api_key = api_key)
+        self.async_client = async_openai_client or AsyncOpenAI(api_key = api_key)
 
         self.system_message = (
             {"role": "system", "content": system_message}
@@ -111,17 +180,40 @@ class ChatGPTWrapper:
         self.default_model = default_model
         self.default_tools = default_tools or []
 
-        self.history: List[Dict[str, str]] = chat_history.copy() if chat_history else []
+        # history retention
+        self.history_mode = history_mode or ("tokens" if persistent_chat else "none")
+        if self.history_mode not in HISTORY_MODES:
+            raise ValueError(f"history_mode must be one of {HISTORY_MODES}, got {history_mode!r}")
+        self.history_max_messages = history_max_messages
+        self.history_token_budget = history_token_budget
+        self.summarize_history = summarize_history and persistent_chat
+        self.summary_model = summary_model
+        self.history_summary: Optional[str] = None
+        self._unsummarized: List[Dict[str, Any]] = []
+
+        self.history: List[Dict[str, Any]] = [_strip_images(m) for m in chat_history] if chat_history else []
         self._ready = threading.Event()
         self._lock = threading.Lock()
         self._last_response: Optional[Union[ChatCompletion, ReasoningResponse]] = None
 
-        self._response_history = []
+        self._response_history: deque = deque(maxlen=0 if self.history_mode == "none" else history_max_messages)
         self.tool_executor = tool_executor
+        if self.history_mode != "none":
+            self._trim_history()
+
+        # response cache
+        self.response_cache = response_cache
+        self.uncached_prompts = set(DEFAULT_UNCACHED_PROMPTS if uncached_prompts is None else uncached_prompts)
+        self.cache_stats = {"hits": 0, "misses": 0, "bypassed": 0}
+        self.cache_stats_by_prompt: Dict[str, Dict[str, int]] = {}
+
+        # estimated image input tokens per image profile, before/after re‑encoding
+        self.image_token_stats: Dict[str, Dict[str, int]] = {}
 
         # token accounting
         self.token_totals = {"input_tokens": 0, "output_tokens": 0, "reasoning_tokens": 0, "total_tokens": 0}
         self.token_log: List[Dict[str, int]] = []
+        self.budget = budget
 
     # -----------------------------------------------------------------------
     # public helpers
@@ -153,11 +245,14 @@ class ChatGPTWrapper:
         user_content: UserContent,
         *,
         model: Optional[ModelName] = None,
-        images: Optional[Sequence[Union[str, Path]]] = None,
+        images: Optional[Sequence[ImageInput]] = None,
         tools: Union[bool, Sequence[Dict[str, Any]], None] = None,
         reasoning: Optional[Dict[str, Any]] = None,
         text: Optional[Dict[str, Any]] = None,
         stream: bool = False,
+        prompt_type: Optional[str] = None,
+        cache: Optional[bool] = None,
+        image_profile: Union[str, ImageProfile, None] = None,
         **kwargs: Any,
     ) -> Optional[Union[ChatCompletion, ReasoningResponse]]:
         """
@@ -170,7 +265,9 @@ class ChatGPTWrapper:
         model
             Override default model.
         images
-            Optional iterable of file paths (str or Path) to include.
+            Optional iterable of images to include: file paths (str or Path),
+            raw bytes or BytesIO‑like buffers. Paths captured through
+            `image_store.IMAGES` are served from memory.
         tools
             • True  -> use wrapper's *default_tools*
             • list  -> use provided tool spec
@@ -180,6 +277,14 @@ class ChatGPTWrapper:
             Ignored for standard models.
         stream
             Whether to request streaming responses (standard models only).
+        prompt_type
+            Name of the prompt issuing the call, used for cache opt‑outs and stats.
+        cache
+            Force (True) or skip (False) the response cache for this call;
+            None follows `uncached_prompts`.
+        image_profile
+            Name (see `image_profiles.PROFILES`) or ImageProfile used to resize,
+            re‑encode and set the `detail` level of attached images.
         **kwargs
             Any extra parameters forwarded to the chat or responses endpoint.
 
@@ -188,16 +293,115 @@ class ChatGPTWrapper:
         Response object *or* None if `hold_for_response=False`
         and you choose not to block until completion.
         """
+        self._refresh_summary()
+        payload, is_reasoning, user_messages = self._build_request(
+            user_content, model=model, images=images, tools=tools,
+            reasoning=reasoning, text=text, image_profile=image_profile, **kwargs
+        )
+
+        # Serve from cache when possible ------------------------------------
+        self._ready.clear()
+        key = None if stream else self._cache_key(payload, prompt_type, cache)
+        cached = self._cache_get(key, prompt_type)
+        if cached is not None:
+            self._postprocess(cached, user_messages, cached=True)
+            self._ready.set()
+            return cached
+
+        # Submit request ----------------------------------------------------
+        self._check_budget()
+        if self.hold_for_response:
+            # blocking
+            response = self._dispatch(payload, is_reasoning, stream=stream)
+            self._cache_put(key, response)
+            self._postprocess(response, user_messages, prompt_type=prompt_type)
+            self._ready.set()
+            return response
+        else:
+            # non‑blocking: run in worker thread
+            threading.Thread(
+                target=self._background_task,
+                args=(payload, is_reasoning, user_messages, stream, key, prompt_type),
+                daemon=True,
+            ).start()
+            return None  # caller will use wait_until_ready / last_response
+
+    async def acall(
+        self,
+        user_content: UserContent,
+        *,
+        model: Optional[ModelName] = None,
+        images: Optional[Sequence[ImageInput]] = None,
+        tools: Union[bool, Sequence[Dict[str, Any]], None] = None,
+        reasoning: Optional[Dict[str, Any]] = None,
+        text: Optional[Dict[str, Any]] = None,
+        prompt_type: Optional[str] = None,
+        cache: Optional[bool] = None,
+        image_profile: Union[str, ImageProfile, None] = None,
+        **kwargs: Any,
+    ) -> Union[ChatCompletion, ReasoningResponse]:
+        """
+        Awaitable counterpart of `__call__`, dispatched through AsyncOpenAI.
+
+        Takes the same arguments (minus `stream`) and always waits for the
+        response, but yields to the event loop while the model is working so
+        browser work and other jobs can make progress in the meantime.
+        `hold_for_response` is ignored.
+        """
+        await self._arefresh_summary()
+        payload, is_reasoning, user_messages = self._build_request(
+            user_content, model=model, images=images, tools=tools,
+            reasoning=reasoning, text=text, image_profile=image_profile, **kwargs
+        )
+
+        self._ready.clear()
+        key = self._cache_key(payload, prompt_type, cache)
+        cached = self._cache_get(key, prompt_type)
+        if cached is not None:
+            with self._lock:
+                self._postprocess(cached, user_messages, cached=True)
+                self._ready.set()
+            return cached
+
+        self._check_budget()
+        response = await self._adispatch(payload, is_reasoning)
+        self._cache_put(key, response)
+        with self._lock:
+            self._postprocess(response, user_messages, prompt_type=prompt_type)
+            self._ready.set()
+        return response
+
+    # -----------------------------------------------------------------------
+    # internal helpers
+    # -----------------------------------------------------------------------
+
+    def _build_request(
+        self,
+        user_content: UserContent,
+        *,
+        model: Optional[ModelName] = None,
+        images: Optional[Sequence[ImageInput]] = None,
+        tools: Union[bool, Sequence[Dict[str, Any]], None] = None,
+        reasoning: Optional[Dict[str, Any]] = None,
+        text: Optional[Dict[str, Any]] = None,
+        image_profile: Union[str, ImageProfile, None] = None,
+        **kwargs: Any,
+    ) -> Tuple[Dict[str, Any], bool, List[Dict[str, Any]]]:
+        """Assemble the request payload shared by the sync and async paths."""
         # Prepare messages for this call ------------------------------------
         model = model or self.default_model
+        if self.budget is not None:
+            model = self.budget.route(model)
         is_reasoning = model in self.REASONING_MODELS
 
         user_messages = self._normalize_user_content(user_content)
         if images:
             user_messages[-1]['content'] = [{"type": "input_text", "text": user_messages[-1]['content']}]
-            user_messages[-1]["content"].extend(
-                [self._image_part(path) for path in images]
-            )
+            profile = get_profile(image_profile)
+            for image in images:
+                part, original_size, sent_size = self._encode_image(image, profile)
+                user_messages[-1]["content"].append(part)
+                self._log_image_tokens(profile, original_size, sent_size)
 
         messages = []
         if self.system_message:
@@ -205,11 +409,13 @@ class ChatGPTWrapper:
         if self.developer_message:
             messages.append(self.developer_message)
         if self.persistent_chat:
+            if self.history_summary:
+                messages.append({"role": "developer", "content": f"Summary of the earlier conversation:\n{self.history_summary}"})
             messages.extend(self.history)
         messages.extend(user_messages)
 
         # Build payload common parts ---------------------------------------
-        common_payload: Dict[str, Any] = {
+        payload: Dict[str, Any] = {
             "model": model,
             "input": messages, #if is_reasoning else None,  # reasoning uses 'input'
             # "messages": messages if not is_reasoning else None,
@@ -218,41 +424,22 @@ class ChatGPTWrapper:
 
         # tools logic
         if tools is True:
-            common_payload["tools"] = self.default_tools
-            common_payload["tool_choice"] = "auto"
+            payload["tools"] = self.default_tools
+            payload["tool_choice"] = "auto"
         elif tools:
-            common_payload["tools"] = tools
-            common_payload["tool_choice"] = "required"
+            payload["tools"] = tools
+            payload["tool_choice"] = "required"
 
         if is_reasoning:
           if reasoning:
-            common_payload["reasoning"] = reasoning
+            payload["reasoning"] = reasoning
           else:
-            common_payload["reasoning"] = {"effort": "medium"}
+            payload["reasoning"] = {"effort": "medium"}
 
         if text:
-            common_payload["text"] = text
+            payload["text"] = text
 
-        # Submit request ----------------------------------------------------
-        self._ready.clear()
-        if self.hold_for_response:
-            # blocking
-            response = self._dispatch(common_payload, is_reasoning, stream=stream)
-            self._postprocess(response, user_messages)
-            self._ready.set()
-            return response
-        else:
-            # non‑blocking: run in worker thread
-            threading.Thread(
-                target=self._background_task,
-                args=(common_payload, is_reasoning, user_messages, stream),
-                daemon=True,
-            ).start()
-            return None  # caller will use wait_until_ready / last_response
-
-    # -----------------------------------------------------------------------
-    # internal helpers
-    # -----------------------------------------------------------------------
+        return payload, is_reasoning, user_messages
 
     def _background_task(
         self,
@@ -260,11 +447,14 @@ class ChatGPTWrapper:
         is_reasoning: bool,
         user_messages: List[Dict[str, Any]],
         stream: bool,
+        key: Optional[str] = None,
+        prompt_type: Optional[str] = None,
     ) -> None:
         """Worker thread for non‑blocking operations."""
         response = self._dispatch(payload, is_reasoning, stream=stream)
+        self._cache_put(key, response)
         with self._lock:
-            self._postprocess(response, user_messages)
+            self._postprocess(response, user_messages, prompt_type=prompt_type)
             self._ready.set()
 
     # ------ api dispatch ---------------------------------------------------
@@ -296,16 +486,130 @@ class ChatGPTWrapper:
         #     self._ready.set()
         #     raise e
 
+    async def _adispatch(
+        self,
+        payload: Dict[str, Any],
+        is_reasoning: bool,
+    ) -> ReasoningResponse:
+        """Async twin of `_dispatch`; both model families use the responses API."""
+        payload.pop("messages", None)
+        return await self.async_client.responses.create(**payload)  # type: ignore[arg-type]
+
+    def _check_budget(self) -> None:
+        """Refuse the call (BudgetExceeded) once the job's budget is spent; the wrapper stays ready."""
+        if self.budget is not None:
+            try:
+                self.budget.check()
+            except Exception:
+                # no call goes out, so nothing will set the flag cleared for it
+                self._ready.set()
+                raise
+
+    # ------ response cache -------------------------------------------------
+
+    def _cache_key(
+        self,
+        payload: Dict[str, Any],
+        prompt_type: Optional[str],
+        cache: Optional[bool],
+    ) -> Optional[str]:
+        """Cache key for this request, or None when it must go to the API."""
+        if self.response_cache is None:
+            return None
+        skip = cache is False or (cache is None and prompt_type in self.uncached_prompts)
+        # tool calls may have side effects, never replay them
+        if skip or "tools" in payload:
+            self._count_cache("bypassed", prompt_type)
+            return None
+        return cache_key(payload)
+
+    def _cache_get(self, key: Optional[str], prompt_type: Optional[str]) -> Optional[ReasoningResponse]:
+        if key is None:
+            return None
+        try:
+            value = self.response_cache.get(key)
+            response = ReasoningResponse.model_validate_json(value) if value is not None else None
+        except Exception as e:
+            print(f"response cache read failed: {e}")
+            response = None
+        self._count_cache("hits" if response is not None else "misses", prompt_type)
+        return response
+
+    def _cache_put(self, key: Optional[str], response: Union[ChatCompletion, ReasoningResponse]) -> None:
+        if key is None:
+            return
+        try:
+            self.response_cache.set(key, response.model_dump_json())
+        except Exception as e:
+            print(f"response cache write failed: {e}")
+
+    def _count_cache(self, outcome: str, prompt_type: Optional[str]) -> None:
+        with self._lock:
+            self.cache_stats[outcome] += 1
+            per_prompt = self.cache_stats_by_prompt.setdefault(prompt_type or "unnamed", {"hits": 0, "misses": 0, "bypassed": 0})
+            per_prompt[outcome] += 1
+
     # ------ utilities ------------------------------------------------------
 
     @staticmethod
-    def _image_part(path: Union[str, Path]) -> Dict[str, str]:
-        """Return a message content part dict for an embedded local image."""
-        path = Path(path).expanduser().resolve()
-        mimetype = _infer_mimetype(path)
-        with open(path, "rb") as fp:
-            b64 = base64.b64encode(fp.read()).decode("ascii")
-        return {"type": "input_image", "image_url": f"data:{mimetype};base64,{b64}"}
+    def _image_part(image: ImageInput, profile: Union[str, ImageProfile, None] = None) -> Dict[str, str]:
+        """Return a message content part dict for an embedded image."""
+        return ChatGPTWrapper._encode_image(image, get_profile(profile))[0]
+
+    @staticmethod
+    def _encode_image(
+        image: ImageInput,
+        profile: Optional[ImageProfile],
+    ) -> Tuple[Dict[str, str], Tuple[int, int], Tuple[int, int]]:
+        """
+        Content part plus (original, sent) pixel sizes for an image.
+
+        Results are memoized by (content hash, profile), so the same screenshot
+        attached to several prompts is converted and base64‑encoded only once
+        per profile.
+        """
+        if isinstance(image, (str, Path)):
+            data, digest = IMAGES.read(image)
+            mimetype = _infer_mimetype(Path(image))
+        else:
+            data = bytes(image.getvalue() if hasattr(image, "getvalue") else image)
+            digest = hashlib.sha256(data).hexdigest()
+            mimetype = _sniff_mimetype(data)
+
+        memo_key = (digest, profile.name if profile else None)
+        with _ENCODED_LOCK:
+            encoded = _ENCODED_PARTS.get(memo_key)
+            if encoded is not None:
+                _ENCODED_PARTS.move_to_end(memo_key)
+                return encoded
+
+        if profile is None:
+            original_size = sent_size = image_size(data)
+        else:
+            data, original_size, sent_size = render(data, profile)
+            mimetype = profile.mimetype
+        b64 = base64.b64encode(data).decode("ascii")
+        part = {"type": "input_image", "image_url": f"data:{mimetype};base64,{b64}"}
+        if profile is not None:
+            part["detail"] = profile.detail
+
+        encoded = (part, original_size, sent_size)
+        _memoize_part(memo_key, encoded)
+        return encoded
+
+    def _log_image_tokens(
+        self,
+        profile: Optional[ImageProfile],
+        original_size: Tuple[int, int],
+        sent_size: Tuple[int, int],
+    ) -> None:
+        """Accumulate estimated image tokens per profile against the unprofiled baseline."""
+        name = profile.name if profile else "unprofiled"
+        with self._lock:
+            entry = self.image_token_stats.setdefault(name, {"images": 0, "est_tokens": 0, "est_tokens_unprofiled": 0})
+            entry["images"] += 1
+            entry["est_tokens"] += estimate_image_tokens(sent_size, profile.detail if profile else "auto")
+            entry["est_tokens_unprofiled"] += estimate_image_tokens(original_size)
 
     @staticmethod
     def _normalize_user_content(user_content: UserContent) -> List[Dict[str, Any]]:
@@ -322,22 +626,104 @@ class ChatGPTWrapper:
         self,
         response: Union[ChatCompletion, ReasoningResponse],
         user_messages: List[Dict[str, Any]],
+        cached: bool = False,
+        prompt_type: Optional[str] = None,
     ) -> None:
         """Update history + token accounting after a completed call."""
-        # token logging
-        usage: Dict[str, int] = dict(response.usage)  # type: ignore[arg-type]
-        self.token_log.append(usage)
-        for k in ("input_tokens", "output_tokens", "reasoning_tokens", "total_tokens"):
-            self.token_totals[k] += usage.get(k, 0)
+        # token logging (cache hits cost nothing)
+        if not cached:
+            self._log_usage(response, prompt_type)
+        elif self.budget is not None:
+            self.budget.ledger.record_cached()
 
         # history update (assistant role content may differ in reasoning)
         assistant_msg = self._assistant_message_from_response(response)
-        if True: # self.persistent_chat:
-            self.history.extend(user_messages)
+        if self.history_mode != "none":
+            self.history.extend(_strip_images(m) for m in user_messages)
             self.history.extend(assistant_msg)
-            self._response_history += [response]
+            self._trim_history()
+        self._response_history.append(response)
         self._last_response = response
 
+    def _log_usage(self, response: Union[ChatCompletion, ReasoningResponse], prompt_type: Optional[str] = None) -> None:
+        usage: Dict[str, int] = dict(response.usage)  # type: ignore[arg-type]
+        self.token_log.append(usage)
+        for k in ("input_tokens", "output_tokens", "reasoning_tokens", "total_tokens"):
+            self.token_totals[k] += usage.get(k, 0)
+        if self.budget is not None:
+            self.budget.record(response.model, usage, prompt_type)
+
+    # ------ history retention ----------------------------------------------
+
+    def _trim_history(self) -> None:
+        """Drop the oldest messages beyond the ring / token cap; queue them for the summary."""
+        evicted: List[Dict[str, Any]] = []
+        if self.history_mode == "ring":
+            overflow = max(0, len(self.history) - self.history_max_messages)
+            evicted, self.history = self.history[:overflow], self.history[overflow:]
+        elif self.history_mode == "tokens":
+            total = sum(_estimate_tokens(m) for m in self.history)
+            # always keep the latest exchange, even when it alone is over budget
+            while total > self.history_token_budget and len(self.history) > 2:
+                evicted.append(self.history.pop(0))
+                total -= _estimate_tokens(evicted[-1])
+        # don't leave a reply at the head whose question was evicted
+        while evicted and len(self.history) > 2 and self.history[0].get("role") == "assistant":
+            evicted.append(self.history.pop(0))
+        if self.summarize_history:
+            self._unsummarized.extend(evicted)
+
+    def _summary_request(self) -> Optional[Tuple[Dict[str, Any], List[Dict[str, Any]]]]:
+        """Claim the pending evicted messages and build the summary call, if due."""
+        with self._lock:
+            if not self.summarize_history or len(self._unsummarized) < self.SUMMARY_BATCH:
+                return None
+            batch, self._unsummarized = self._unsummarized, []
+            previous = self.history_summary or "(none)"
+        turns = "\n".join(f"{m.get('role', 'user')}: {_message_text(m)}" for m in batch)
+        payload = {
+            "model": self.summary_model,
+            "input": [
+                {"role": "developer", "content": _SUMMARY_INSTRUCTIONS},
+                {"role": "user", "content": f"Previous summary:\n{previous}\n\nNew turns:\n{turns}"},
+            ],
+            "max_output_tokens": 400,
+        }
+        return payload, batch
+
+    def _apply_summary(self, response: Optional[ReasoningResponse], batch: List[Dict[str, Any]]) -> None:
+        with self._lock:
+            if response is None:
+                # keep the turns for the next attempt rather than losing them
+                self._unsummarized[:0] = batch
+                return
+            self._log_usage(response, "_history_summary")
+            self.history_summary = response.output_text.strip() or self.history_summary
+
+    def _refresh_summary(self) -> None:
+        request = self._summary_request()
+        if request is None:
+            return
+        payload, batch = request
+        try:
+            response = self.client.responses.create(**payload)
+        except Exception as e:
+            print(f"history summary failed: {e}")
+            response = None
+        self._apply_summary(response, batch)
+
+    async def _arefresh_summary(self) -> None:
+        request = self._summary_request()
+        if request is None:
+            return
+        payload, batch = request
+        try:
+            response = await self.async_client.responses.create(**payload)
+        except Exception as e:
+            print(f"history summary failed: {e}")
+            response = None
+        self._apply_summary(response, batch)
+
     @staticmethod
     def _assistant_message_from_response(
         response: Union[ChatCompletion, ReasoningResponse],
@@ -393,6 +779,43 @@ class ChatGPTWrapper:
 # ---------------------------------------------------------------------------
 
 
+# (content hash, profile) -> (encoded image part, original size, sent size), shared process‑wide
+_ENCODED_PARTS: "OrderedDict[Tuple[str, Optional[str]], Tuple[Dict[str, str], Tuple[int, int], Tuple[int, int]]]" = OrderedDict()
+_ENCODED_PARTS_MAX_BYTES = 16 * 1024 * 1024  # total base64 kept; full-resolution PNGs run to several MB each
+_ENCODED_LOCK = threading.Lock()
+_encoded_bytes = 0
+
+
+def _memoize_part(memo_key: Tuple[str, Optional[str]], encoded: Tuple[Dict[str, str], Tuple[int, int], Tuple[int, int]]) -> None:
+    """Keep *encoded* in the memo, evicting least recently used parts to stay under the byte cap."""
+    global _encoded_bytes
+    size = len(encoded[0]["image_url"])
+    if size > _ENCODED_PARTS_MAX_BYTES:
+        return
+    with _ENCODED_LOCK:
+        previous = _ENCODED_PARTS.pop(memo_key, None)
+        if previous is not None:
+            _encoded_bytes -= len(previous[0]["image_url"])
+        _ENCODED_PARTS[memo_key] = encoded
+        _encoded_bytes += size
+        while _encoded_bytes > _ENCODED_PARTS_MAX_BYTES:
+            _, evicted = _ENCODED_PARTS.popitem(last=False)
+            _encoded_bytes -= len(evicted[0]["image_url"])
+
+
+def _sniff_mimetype(data: bytes) -> str:
+    """Mime‑type from magic bytes, for images handed over without a file name."""
+    if data[:8] == b"\x89PNG\r\n\x1a\n":
+        return "image/png"
+    if data[:3] == b"\xff\xd8\xff":
+        return "image/jpeg"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    if data[:4] == b"GIF8":
+        return "image/gif"
+    return "application/octet-stream"
+
+
 def _infer_mimetype(path: Path) -> str:
     """Very small helper for mime‑type guessing—extend as needed."""
     ext = path.suffix.lower().lstrip(".")
@@ -403,3 +826,29 @@ def _infer_mimetype(path: Path) -> str:
         "gif": "image/gif",
         "webp": "image/webp",
     }.get(ext, "application/octet-stream")
+
+
+def _strip_images(message: Dict[str, Any]) -> Dict[str, Any]:
+    """Copy of *message* with embedded images swapped for a short hash of their bytes."""
+    content = message.get("content")
+    if not isinstance(content, list):
+        return message
+    parts = [
+        {"type": "input_text", "text": f"[image sha256:{image_digest(part['image_url'])[:16]}]"}
+        if isinstance(part, dict) and part.get("type") == "input_image" and isinstance(part.get("image_url"), str)
+        else part
+        for part in content
+    ]
+    return {**message, "content": parts}
+
+
+def _message_text(message: Dict[str, Any]) -> str:
+    content = message.get("content")
+    if isinstance(content, list):
+        return " ".join(str(part.get("text", "")) if isinstance(part, dict) else str(part) for part in content)
+    return str(content or "")
+
+
+def _estimate_tokens(message: Dict[str, Any]) -> int:
+    """Rough token count (~4 characters per token) of a retained message."""
+    return len(_message_text(message)) // 4 + 4
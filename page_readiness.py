@@ -0,0 +1,247 @@
+# page_readiness.py
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+import weakref
+from collections import defaultdict, deque
+from typing import Any, Deque, Dict, Optional
+from urllib.parse import urlparse
+
+
+# Resolves once the DOM has had no mutations for `quietMs`, or after `timeoutMs`.
+_DOM_QUIET_JS = """
+([quietMs, timeoutMs]) => new Promise(resolve => {
+    const start = performance.now();
+    let last = start;
+    const obs = new MutationObserver(() => { last = performance.now(); });
+    obs.observe(document, {subtree: true, childList: true, attributes: true, characterData: true});
+    const tick = () => {
+        const now = performance.now();
+        if (now - last >= quietMs || now - start >= timeoutMs) {
+            obs.disconnect();
+            resolve(now - last >= quietMs);
+        } else {
+            setTimeout(tick, 50);
+        }
+    };
+    setTimeout(tick, 50);
+})
+"""
+
+# Selenium has no request events; the resource timeline length is a decent proxy.
+_SELENIUM_PROBE_JS = "return [document.readyState, performance.getEntriesByType('resource').length];"
+
+
+class _NetworkTracker:
+    """In-flight request counter fed by Playwright page events."""
+
+    def __init__(self, page) -> None:
+        self.inflight = 0
+        self.last_activity = time.monotonic()
+        self.navigations = 0
+        page.on("request", self._started)
+        page.on("requestfinished", self._finished)
+        page.on("requestfailed", self._finished)
+        page.on("framenavigated", self._navigated)
+
+    def _started(self, request) -> None:
+        self.inflight += 1
+        self.last_activity = time.monotonic()
+
+    def _finished(self, request) -> None:
+        self.inflight = max(0, self.inflight - 1)
+        self.last_activity = time.monotonic()
+
+    def _navigated(self, frame) -> None:
+        if frame.parent_frame is None:
+            self.navigations += 1
+            # requests of the old document never report back
+            self.inflight = 0
+            self.last_activity = time.monotonic()
+
+    def idle_for(self) -> float:
+        return 0.0 if self.inflight else time.monotonic() - self.last_activity
+
+
+class PageReadiness:
+    """
+    Replaces fixed post-action sleeps with "wait until the page has settled":
+
+    • network idle  – no in-flight requests for `quiet` seconds
+    • DOM quiet     – no mutations for `quiet` seconds (MutationObserver)
+    • navigation    – a URL change / new document waits for DOMContentLoaded
+
+    The budget for each wait is learned per site from observed settle times
+    (a high percentile plus margin) and never exceeds the fixed sleep it
+    replaces. Time saved against those fixed sleeps is accumulated for reporting.
+    """
+
+    def __init__(
+        self,
+        *,
+        quiet: float = 0.5,
+        min_wait: float = 0.2,
+        min_timeout: float = 1.5,
+        percentile: float = 0.9,
+        margin: float = 1.5,
+        warmup_samples: int = 5,
+        window: int = 50,
+    ) -> None:
+        """
+        Parameters
+        ----------
+        quiet
+            Seconds of network + DOM silence that count as settled.
+        min_wait
+            Always wait at least this long so an action's effects can start.
+        min_timeout
+            Floor for the learned per-site budget.
+        percentile / margin
+            Learned budget is `margin * percentile(settle times)` for the site.
+        warmup_samples
+            Until a site has this many samples the fixed sleep is the budget.
+        window
+            Number of recent settle times kept per site.
+        """
+        self.quiet = quiet
+        self.min_wait = min_wait
+        self.min_timeout = min_timeout
+        self.percentile = percentile
+        self.margin = margin
+        self.warmup_samples = warmup_samples
+
+        self._samples: Dict[str, Deque[float]] = defaultdict(lambda: deque(maxlen=window))
+        self._trackers: "weakref.WeakKeyDictionary[Any, _NetworkTracker]" = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+        self.stats: Dict[str, Dict[str, float]] = defaultdict(
+            lambda: {"waits": 0, "timeouts": 0, "waited": 0.0, "fixed": 0.0}
+        )
+
+    # -----------------------------------------------------------------------
+    # public helpers
+    # -----------------------------------------------------------------------
+
+    def timeout_for(self, site: str, fixed_sleep: float) -> float:
+        """Current wait budget for *site*, capped by the fixed sleep being replaced."""
+        with self._lock:
+            samples = sorted(self._samples[site])
+        if len(samples) < self.warmup_samples:
+            return fixed_sleep
+        learned = samples[min(len(samples) - 1, int(self.percentile * len(samples)))] * self.margin
+        return min(fixed_sleep, max(self.min_timeout, learned + self.quiet))
+
+    async def settle(self, page, fixed_sleep: float, label: str = "action") -> float:
+        """Wait for a Playwright *page* to settle; returns seconds actually waited."""
+        start = time.monotonic()
+        tracker = self._tracker(page)
+        start_url, start_navs = page.url, tracker.navigations
+        site = _site(start_url)
+        deadline = start + self.timeout_for(site, fixed_sleep)
+
+        await asyncio.sleep(self.min_wait)
+        settled = False
+        while time.monotonic() < deadline:
+            remaining = deadline - time.monotonic()
+            try:
+                if page.url != start_url or tracker.navigations != start_navs:
+                    await page.wait_for_load_state("domcontentloaded", timeout=remaining * 1000)
+                    start_url, start_navs = page.url, tracker.navigations
+                dom_quiet = await page.evaluate(_DOM_QUIET_JS, [self.quiet * 1000, remaining * 1000])
+            except Exception:
+                # execution context destroyed by a navigation mid-probe; go round again
+                await asyncio.sleep(0.05)
+                continue
+            if dom_quiet and tracker.idle_for() >= self.quiet:
+                settled = True
+                break
+            await asyncio.sleep(0.05)
+
+        waited = time.monotonic() - start
+        self._record(_site(page.url) if settled else site, label, waited, fixed_sleep, settled)
+        return waited
+
+    def settle_sync(self, driver, fixed_sleep: float, label: str = "action") -> float:
+        """Blocking variant for a Selenium *driver*: readyState complete + resource count stable."""
+        start = time.monotonic()
+        site = _site(driver.current_url)
+        deadline = start + self.timeout_for(site, fixed_sleep)
+
+        time.sleep(self.min_wait)
+        settled = False
+        last_count, stable_since = -1, time.monotonic()
+        while time.monotonic() < deadline:
+            try:
+                state, count = driver.execute_script(_SELENIUM_PROBE_JS)
+            except Exception:
+                state, count = "loading", -1
+            now = time.monotonic()
+            if count != last_count:
+                last_count, stable_since = count, now
+            if state == "complete" and now - stable_since >= self.quiet:
+                settled = True
+                break
+            time.sleep(0.1)
+
+        waited = time.monotonic() - start
+        self._record(site, label, waited, fixed_sleep, settled)
+        return waited
+
+    def report(self) -> Dict[str, Any]:
+        """Wall time saved versus the fixed sleeps, overall and per label."""
+        with self._lock:
+            per_label = {k: dict(v, saved=round(v["fixed"] - v["waited"], 2)) for k, v in self.stats.items()}
+        return {
+            "saved_seconds": round(sum(v["saved"] for v in per_label.values()), 2),
+            "waited_seconds": round(sum(v["waited"] for v in per_label.values()), 2),
+            "fixed_seconds": round(sum(v["fixed"] for v in per_label.values()), 2),
+            "per_label": per_label,
+        }
+
+    # -----------------------------------------------------------------------
+    # internal helpers
+    # -----------------------------------------------------------------------
+
+    def _tracker(self, page) -> _NetworkTracker:
+        tracker = self._trackers.get(page)
+        if tracker is None:
+            tracker = self._trackers[page] = _NetworkTracker(page)
+        return tracker
+
+    def _record(self, site: str, label: str, waited: float, fixed_sleep: float, settled: bool) -> None:
+        with self._lock:
+            if settled:
+                # only real settle times teach the budget; timeouts would just ratchet it
+                self._samples[site].append(waited)
+            entry = self.stats[label]
+            entry["waits"] += 1
+            entry["timeouts"] += 0 if settled else 1
+            entry["waited"] += waited
+            entry["fixed"] += fixed_sleep
+
+
+# ---------------------------------------------------------------------------
+# helper functions (module‑level)
+# ---------------------------------------------------------------------------
+
+
+def _site(url: str) -> str:
+    return urlparse(url or "").netloc.lower()
+
+
+# shared per worker so per-site budgets carry over between jobs
+READINESS = PageReadiness()
+
+
+async def settle(agent_p, fixed_sleep: float, label: str = "action") -> float:
+    """Drop-in for `await asyncio.sleep(fixed_sleep)` after a PlaywrightAgent action."""
+    waited = await READINESS.settle(agent_p.page, fixed_sleep, label)
+    agent_p.readiness_saved = getattr(agent_p, "readiness_saved", 0.0) + (fixed_sleep - waited)
+    return waited
+
+
+def settle_sync(agent_s, fixed_sleep: float, label: str = "action") -> float:
+    """Drop-in for `time.sleep(fixed_sleep)` after a SeleniumAgent action."""
+    return READINESS.settle_sync(agent_s.driver, fixed_sleep, label)
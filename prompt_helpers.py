@@ -1,8 +1,27 @@
+import functools
+import json
+import re
+
+from model_cascade import ESCALATE
+from screenshot_diff import describe_diff_images, diff_screenshots, write_diff_images
+
 # ------------------------------ Generic helpers ------------------------------ #
 def _is_yes(text):
     """True if reply starts with 'yes' (case-insensitive)."""
     return text.strip().lower().startswith('yes')
 
+_YES_NO = re.compile(r"^\s*(yes|no)\b", re.IGNORECASE)
+_INDEX = re.compile(r"-?[0-9]+")
+
+def _is_yes_no(text):
+    """True if reply starts with a plain 'yes' or 'no'."""
+    return bool(_YES_NO.match(text or ""))
+
+def _is_selection(text, count):
+    """True if reply is only 1-based indices within `count` (or -1 for none)."""
+    tokens = (text or "").split()
+    return bool(tokens) and all(_INDEX.fullmatch(t) and (int(t) == -1 or 1 <= int(t) <= count) for t in tokens)
+
 def _lines_to_dict(text):
     """Safely convert `Key : Value` lines to dict, ignoring malformed ones."""
     out = {}
@@ -26,25 +45,204 @@ def _indexed_selection(index_string, items):
             continue
     return sel
 
+def _indexed_lines(text, items):
+    """Map items to the reply lines `N. value` that reference them by 1-based index."""
+    out = {}
+    for line in (text or "").split('\n'):
+        idx, sep, value = line.strip().partition('.')
+        if not sep or not idx.strip().isdigit():
+            continue
+        i = int(idx) - 1
+        if 0 <= i < len(items) and value.strip():
+            out[items[i]] = value.strip()
+    return out
+
+def _matches_schema(value, schema):
+    """Check `value` against the JSON-schema subset used by the structured prompts (types, required keys, enums)."""
+    if "enum" in schema and value not in schema["enum"]:
+        return False
+    kind = schema.get("type")
+    if kind == "object":
+        props = schema.get("properties", {})
+        return isinstance(value, dict) and all(k in value and _matches_schema(value[k], props.get(k, {})) for k in schema.get("required", []))
+    if kind == "array":
+        return isinstance(value, list) and all(_matches_schema(v, schema.get("items", {})) for v in value)
+    if kind == "string":
+        return isinstance(value, str)
+    if kind == "boolean":
+        return isinstance(value, bool)
+    if kind in ("number", "integer"):
+        return isinstance(value, (int, float)) and not isinstance(value, bool)
+    return True
+
 def make_indexed_list_string(items):
     item_list = [str(itm).replace('\n', '') for itm in items]
     return "\n".join(f"{i+1}. {item}" for i, item in enumerate(item_list))
     # "\n".join(f"{i+1}. {str(itm).replace('\n', '')}" for i, item in enumerate(items))
 
+# ----------------------------- prompt definitions ---------------------------- #
+
+class PromptSpec:
+    """
+    A single LLM request: the wrapper call arguments plus a parser for the reply text.
+
+    `well_formed` (reply text -> bool) marks replies that can be checked
+    mechanically; such prompts may be answered by a cheap model first
+    (see `model_cascade.ModelCascade`).
+    """
+
+    def __init__(self, prompt, parse=None, well_formed=None, **request):
+        self.prompt = prompt
+        self.request = request
+        self.parse = parse or (lambda text: text)
+        self.well_formed = well_formed
+        self.answered = False
+        self.answer = None
+
+    @classmethod
+    def resolved(cls, answer):
+        """A spec already answered locally; `llm_prompt` returns `answer` without calling the model."""
+        spec = cls(None)
+        spec.answered = True
+        spec.answer = answer
+        return spec
+
+
+def llm_prompt(build=None, *, image_profile=None):
+    """
+    Decorator turning a PromptSpec builder into an LLM prompt.
+
+    The decorated function is called as `fn(llm_agent, *args)` and blocks on
+    `llm_agent(...)`, or awaited as `fn.acall(llm_agent, *args)` which goes
+    through `llm_agent.acall(...)` and leaves the event loop free meanwhile.
+    The function name is passed along as `prompt_type` (cache opt-outs, stats),
+    and `image_profile` (see `image_profiles.PROFILES`) sets how attached
+    images are sized and encoded. When the agent carries a `cascade`
+    (`model_cascade.ModelCascade`), checkable prompts try its cheap model
+    first and only reach the agent's own model on escalation.
+    A `cache=` keyword on the call (True/False) overrides the response cache
+    for that one call, e.g. `cache=False` to re-ask after a fruitless answer.
+    Use bare `@llm_prompt` or `@llm_prompt(...)`.
+    """
+    if build is None:
+        return functools.partial(llm_prompt, image_profile=image_profile)
+
+    call_options = {"prompt_type": build.__name__}
+    if image_profile is not None:
+        call_options["image_profile"] = image_profile
+
+    @functools.wraps(build)
+    def run(llm_agent, *args, cache=None, **kwargs):
+        spec = build(*args, **kwargs)
+        if spec.answered:
+            return spec.answer
+        options = call_options if cache is None else {**call_options, "cache": cache}
+        cascade = getattr(llm_agent, "cascade", None)
+        if cascade is not None and cascade.applies(spec, call_options["prompt_type"]):
+            answer = cascade.attempt(llm_agent, spec, options)
+            if answer is not ESCALATE:
+                return answer
+        resp = llm_agent(spec.prompt, **{**options, **spec.request})
+        return spec.parse(resp.output_text)
+
+    async def acall(llm_agent, *args, cache=None, **kwargs):
+        spec = build(*args, **kwargs)
+        if spec.answered:
+            return spec.answer
+        options = call_options if cache is None else {**call_options, "cache": cache}
+        cascade = getattr(llm_agent, "cascade", None)
+        if cascade is not None and cascade.applies(spec, call_options["prompt_type"]):
+            answer = await cascade.aattempt(llm_agent, spec, options)
+            if answer is not ESCALATE:
+                return answer
+        resp = await llm_agent.acall(spec.prompt, **{**options, **spec.request})
+        return spec.parse(resp.output_text)
+
+    run.acall = acall
+    run.call_options = call_options
+    return run
+
 # ----------------------------- general llm calls ----------------------------- #
 
-def _yes_no_query(llm_agent, prompt, images=None, explained=False):
+def _yes_no_spec(prompt, images=None, explained=False, with_text=None):
     """
-    Run a Yes/No LLM query and return bool.
-    Also returns raw text when caller needs it.
+    Yes/No request; parses to `(bool, raw text)` when `with_text` (defaults
+    to `explained`), else to bool.
     """
     instruction_add_on = ", before explaining in one line why yes or why not." if explained else "."
     instructions = "Respond with either 'Yes' or 'No'" + instruction_add_on
 
     if explained:
         instructions += " Explain your reasoning briefly."
-    resp = llm_agent(prompt, instructions=instructions, images=images or []).output_text
-    return _is_yes(resp), resp
+    with_text = explained if with_text is None else with_text
+    parse = (lambda text: (_is_yes(text), text)) if with_text else _is_yes
+    return PromptSpec(prompt, parse, _is_yes_no, instructions=instructions, images=images or [])
+
+
+def _select_spec(prompt, page_buttons, images=None):
+    """Button selection request; parses the serial-number reply to button objects."""
+    return PromptSpec(
+        prompt,
+        lambda text: _indexed_selection(text, page_buttons),
+        lambda text: _is_selection(text, len(page_buttons)),
+        instructions="Respond with button serial numbers with a single space between each number, in case of None, reply with -1. Try to select at least 1.",
+        images=images or []
+    )
+
+
+def _json_spec(prompt, name, schema, images=None, **request):
+    """
+    Structured-output request: the reply is constrained to `schema` (strict
+    JSON schema through the `text` format) and parses to the validated
+    object, or None when it does not decode or match, so the caller can fall
+    back to the free-text prompts.
+    """
+    def parse(text):
+        try:
+            value = json.loads(text)
+        except (TypeError, ValueError):
+            return None
+        return value if _matches_schema(value, schema) else None
+
+    text_format = {"format": {"type": "json_schema", "name": name, "schema": schema, "strict": True}}
+    return PromptSpec(prompt, parse, text=text_format, images=images or [], **request)
+
+
+def _before_after_spec(spec_builder, prompt, before_img, after_img, unchanged, max_box_fraction=0.6, **kwargs):
+    """
+    Before/after vision request routed through the screenshot diff.
+
+    Identical screenshots resolve to `unchanged` without a model call; small
+    changes send a thumbnail plus crops of the changed regions; page-wide
+    changes (or an unreadable image) fall back to the two full screenshots.
+    Meant for intermediate checks: the final verdict (`_final_outcome`)
+    always sends the full screenshots to the model.
+    """
+    try:
+        diff = diff_screenshots(before_img, after_img)
+        if not diff.changed:
+            return PromptSpec.resolved(unchanged)
+        if diff.box_fraction <= max_box_fraction:
+            images = write_diff_images(before_img, after_img, diff)
+            return spec_builder(prompt + describe_diff_images(diff), images=images, **kwargs)
+    except (OSError, ValueError) as e:
+        print(f"screenshot diff skipped: {e}")
+    return spec_builder(prompt, images=[before_img, after_img], **kwargs)
+
+
+def _yes_no_query(llm_agent, prompt, images=None, explained=False):
+    """
+    Run a Yes/No LLM query and return bool.
+    Also returns raw text when caller needs it.
+    """
+    spec = _yes_no_spec(prompt, images, explained, with_text=True)
+    return spec.parse(llm_agent(spec.prompt, **spec.request).output_text)
+
+
+async def _ayes_no_query(llm_agent, prompt, images=None, explained=False):
+    """Awaitable `_yes_no_query`."""
+    spec = _yes_no_spec(prompt, images, explained, with_text=True)
+    return spec.parse((await llm_agent.acall(spec.prompt, **spec.request)).output_text)
 
 
 def _select_buttons(llm_agent, prompt, page_buttons, images=None):
@@ -52,9 +250,11 @@ def _select_buttons(llm_agent, prompt, page_buttons, images=None):
     Ask LLM which buttons to press (returns list of actual button objects).
     Expects the usual serial-number response pattern.
     """
-    resp = llm_agent(
-        prompt,
-        instructions="Respond with button serial numbers with a single space between each number, in case of None, reply with -1. Try to select at least 1.",
-        images=images or []
-    ).output_text
-    return _indexed_selection(resp, page_buttons)
+    spec = _select_spec(prompt, page_buttons, images)
+    return spec.parse(llm_agent(spec.prompt, **spec.request).output_text)
+
+
+async def _aselect_buttons(llm_agent, prompt, page_buttons, images=None):
+    """Awaitable `_select_buttons`."""
+    spec = _select_spec(prompt, page_buttons, images)
+    return spec.parse((await llm_agent.acall(spec.prompt, **spec.request)).output_text)
@@ -0,0 +1,87 @@
+import asyncio
+import types
+
+import job_scheduler
+
+from job_lease import LeaseManager
+from job_scheduler import JobScheduler
+from local_job_server import LocalJobServer
+from server_config import JobServerClient
+
+# Runs the scheduler in front of a lease manager against the in-memory job
+# server: with long PENDING jobs and short VERIFY jobs queued, VERIFY jobs are
+# started in between instead of after every PENDING job; a failing HELD job
+# backs off on its own (excluded from leases) while the rest keeps flowing.
+
+server = LocalJobServer().start()
+for i in range(8):
+    server.add_job({"job_id": i, "url": f"https://shop{i}.example", "promo_code": "P", "description": ""}, status="PENDING")
+for i in range(100, 108):
+    server.add_job({"job_id": i, "url": f"https://shop{i}.example", "promo_code": "V", "description": ""}, status="VERIFY")
+server.add_job({"job_id": 999, "url": "https://flaky.example", "promo_code": "H", "description": ""}, status="HELD")
+
+RUN_SECONDS = {"PENDING": 600.0, "VERIFY": 60.0, "HELD": 600.0}
+
+
+async def main():
+    scheduler = JobScheduler({"PENDING": 3, "VERIFY": 2, "HELD": 1}, retry_base=3600)
+    client = JobServerClient(server.url, retries=1, backoff=0.05)
+    leases = await LeaseManager(client, ("PENDING", "HELD", "VERIFY"), prefetch=1, ttl=30,
+                                idle_start=0.05, idle_max=0.1, scheduler=scheduler, worker_id="w").start()
+    order = []
+    while len(order) < 17:
+        try:
+            lease = await asyncio.wait_for(leases.next(), 2)
+        except asyncio.TimeoutError:
+            break
+        scheduler.started(lease)
+        order.append(lease.job_type[0])
+        scheduler.finished(lease.job_type, RUN_SECONDS[lease.job_type])
+        if lease.job_id == 999:
+            # the HELD job fails again: only it waits, for an hour
+            delay = scheduler.failed(999)
+            server.update(999, "HELD", {})
+            print(f"job 999 failed, retry in {delay:.0f}s")
+        else:
+            server.update(lease.job_id, "PROCESSED", {})
+        leases.finish(lease)
+    await leases.close()
+    return "".join(order), scheduler, leases
+
+
+order, scheduler, leases = asyncio.run(main())
+print(f"start order: {order}")
+print(scheduler.report())
+assert order.count("H") == 1, "the failed HELD job must wait out its backoff"
+assert order.count("P") == 8 and order.count("V") == 8
+first_half = order[: len(order) // 2]
+assert "V" in first_half and "P" in first_half, "VERIFY jobs should interleave with PENDING ones"
+assert "VVVVVVVV" not in order and "PPPPPPPP" not in order
+assert server.status[999] == "HELD" and 999 in scheduler.backing_off()
+
+# aging: a queue that has not been served for a while overtakes a lower virtual clock
+aged = JobScheduler({"PENDING": 1, "HELD": 1}, aging=10.0)
+aged.vtime["HELD"] = 500.0
+aged.last_served["HELD"] -= aged.starve_after + 100
+assert aged.order(["PENDING", "HELD"])[0] == "HELD", aged.order(["PENDING", "HELD"])
+
+# default aging: with every queue always full, worker time follows the weights
+# (simulated on a fake clock, so a long run takes no real time)
+now = [0.0]
+real_time, job_scheduler.time = job_scheduler.time, types.SimpleNamespace(monotonic=lambda: now[0], time=lambda: now[0])
+fair = JobScheduler({"PENDING": 3, "HELD": 1, "VERIFY": 2})
+busy = dict.fromkeys(RUN_SECONDS, 0.0)
+for _ in range(500):
+    job_type = fair.order(RUN_SECONDS)[0]
+    fair.started(types.SimpleNamespace(job_type=job_type, job={}, leased_at=now[0]))
+    now[0] += RUN_SECONDS[job_type]
+    busy[job_type] += RUN_SECONDS[job_type]
+    fair.finished(job_type, RUN_SECONDS[job_type])
+job_scheduler.time = real_time
+shares = {t: busy[t] / sum(busy.values()) for t in busy}
+print(f"time shares: { {t: round(v, 2) for t, v in shares.items()} }")
+expected = {"PENDING": 3 / 6, "HELD": 1 / 6, "VERIFY": 2 / 6}
+assert all(abs(shares[t] - expected[t]) < 0.05 for t in expected), shares
+
+server.stop()
+print("scheduler smoke test passed")
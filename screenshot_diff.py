@@ -0,0 +1,202 @@
+# screenshot_diff.py
+from __future__ import annotations
+
+import io
+from collections import deque
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+from PIL import Image
+
+from image_store import IMAGES
+
+Box = Tuple[int, int, int, int]     # x0, y0, x1, y1 (exclusive)
+ImagePath = Union[str, Path]
+
+
+class ScreenshotDiff:
+    """Result of comparing a before/after screenshot pair."""
+
+    def __init__(self, changed: bool, boxes: List[Box], changed_fraction: float, size: Tuple[int, int]) -> None:
+        self.changed = changed
+        self.boxes = boxes
+        self.changed_fraction = changed_fraction
+        self.size = size                    # (width, height) of the after image
+
+    @property
+    def box_fraction(self) -> float:
+        """Share of the page covered by the changed boxes."""
+        w, h = self.size
+        area = sum((x1 - x0) * (y1 - y0) for x0, y0, x1, y1 in self.boxes)
+        return area / float(w * h) if w and h else 1.0
+
+    def __repr__(self) -> str:
+        return f"<ScreenshotDiff changed={self.changed} boxes={len(self.boxes)} frac={self.changed_fraction:.4f}>"
+
+
+# ---------------------------------------------------------------------------
+# diffing
+# ---------------------------------------------------------------------------
+
+
+def _open(path: ImagePath) -> Image.Image:
+    # served from the in-memory store when the screenshot was captured there
+    data, _ = IMAGES.read(path)
+    return Image.open(io.BytesIO(data))
+
+
+def load_rgb(path: ImagePath) -> np.ndarray:
+    """Decode an image to an (H, W, 3) uint8 array."""
+    with _open(path) as im:
+        return np.asarray(im.convert("RGB"))
+
+
+def diff_screenshots(
+    before: ImagePath,
+    after: ImagePath,
+    *,
+    pixel_threshold: int = 24,
+    min_changed_pixels: int = 64,
+    block: int = 16,
+    pad: int = 24,
+    max_regions: int = 4,
+) -> ScreenshotDiff:
+    """
+    Compare two screenshots.
+
+    A pixel counts as changed when any channel moves by more than
+    `pixel_threshold`; fewer than `min_changed_pixels` changed pixels
+    (caret blink, anti-aliasing) is treated as no change. Changed pixels are
+    pooled into `block`-sized cells, grouped into connected regions and
+    returned as padded bounding boxes, at most `max_regions` of them.
+    """
+    a = load_rgb(before)
+    b = load_rgb(after)
+    h, w = b.shape[:2]
+    if a.shape != b.shape:
+        # resized viewport or full-page capture of a different length
+        return ScreenshotDiff(True, [(0, 0, w, h)], 1.0, (w, h))
+
+    mask = (np.abs(a.astype(np.int16) - b.astype(np.int16)).max(axis=2) > pixel_threshold)
+    changed_fraction = float(mask.mean())
+    if int(mask.sum()) < min_changed_pixels:
+        return ScreenshotDiff(False, [], changed_fraction, (w, h))
+
+    cells = _pool_blocks(mask, block)
+    boxes = [
+        (max(0, x0 * block - pad), max(0, y0 * block - pad),
+         min(w, x1 * block + pad), min(h, y1 * block + pad))
+        for x0, y0, x1, y1 in _cell_regions(cells)
+    ]
+    return ScreenshotDiff(True, _limit_boxes(boxes, max_regions), changed_fraction, (w, h))
+
+
+def _pool_blocks(mask: np.ndarray, block: int) -> np.ndarray:
+    """Boolean (H/block, W/block) grid: does any pixel in the cell change?"""
+    h, w = mask.shape
+    gh, gw = -(-h // block), -(-w // block)
+    padded = np.zeros((gh * block, gw * block), dtype=bool)
+    padded[:h, :w] = mask
+    return padded.reshape(gh, block, gw, block).any(axis=(1, 3))
+
+
+def _cell_regions(cells: np.ndarray) -> List[Box]:
+    """Bounding boxes (in cell units) of 8-connected groups of changed cells."""
+    gh, gw = cells.shape
+    seen = np.zeros_like(cells)
+    boxes: List[Box] = []
+    for y, x in zip(*np.nonzero(cells)):
+        if seen[y, x]:
+            continue
+        seen[y, x] = True
+        x0, y0, x1, y1 = x, y, x + 1, y + 1
+        queue = deque([(y, x)])
+        while queue:
+            cy, cx = queue.popleft()
+            x0, y0, x1, y1 = min(x0, cx), min(y0, cy), max(x1, cx + 1), max(y1, cy + 1)
+            for ny in range(max(0, cy - 1), min(gh, cy + 2)):
+                for nx in range(max(0, cx - 1), min(gw, cx + 2)):
+                    if cells[ny, nx] and not seen[ny, nx]:
+                        seen[ny, nx] = True
+                        queue.append((ny, nx))
+        boxes.append((int(x0), int(y0), int(x1), int(y1)))
+    return boxes
+
+
+def _limit_boxes(boxes: List[Box], max_regions: int) -> List[Box]:
+    """Merge overlapping boxes, then fold the smallest ones together until few enough remain."""
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(boxes)):
+            for j in range(i + 1, len(boxes)):
+                if _overlaps(boxes[i], boxes[j]):
+                    boxes[i] = _union(boxes[i], boxes[j])
+                    del boxes[j]
+                    merged = True
+                    break
+            if merged:
+                break
+    boxes.sort(key=lambda bx: (bx[2] - bx[0]) * (bx[3] - bx[1]), reverse=True)
+    while len(boxes) > max_regions:
+        boxes[-2] = _union(boxes[-2], boxes.pop())
+    return boxes
+
+
+def _overlaps(p: Box, q: Box) -> bool:
+    return p[0] < q[2] and q[0] < p[2] and p[1] < q[3] and q[1] < p[3]
+
+
+def _union(p: Box, q: Box) -> Box:
+    return (min(p[0], q[0]), min(p[1], q[1]), max(p[2], q[2]), max(p[3], q[3]))
+
+
+# ---------------------------------------------------------------------------
+# compact image sets for the vision prompts
+# ---------------------------------------------------------------------------
+
+
+def write_diff_images(
+    before: ImagePath,
+    after: ImagePath,
+    diff: ScreenshotDiff,
+    *,
+    thumb_width: int = 512,
+    out_stem: Optional[ImagePath] = None,
+) -> List[str]:
+    """
+    Store a thumbnail of the after page plus a before/after crop per changed
+    region next to *after* (or at `out_stem`), returning the paths in the order
+    they should be attached: thumbnail, then (before, after) for each region.
+    The images live in `IMAGES`; their files are written in the background.
+    """
+    stem = str(out_stem) if out_stem else str(Path(after).with_suffix(""))
+    paths: List[str] = []
+    with _open(before) as im_b, _open(after) as im_a:
+        thumb = im_a.convert("RGB")
+        if thumb.width > thumb_width:
+            thumb = thumb.resize((thumb_width, round(thumb.height * thumb_width / thumb.width)), Image.BILINEAR)
+        paths.append(f"{stem}_diff_thumb.png")
+        IMAGES.put(paths[-1], _png_bytes(thumb))
+        for i, box in enumerate(diff.boxes):
+            for tag, im in (("before", im_b), ("after", im_a)):
+                paths.append(f"{stem}_diff_{i}_{tag}.png")
+                IMAGES.put(paths[-1], _png_bytes(im.crop(box)))
+    return paths
+
+
+def _png_bytes(im: Image.Image) -> bytes:
+    buf = io.BytesIO()
+    im.save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def describe_diff_images(diff: ScreenshotDiff) -> str:
+    """Prompt note explaining the attachment layout produced by `write_diff_images`."""
+    regions = ", ".join(f"region {i + 1} at x={x0}-{x1}, y={y0}-{y1}" for i, (x0, y0, x1, y1) in enumerate(diff.boxes))
+    return (
+        "\n\nOnly the changed parts of the page are attached: first a small thumbnail of the whole page after the "
+        f"attempt, then a before crop followed by an after crop for each changed region ({regions}). "
+        "Everything outside these regions is pixel-identical before and after."
+    )
@@ -1,48 +1,190 @@
-import os, time, base64, json, requests
+import os, time, base64, json, random, threading, requests
+from requests.adapters import HTTPAdapter
 
 #  Environment
 SERVER_URL      = os.environ.get("SERVER_URL", "http://127.0.0.1:5000")
 OPENAI_API_KEY  = os.environ["OPENAI_API_KEY"] # must be supplied
-job_type
-#  Helper: server API
-def get_next_job():
-    try:
-        r = requests.get(f"{SERVER_URL}/private_api/get_next_job", timeout=10)
-        if r.status_code == 200:
-            data = r.json()
-            return data if "job_id" in data else None
-    except Exception as e:
-        print("get_next_job error:", e)
-    return None
 
-def get_job(job_type):
-    try:
+# ------------------------------------------------------------------------------
+#  Job-server client: one pooled keep-alive session, retries with jittered backoff
+# ------------------------------------------------------------------------------
+
+# (connect, read) seconds per endpoint; uploads get a longer read budget
+ENDPOINT_TIMEOUTS = {
+    "get_next_job": (3.05, 10),
+    "get_job":      (3.05, 15),
+    "update":       (3.05, 60),
+    "lease":        (3.05, 15),
+    "heartbeat":    (3.05, 10),
+    "release":      (3.05, 10),
+}
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class JobServerClient:
+    """
+    Thread-safe client for the job server's private API.
+
+    Every call reuses a pooled keep-alive session and is retried on connection
+    errors, timeouts and 429/5xx answers with exponential backoff and full
+    jitter (honouring `Retry-After`). Like the old helpers it never raises:
+    a call that keeps failing returns None / False.
+    """
+
+    def __init__(self, base_url=SERVER_URL, *, retries=4, backoff=0.5, max_backoff=20.0, pool_size=8, timeouts=None):
+        self.base_url = base_url.rstrip("/")
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeouts = dict(ENDPOINT_TIMEOUTS, **(timeouts or {}))
+        self.stats = {"requests": 0, "retries": 0, "failures": 0}
+        self._lock = threading.Lock()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    # ---- endpoints -------------------------------------------------------------
+
+    def get_next_job(self):
+        r = self._request("GET", "get_next_job", "/private_api/get_next_job")
+        return self._job(r)
+
+    def get_job(self, job_type, wait=0):
+        """
+        Next job of `job_type`, or None. With `wait` > 0 the server is asked to
+        hold the request (long-poll) until a job arrives or `wait` seconds pass.
+        """
         payload = {"job_type": job_type}
-        r = requests.post(f"{SERVER_URL}/private_api/get_job", json = payload, timeout=20)
-        if r.status_code == 200:
-            data = r.json()
-            return data if "job_id" in data else None
-    except Exception as e:
-        print("get_next_job error:", e)
-    return None
+        timeout = self.timeouts["get_job"]
+        if wait:
+            payload["wait"] = wait
+            timeout = (timeout[0], timeout[1] + wait)
+        r = self._request("POST", "get_job", "/private_api/get_job", json=payload, timeout=timeout)
+        return self._job(r)
 
+    def lease_jobs(self, worker_id, job_types, count=1, ttl=120, wait=0, exclude=()):
+        """
+        Atomically lock up to `count` jobs of `job_types` (in that order) for
+        `ttl` seconds, skipping the job ids in `exclude`. Returns a list of
+        {"lease_id", "job_type", "job"}, an empty list when nothing was leased,
+        or None if the server has no lease endpoint (older servers: use
+        get_job + QUEUED instead).
+        """
+        payload = {"worker_id": worker_id, "job_types": list(job_types), "count": count, "ttl": ttl}
+        if exclude:
+            payload["exclude"] = list(exclude)
+        timeout = self.timeouts["lease"]
+        if wait:
+            payload["wait"] = wait
+            timeout = (timeout[0], timeout[1] + wait)
+        r = self._request("POST", "lease", "/private_api/lease", json=payload, timeout=timeout)
+        if r is not None and r.status_code in (404, 405):
+            return None
+        if r is None or r.status_code != 200:
+            return []
+        try:
+            leases = r.json().get("leases") or []
+        except (ValueError, AttributeError):
+            return []
+        return [l for l in leases if isinstance(l, dict) and isinstance(l.get("job"), dict) and "job_id" in l["job"]]
 
-def update_job_status(job_id, status, text=None, image_path=None):
-    payload = {"job_id": job_id, "status": status}
+    def renew_leases(self, worker_id, lease_ids, ttl=120):
+        """Heartbeat: extend `lease_ids` by `ttl`. Returns the ids the server no longer holds for us, or None on failure."""
+        r = self._request("POST", "heartbeat", "/private_api/heartbeat",
+                          json={"worker_id": worker_id, "lease_ids": list(lease_ids), "ttl": ttl})
+        if r is None or r.status_code != 200:
+            return None
+        try:
+            return list(r.json().get("lost") or [])
+        except (ValueError, AttributeError):
+            return None
+
+    def release_leases(self, worker_id, lease_ids):
+        """Hand unstarted jobs back to their queue."""
+        r = self._request("POST", "release", "/private_api/release",
+                          json={"worker_id": worker_id, "lease_ids": list(lease_ids)})
+        return r is not None and r.status_code == 200
+
+    def update_job_status(self, job_id, status, text=None, image_path=None):
+        payload = {"job_id": job_id, "status": status}
+
+        if text is not None:
+            payload["text_file_data"] = text
 
-    if text is not None:
-        payload["text_file_data"] = text
+        if image_path and os.path.exists(image_path):
+            with open(image_path, "rb") as f:
+                payload["image_file_data"] = base64.b64encode(f.read()).decode("ascii")
 
-    if image_path and os.path.exists(image_path):
-        with open(image_path, "rb") as f:
-            payload["image_file_data"] = base64.b64encode(f.read()).decode("ascii")
+        r = self._request("POST", "update", "/private_api/update", json=payload)
+        return r is not None and r.status_code == 200
 
+    def close(self):
+        self.session.close()
+
+    # ---- internals -------------------------------------------------------------
+
+    @staticmethod
+    def _job(r):
+        if r is None or r.status_code != 200:
+            return None
+        try:
+            data = r.json()
+        except ValueError:
+            return None
+        return data if isinstance(data, dict) and "job_id" in data else None
+
+    def _request(self, method, endpoint, path, timeout=None, **kwargs):
+        timeout = timeout or self.timeouts[endpoint]
+        for attempt in range(self.retries + 1):
+            delay = None
+            try:
+                self._count("requests")
+                r = self.session.request(method, f"{self.base_url}{path}", timeout=timeout, **kwargs)
+                if r.status_code not in RETRY_STATUSES:
+                    return r
+                delay = _retry_after(r)
+                error = f"HTTP {r.status_code}"
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = e
+            except requests.RequestException as e:
+                print(f"{endpoint} error:", e)
+                break
+            if attempt == self.retries:
+                print(f"{endpoint} failed after {attempt + 1} attempts:", error)
+                break
+            self._count("retries")
+            # full jitter: uniform in [0, min(cap, base * 2^attempt)]
+            time.sleep(delay if delay is not None else random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt)))
+        self._count("failures")
+        return None
+
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+
+def _retry_after(r):
     try:
-        r = requests.post(f"{SERVER_URL}/private_api/update", json=payload, timeout=30)
-        return r.status_code == 200
-    except Exception as e:
-        print(f"update_job_status({job_id}) error:", e)
-        return False
+        return min(float(r.headers.get("Retry-After", "")), 60.0)
+    except ValueError:
+        return None
+
+
+# one pooled client per worker process
+JOB_SERVER = JobServerClient()
+
+
+#  Helper: server API
+def get_next_job():
+    return JOB_SERVER.get_next_job()
+
+def get_job(job_type, wait=0):
+    return JOB_SERVER.get_job(job_type, wait=wait)
+
+
+def update_job_status(job_id, status, text=None, image_path=None):
+    return JOB_SERVER.update_job_status(job_id, status, text=text, image_path=image_path)
         
 
 def append_logs_to_json(file_path, output_path,
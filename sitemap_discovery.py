@@ -0,0 +1,262 @@
+# sitemap_discovery.py
+from __future__ import annotations
+
+import gzip
+import io
+import re
+import time
+import xml.etree.ElementTree as ET
+from collections import deque
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urljoin, urlsplit
+
+import requests
+import urllib3
+
+from link_scorer import criteria_terms, looks_like_product, term_overlap
+from url_tools import canonicalize_url, same_site, url_key
+
+USER_AGENT = "Mozilla/5.0 (compatible; promo-verifier/1.0; +sitemap-discovery)"
+
+# tried when robots.txt names no sitemap
+DEFAULT_SITEMAPS = ("/sitemap.xml", "/sitemap_index.xml", "/sitemap_products_1.xml", "/product-sitemap.xml")
+
+_PRODUCT_SITEMAP = re.compile(r"product", re.I)
+_SKIP_SITEMAP = re.compile(r"blog|post|article|page|news|image|video|author|tag|store-?locat", re.I)
+
+
+class SitemapProduct:
+    """A product URL found in a sitemap, with its `lastmod` and (Shopify-style) image title."""
+
+    __slots__ = ("url", "lastmod", "title", "source", "score")
+
+    def __init__(self, url: str, lastmod: Optional[str], title: Optional[str], source: str) -> None:
+        self.url = url
+        self.lastmod = lastmod
+        self.title = title
+        self.source = source
+        self.score = 0.0
+
+    def __repr__(self) -> str:
+        return f"<SitemapProduct {self.score:.1f} {self.url} lastmod={self.lastmod}>"
+
+
+class SitemapDiscovery:
+    """
+    Product discovery from robots.txt and sitemaps, without a browser.
+
+    Sitemaps (plain or gzipped, urlsets or indexes) are stream-parsed, so a
+    multi-megabyte index costs a few KB of memory; at most `max_sitemaps`
+    files, `max_bytes` per file and `max_urls` product URLs are read. Product
+    sitemaps listed in an index are visited first.
+    """
+
+    def __init__(
+        self,
+        *,
+        session: Optional[requests.Session] = None,
+        timeout: float = 10.0,
+        max_sitemaps: int = 12,
+        max_urls: int = 5000,
+        max_bytes: int = 50 * 1024 * 1024,
+    ) -> None:
+        self.session = session or requests.Session()
+        self.session.headers.setdefault("User-Agent", USER_AGENT)
+        self.timeout = timeout
+        self.max_sitemaps = max_sitemaps
+        self.max_urls = max_urls
+        self.max_bytes = max_bytes
+        self.stats: Dict[str, Any] = {}
+
+    # -----------------------------------------------------------------------
+    # public helpers
+    # -----------------------------------------------------------------------
+
+    def sitemap_urls(self, site_url: str) -> List[str]:
+        """Sitemaps declared in robots.txt, else the conventional locations that exist."""
+        root = _site_root(site_url)
+        declared: List[str] = []
+        try:
+            r = self.session.get(urljoin(root, "/robots.txt"), timeout=self.timeout)
+            if r.status_code == 200:
+                for line in r.text.splitlines():
+                    key, _, value = line.partition(":")
+                    if key.strip().lower() == "sitemap" and value.strip():
+                        declared.append(urljoin(root, value.strip()))
+        except requests.RequestException as e:
+            print(f"robots.txt fetch failed for {root}: {e}")
+        if declared:
+            return list(dict.fromkeys(declared))
+        found = []
+        for path in DEFAULT_SITEMAPS:
+            url = urljoin(root, path)
+            try:
+                r = self.session.head(url, timeout=self.timeout, allow_redirects=True)
+                if r.status_code == 405:
+                    r = self.session.get(url, timeout=self.timeout, stream=True)
+                    r.close()
+                if r.status_code == 200:
+                    found.append(url)
+                    break
+            except requests.RequestException:
+                continue
+        return found
+
+    def products(self, site_url: str) -> List[SitemapProduct]:
+        """All product URLs (deduplicated, same site) reachable from the site's sitemaps."""
+        start = time.monotonic()
+        queue: Deque[str] = deque(self.sitemap_urls(site_url))
+        seen_maps, seen_urls = set(), set()
+        products: List[SitemapProduct] = []
+        fetched = 0
+        while queue and fetched < self.max_sitemaps and len(products) < self.max_urls:
+            sitemap = queue.popleft()
+            if sitemap in seen_maps:
+                continue
+            seen_maps.add(sitemap)
+            fetched += 1
+            product_map = bool(_PRODUCT_SITEMAP.search(urlsplit(sitemap).path))
+            children = []
+            for kind, loc, lastmod, title in self._entries(sitemap):
+                if kind == "sitemap":
+                    children.append(loc)
+                    continue
+                if not same_site(loc, site_url) or not (product_map or looks_like_product(loc)):
+                    continue
+                key = url_key(loc)
+                if key in seen_urls:
+                    continue
+                seen_urls.add(key)
+                products.append(SitemapProduct(canonicalize_url(loc), lastmod, title, sitemap))
+                if len(products) >= self.max_urls:
+                    break
+            # product sitemaps jump the queue, content sitemaps (blog, pages, images) are never read
+            for child in children:
+                if _PRODUCT_SITEMAP.search(child):
+                    queue.appendleft(child)
+                elif not _SKIP_SITEMAP.search(urlsplit(child).path):
+                    queue.append(child)
+        self.stats = {
+            "sitemaps_read": fetched,
+            "products": len(products),
+            "seconds": round(time.monotonic() - start, 2),
+        }
+        return products
+
+    def discover(self, site_url: str, promo_criteria: Optional[str] = None, limit: int = 20) -> List[SitemapProduct]:
+        """Best `limit` products for *promo_criteria*; empty when the site has no usable sitemap."""
+        products = self.products(site_url)
+        return rank_products(products, promo_criteria, limit)
+
+    # -----------------------------------------------------------------------
+    # internal helpers
+    # -----------------------------------------------------------------------
+
+    def _entries(self, sitemap_url: str) -> Iterator[Tuple[str, str, Optional[str], Optional[str]]]:
+        """Yield ("url" | "sitemap", loc, lastmod, title) from one sitemap, streaming."""
+        try:
+            r = self.session.get(sitemap_url, timeout=self.timeout, stream=True)
+        except requests.RequestException as e:
+            print(f"sitemap fetch failed for {sitemap_url}: {e}")
+            return
+        with r:
+            if r.status_code != 200:
+                return
+            r.raw.decode_content = True     # undo Content-Encoding: gzip
+            try:
+                yield from _iter_sitemap(_open_stream(r.raw, self.max_bytes))
+            except (ET.ParseError, OSError, EOFError, urllib3.exceptions.HTTPError, requests.RequestException) as e:
+                # truncated by max_bytes, malformed, or the connection failed mid-read; keep what was parsed
+                print(f"sitemap parse stopped for {sitemap_url}: {e}")
+
+
+def rank_products(products: List[SitemapProduct], promo_criteria: Optional[str] = None, limit: int = 20) -> List[SitemapProduct]:
+    """Order products by overlap of slug/title with the promo criteria, then by recency (`lastmod`)."""
+    terms = criteria_terms(promo_criteria)
+    for p in products:
+        p.score = 2.0 * term_overlap(f"{urlsplit(p.url).path} {p.title or ''}", terms) + (0.5 if p.title else 0.0)
+    # ISO 8601 lastmods sort lexically; the second (stable) sort keeps newest first within a score
+    ranked = sorted(products, key=lambda p: p.lastmod or "", reverse=True)
+    ranked.sort(key=lambda p: -p.score)
+    return ranked[:limit]
+
+
+def discover_products(site_url: str, promo_criteria: Optional[str] = None, limit: int = 20, **kwargs: Any) -> Tuple[List[str], Dict[str, str], Dict[str, Any]]:
+    """
+    Convenience entry for the pipeline: (product urls, {url: sitemap it came from}, stats).
+    The url list is empty when no sitemap lists products.
+    """
+    discovery = SitemapDiscovery(**kwargs)
+    try:
+        found = discovery.discover(site_url, promo_criteria, limit)
+    finally:
+        discovery.session.close()
+    return [p.url for p in found], {p.url: p.source for p in found}, discovery.stats
+
+
+# ---------------------------------------------------------------------------
+# helper functions (module‑level)
+# ---------------------------------------------------------------------------
+
+
+def _site_root(url: str) -> str:
+    parts = urlsplit(url if "://" in url else f"https://{url}")
+    return f"{parts.scheme}://{parts.netloc}/"
+
+
+class _Limited(io.RawIOBase):
+    """Readable that replays *head*, then reads *raw*, and stops after *limit* bytes."""
+
+    def __init__(self, head: bytes, raw, limit: int) -> None:
+        self._head = head
+        self._raw = raw
+        self._left = limit
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buf) -> int:
+        if self._left <= 0:
+            return 0
+        want = min(len(buf), self._left)
+        if self._head:
+            chunk, self._head = self._head[:want], self._head[want:]
+        else:
+            chunk = self._raw.read(want) or b""
+        buf[:len(chunk)] = chunk
+        self._left -= len(chunk)
+        return len(chunk)
+
+
+def _open_stream(raw, max_bytes: int):
+    head = raw.read(2) or b""
+    stream = io.BufferedReader(_Limited(head, raw, max_bytes))
+    if head == b"\x1f\x8b":
+        # .xml.gz served as a file; the limit then applies to the compressed bytes,
+        # so cap the decompressed side as well
+        return io.BufferedReader(_Limited(b"", gzip.GzipFile(fileobj=stream), max_bytes * 4))
+    return stream
+
+
+def _iter_sitemap(stream) -> Iterator[Tuple[str, str, Optional[str], Optional[str]]]:
+    root = None
+    loc = lastmod = title = None
+    for event, elem in ET.iterparse(stream, events=("start", "end")):
+        tag = elem.tag.rsplit("}", 1)[-1]
+        if event == "start":
+            if root is None:
+                root = elem
+            continue
+        if tag == "loc" and loc is None:
+            loc = (elem.text or "").strip()        # the page's own <loc>, not <image:loc>
+        elif tag == "lastmod":
+            lastmod = (elem.text or "").strip() or None
+        elif tag == "title" and title is None:
+            title = (elem.text or "").strip() or None
+        elif tag in ("url", "sitemap"):
+            if loc:
+                yield tag, loc, lastmod, title
+            loc = lastmod = title = None
+            # keep memory flat: drop finished entries from the tree
+            if root is not None:
+                root.clear()
@@ -0,0 +1,99 @@
+import gzip
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from sitemap_discovery import SitemapDiscovery, discover_products
+
+# Serves fixture robots.txt / sitemaps from memory on a local port and runs the
+# sitemap discovery against them: a robots.txt-declared index pointing at a
+# gzipped product sitemap, a site with only /sitemap.xml, and a site without any.
+
+NS = 'xmlns="http://www.sitemaps.org/schemas/sitemap/0.9" xmlns:image="http://www.google.com/schemas/sitemap-image/1.1"'
+
+
+def urlset(base, entries):
+    body = "".join(
+        f"<url><loc>{base}{path}</loc><lastmod>{lastmod}</lastmod>"
+        + (f"<image:image><image:loc>{base}/cdn/{i}.jpg</image:loc><image:title>{title}</image:title></image:image>" if title else "")
+        + "</url>"
+        for i, (path, lastmod, title) in enumerate(entries)
+    )
+    return f'<?xml version="1.0" encoding="UTF-8"?><urlset {NS}>{body}</urlset>'.encode()
+
+
+def index(base, paths):
+    body = "".join(f"<sitemap><loc>{base}{p}</loc></sitemap>" for p in paths)
+    return f'<?xml version="1.0" encoding="UTF-8"?><sitemapindex {NS}>{body}</sitemapindex>'.encode()
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    files = {}
+
+    def do_GET(self):
+        data = self.files.get(self.path.split("?")[0])
+        if data is None:
+            self.send_response(404)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_HEAD(self):
+        self.send_response(200 if self.path.split("?")[0] in self.files else 404)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+server = ThreadingHTTPServer(("127.0.0.1", 0), FixtureHandler)
+threading.Thread(target=server.serve_forever, daemon=True).start()
+port = server.server_address[1]
+
+base = f"http://127.0.0.1:{port}"
+products = [
+    ("/products/trail-running-shoe", "2025-05-01", "Trail Running Shoe"),
+    ("/products/leather-boot", "2025-06-01", "Leather Boot"),
+    ("/products/running-sock-3-pack", "2025-04-01", "Running Sock 3-Pack"),
+    ("/products/leather-boot?variant=2", "2025-06-02", None),
+]
+FixtureHandler.files = {
+    "/robots.txt": f"User-agent: *\nDisallow: /cart\nSitemap: {base}/sitemap.xml\n".encode(),
+    "/sitemap.xml": index(base, ["/sitemap_pages_1.xml", "/sitemap_products_1.xml.gz", "/sitemap_blogs_1.xml"]),
+    "/sitemap_products_1.xml.gz": gzip.compress(urlset(base, products)),
+    "/sitemap_pages_1.xml": urlset(base, [("/pages/about", "2025-01-01", None)]),
+    "/sitemap_blogs_1.xml": urlset(base, [("/blogs/news/launch", "2025-01-01", None)]),
+}
+
+urls, sources, stats = discover_products(base, "Product Categories: running shoes and socks", limit=10)
+print(f"robots.txt + gzipped index: {stats}")
+for url in urls:
+    print(f"  {url}  <- {sources[url]}")
+# both match "running" + shoe/sock, the newer one first; the boot matches nothing
+assert urls == [f"{base}/products/trail-running-shoe", f"{base}/products/running-sock-3-pack", f"{base}/products/leather-boot"], urls
+assert len(urls) == 3, "variant URL must be deduplicated"
+assert stats["sitemaps_read"] == 2, "only the index and the product sitemap should be read"
+
+# no robots.txt sitemap line -> conventional /sitemap.xml at the root
+FixtureHandler.files = {"/sitemap.xml": urlset(base, [("/p/ab12345", "2025-01-01", None), ("/about", "2025-01-01", None)])}
+urls, _, stats = discover_products(base, None)
+print(f"fallback /sitemap.xml: {urls} {stats}")
+assert urls == [f"{base}/p/ab12345"], urls
+
+# nothing published -> empty, the browser crawl takes over
+FixtureHandler.files = {}
+urls, _, stats = discover_products(base, None)
+print(f"no sitemap: {urls} {stats}")
+assert urls == []
+
+# truncated stream: bounded read keeps what was parsed
+big = urlset(base, [(f"/products/item-{i}", "2025-01-01", None) for i in range(20000)])
+FixtureHandler.files = {"/sitemap_products_1.xml": big}
+found = SitemapDiscovery(max_bytes=64 * 1024, max_urls=100000).products(base)
+print(f"truncated at 64 KiB of {len(big) // 1024} KiB: {len(found)} products")
+assert 0 < len(found) < 20000
+
+server.shutdown()
+print("sitemap discovery smoke test passed")
@@ -0,0 +1,138 @@
+# url_tools.py
+from __future__ import annotations
+
+import re
+from typing import Iterable, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urljoin, urlsplit, urlunsplit
+
+# Query parameters that only identify the click, never the page.
+TRACKING_PARAMS = frozenset({
+    "gclid", "gclsrc", "dclid", "gbraid", "wbraid", "fbclid", "msclkid", "yclid", "twclid", "ttclid",
+    "igshid", "mc_cid", "mc_eid", "_ga", "_gl", "_hsenc", "_hsmi", "srsltid", "ref", "ref_", "referrer",
+    "_pos", "_sid", "_ss", "_psq", "_fid", "_kx", "pr_prod_strat", "pr_rec_id", "pr_rec_pid", "pr_ref_pid", "pr_seq",
+})
+TRACKING_PREFIXES = ("utm_", "pk_", "mtm_", "hsa_", "trk_")
+
+# Parameters that pick a variant of the same product page; ignored when deduplicating.
+VARIANT_PARAMS = frozenset({"variant", "variant_id", "variantid", "selectedvariant", "sku", "color", "colour", "size", "option"})
+
+_SKIP_SCHEMES = ("javascript:", "mailto:", "tel:", "sms:", "data:", "blob:", "about:", "file:")
+_DEFAULT_PORTS = {"http": 80, "https": 443}
+# "shop.example.com/products/x" – a host written without a scheme, which urljoin would treat as a path
+_BARE_HOST = re.compile(r"^((?:[a-z0-9-]+\.)+([a-z]{2,}))(?::\d+)?(?:[/?#]|$)", re.I)
+# ...unless the "TLD" is really a file extension of a relative path ("sale.html")
+_FILE_EXTS = frozenset({"html", "htm", "shtml", "php", "asp", "aspx", "jsp", "cfm", "cgi", "xml", "json", "js", "css",
+                        "jpg", "jpeg", "png", "gif", "webp", "svg", "pdf", "txt"})
+_TEMPLATE = re.compile(r"\{\{|\}\}|\$\{|<%|%>|\s")
+
+
+def canonicalize_url(url: str) -> str:
+    """
+    Normalized absolute URL: lower-case scheme and host, no default port, no
+    fragment, no tracking parameters, remaining query parameters sorted.
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if parts.port and parts.port != _DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+    query = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if not _is_tracking(k)]
+    return urlunsplit((scheme, host, parts.path or "/", urlencode(sorted(query)), ""))
+
+
+def url_key(url: str) -> str:
+    """Dedupe key: canonical URL without `www.`, trailing slash or variant parameters."""
+    parts = urlsplit(canonicalize_url(url))
+    host = parts.netloc[4:] if parts.netloc.startswith("www.") else parts.netloc
+    path = parts.path.rstrip("/") or "/"
+    query = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k.lower() not in VARIANT_PARAMS]
+    return urlunsplit(("", host, path, urlencode(query), ""))
+
+
+def resolve_href(base_url: str, href: str) -> Optional[str]:
+    """
+    Canonical absolute URL for *href* found on the page at *base_url*, or None
+    when it is not a navigable http(s) link or is too ambiguous to resolve
+    locally (see `is_ambiguous_href`).
+    """
+    href = (href or "").strip()
+    if not href or href.startswith("#") or href.lower().startswith(_SKIP_SCHEMES):
+        return None
+    host = _bare_host(href)
+    if host is not None and same_site(f"//{host}", base_url):
+        # this site's own host written without a scheme
+        href = f"{urlsplit(base_url).scheme or 'https'}://{href}"
+    elif is_ambiguous_href(href):
+        return None
+    url = urljoin(base_url, href)
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        return None
+    return canonicalize_url(url)
+
+
+def is_ambiguous_href(href: str) -> bool:
+    """True for hrefs urljoin would get wrong: scheme-less hosts and unrendered templates."""
+    href = (href or "").strip()
+    if urlsplit(href).scheme or href.startswith(("/", ".", "?", "#")):
+        return bool(_TEMPLATE.search(href))
+    return bool(_bare_host(href) or _TEMPLATE.search(href))
+
+
+def resolve_links(base_url: str, hrefs: Iterable[str]) -> Tuple[List[str], List[str]]:
+    """
+    Resolve and dedupe the hrefs of one page.
+
+    Returns (urls, ambiguous): canonical URLs in first-seen order, one per
+    distinct page, and the hrefs that need the model to be turned into URLs.
+    Non-navigable hrefs (anchors, mailto:, javascript:) are dropped.
+    """
+    urls: List[str] = []
+    ambiguous: List[str] = []
+    seen = set()
+    for href in hrefs:
+        if not isinstance(href, str):
+            continue
+        url = resolve_href(base_url, href)
+        if url is None:
+            if is_ambiguous_href(href) and href.strip() not in ambiguous:
+                ambiguous.append(href.strip())
+            continue
+        key = url_key(url)
+        if key not in seen:
+            seen.add(key)
+            urls.append(url)
+    return urls, ambiguous
+
+
+def dedupe_urls(urls: Iterable[str]) -> List[str]:
+    """Keep the first URL of each `url_key`, in order."""
+    out: List[str] = []
+    seen = set()
+    for url in urls:
+        key = url_key(url)
+        if key not in seen:
+            seen.add(key)
+            out.append(url)
+    return out
+
+
+def same_site(url: str, base_url: str) -> bool:
+    """True when both URLs share a registrable-looking host (ignoring `www.` and subdomains of the base)."""
+    host = (urlsplit(url).hostname or "").lower().removeprefix("www.")
+    base = (urlsplit(base_url).hostname or "").lower().removeprefix("www.")
+    return "." in host and (host == base or host.endswith("." + base) or base.endswith("." + host))
+
+
+def _bare_host(href: str) -> Optional[str]:
+    if urlsplit(href).scheme or href.startswith(("/", ".", "?", "#")):
+        return None
+    m = _BARE_HOST.match(href)
+    if m is None or m.group(2).lower() in _FILE_EXTS:
+        return None
+    return m.group(1).lower()
+
+
+def _is_tracking(param: str) -> bool:
+    param = param.lower()
+    return param in TRACKING_PARAMS or param.startswith(TRACKING_PREFIXES)
@@ -2,12 +2,25 @@ import os, time, base64, json, requests
 import nest_asyncio, asyncio, contextlib, random, csv, re
 import openai
 import traceback
+import argparse
 
 #  Private-repo imports
-from server_config import append_logs_to_json, get_next_job, update_job_status, SERVER_URL, OPENAI_API_KEY
+from server_config import append_logs_to_json, get_job, get_next_job, update_job_status, JOB_SERVER, SERVER_URL, OPENAI_API_KEY
 from openai_wrapper import ChatGPTWrapper
+from llm_cache import SQLiteCache
+from action_memory import ActionMemory, ActionStore
+from action_trace import TraceStore, trace_from_job
+from criteria_cache import CriteriaCache
+from job_checkpoint import JobCheckpoint
+from artifact_uploader import ArtifactUploader
+from job_lease import LeaseManager
+from job_scheduler import JobScheduler, parse_weights
+from cost_budget import BudgetExceeded, JobBudget
+from model_cascade import ModelCascade
+from link_scorer import summarize_hops
 from automated_browsing.selenium_utility_module import SeleniumAgent
 from automated_browsing.playwright_utility_module import PlaywrightAgent
+from browser_pool import BrowserPool
 
 from agentic_browsing_utils import process_job
 from agentic_browsing_utils import process_verification
@@ -16,117 +29,263 @@ nest_asyncio.apply()      # keeps Colab-style async recursion happy
 
 # TODO: Maintain a text file with job IDs that indicates which jobs have been tried already and can be safely dropped
 
-QUEUE_FAILURE_INTERVAL = 40 # 40 seconds
-NO_PENDING_INTERVAL = 360   # 6 minutes
-JOB_PROCESSED_INTERVAL = 120 # 2 minutes
-EXCEPTION_INTERVAL = 2400 # 40 minutes
+NO_PENDING_INTERVAL = 360   # 6 minutes, upper bound of the idle backoff
+IDLE_BACKOFF_START = 5      # first idle sleep, doubled while the queues stay empty
+LONG_POLL_SECONDS = int(os.environ.get("LONG_POLL_SECONDS", "0"))  # > 0: the server holds the lease/get_job call until a job arrives
+LEASE_TTL = float(os.environ.get("LEASE_TTL", "120"))  # a job whose worker stops heartbeating goes back to its queue after this
+JOB_PROCESSED_INTERVAL = 5  # results upload in the background, the slot is free right away
+HELD_RETRY_BASE = 300       # first retry delay of a failed job, doubled per failure; other jobs keep running
+HELD_RETRY_MAX = 4 * 3600
+JOB_TYPES = ("PENDING", "HELD", "VERIFY")
+STRUCTURED_OUTPUTS = os.environ.get("STRUCTURED_OUTPUTS", "1") != "0"  # one JSON-schema call per product question group
+JOB_BUDGET_USD = float(os.environ.get("JOB_BUDGET_USD", "3.0"))  # per job across all models; 0 = no limit, ledger only
+
+# Shared by every job on this worker so HELD retries reuse earlier answers
+LLM_CACHE = SQLiteCache(os.environ.get("LLM_CACHE_PATH", "./job_artifacts/llm_cache.sqlite3"))
+# Element attributes that worked per shop, tried before asking the LLM again
+ACTION_STORE = ActionStore(os.environ.get("ACTION_MEMORY_PATH", "./job_artifacts/action_memory.sqlite3"))
+# Replayable action traces of successful jobs, used by VERIFY jobs
+TRACES = TraceStore(os.environ.get("TRACE_DIR", "./job_artifacts/traces"))
+# Verified Phase 1 criteria per (domain, promo, description); HELD retries skip Phase 1
+CRITERIA = CriteriaCache(SQLiteCache(os.environ.get("CRITERIA_CACHE_PATH", "./job_artifacts/criteria_cache.sqlite3"), ttl=float(os.environ.get("CRITERIA_TTL", 3 * 24 * 3600))))
+# Status updates and their artifacts, spooled to disk and streamed to the server off the job slot
+UPLOADS = ArtifactUploader(spool_dir=os.environ.get("UPLOAD_SPOOL_DIR", "./job_artifacts/outbox"))
+# Yes/no and selection prompts try a cheap model first (LLM_CASCADE=0 turns it off); shared so escalation rates cover all jobs
+CASCADE = ModelCascade(threshold=int(os.environ.get("CASCADE_THRESHOLD", "80"))) if os.environ.get("LLM_CASCADE", "1") != "0" else None
+# Which queue goes next (weighted by JOB_WEIGHTS, e.g. "PENDING=3,HELD=1,VERIFY=2") and per-job HELD backoff
+SCHEDULER = JobScheduler(parse_weights(os.environ.get("JOB_WEIGHTS", "")), retry_base=HELD_RETRY_BASE, retry_max=HELD_RETRY_MAX)
 
 # ------------------------------------------------------------------------------
 #  Async wrapper that runs the complete Agentic pipeline for new jobs
 # ------------------------------------------------------------------------------
 
-async def run_full_agentic_pipeline(url_val, desc, promo):
+def job_artifact_stem(promo, job_id=None):
+    # job_id keeps concurrent jobs for the same promo from sharing a folder
+    tag = f"{promo}_{job_id}" if job_id is not None else f"{promo}"
+    return f"./job_artifacts/{tag}_{int(time.time())}/"
+
+
+async def run_full_agentic_pipeline(url_val, desc, promo, job_id=None, browser_pool=None, checkpoint=None):
     agent_s = SeleniumAgent()
     agent_p = PlaywrightAgent(headless=True)
 
     # unique folder for this job's screenshots/logs
-    agent_p.path_stem = f"./job_artifacts/{promo}_{int(time.time())}/"
+    agent_p.path_stem = job_artifact_stem(promo, job_id)
     os.makedirs(agent_p.path_stem, exist_ok=True)
+    agent_p.action_memory = ActionMemory(ACTION_STORE)
         
-    shopping_agent = ChatGPTWrapper(default_model="o4-mini-2025-04-16", api_key=OPENAI_API_KEY)
-    verifier_agent = ChatGPTWrapper(default_model="o1-2024-12-17", api_key=OPENAI_API_KEY)
+    # one budget for both agents; models get cheaper as it runs out
+    budget = JobBudget(JOB_BUDGET_USD)
+    shopping_agent = ChatGPTWrapper(default_model="o4-mini-2025-04-16", api_key=OPENAI_API_KEY, response_cache=LLM_CACHE, budget=budget)
+    verifier_agent = ChatGPTWrapper(default_model="o1-2024-12-17", api_key=OPENAI_API_KEY, response_cache=LLM_CACHE, budget=budget)
+    shopping_agent.cascade = verifier_agent.cascade = CASCADE
+    shopping_agent.structured_outputs = STRUCTURED_OUTPUTS
     
-    status, output_dict, image_path = await process_job( url_val, desc, promo, agent_s, agent_p, shopping_agent, verifier_agent )
+    if browser_pool is not None:
+        async with browser_pool.lease() as lease:
+            browser_pool.bind(agent_p, lease)
+            promo_applied, promo_criteria, added_products, fin_out, pre_promo_img, apply_promo_img = await process_job( url_val, desc, promo, agent_s, agent_p, shopping_agent, verifier_agent, criteria_cache=CRITERIA, checkpoint=checkpoint )
+    else:
+        promo_applied, promo_criteria, added_products, fin_out, pre_promo_img, apply_promo_img = await process_job( url_val, desc, promo, agent_s, agent_p, shopping_agent, verifier_agent, criteria_cache=CRITERIA, checkpoint=checkpoint )
+
+    status = "PROCESSED"
+    output_dict = {
+        "promo_applied": promo_applied,
+        "promo_criteria": promo_criteria,
+        "added_products": added_products,
+        "fin_out": fin_out,
+    }
+    image_path = apply_promo_img or None
+    output_dict['readiness_saved_seconds'] = round(getattr(agent_p, "readiness_saved", 0.0), 1)
+    output_dict['link_discovery'] = summarize_hops(getattr(agent_p, "crawl_hops", []))
+    output_dict['link_discovery']['sitemap'] = getattr(agent_p, "sitemap_stats", {})
+    output_dict['link_discovery']['crawl'] = getattr(agent_p, "crawl_summary", {})
+    output_dict['action_memory'] = agent_p.action_memory.summary()
+    output_dict['resumed_phases'] = checkpoint.resumed if checkpoint is not None else []
+    output_dict['criteria_cache'] = dict(CRITERIA.report(), hit=getattr(agent_p, "criteria_cached", False))
+    output_dict['llm_cache'] = {"shopping": shopping_agent.cache_stats, "verifier": verifier_agent.cache_stats}
+    output_dict['image_tokens'] = {"shopping": shopping_agent.image_token_stats, "verifier": verifier_agent.image_token_stats}
+    output_dict['cost'] = budget.report()
+    output_dict['cascade'] = CASCADE.report() if CASCADE is not None else None
     output_dict['agent_p_log'] = agent_p.call_log
 
+    trace = getattr(agent_p, "trace", None)
+    if trace is not None and trace.complete:
+        output_dict['trace'] = trace.to_dict()
+        TRACES.save(trace)
+
     return status, output_dict, image_path
 
 # ------------------------------------------------------------------------------
 #  Async wrapper that runs the Agentic pipeline for re-verification
 # ------------------------------------------------------------------------------
 
-async def run_verif_agentic_pipeline(url_val, desc, promo):
-    agent_s = SeleniumAgent()
+async def run_verif_agentic_pipeline(url_val, desc, promo, job_id=None, browser_pool=None, job=None):
+    # replay the trace of an earlier successful run; without one, rerun everything
+    trace = trace_from_job(job or {}) or TRACES.load(url_val, promo)
+    if trace is None:
+        print(f"no action trace for {url_val} / {promo}, running the full pipeline")
+        return await run_full_agentic_pipeline(url_val, desc, promo, job_id, browser_pool)
+
     agent_p = PlaywrightAgent(headless=True)
 
     # unique folder for this job's screenshots/logs
-    agent_p.path_stem = f"./job_artifacts/{promo}_{int(time.time())}/"
+    agent_p.path_stem = job_artifact_stem(promo, job_id)
     os.makedirs(agent_p.path_stem, exist_ok=True)
+    agent_p.action_memory = ActionMemory(ACTION_STORE)
         
-    shopping_agent = ChatGPTWrapper(default_model="o4-mini-2025-04-16", api_key=OPENAI_API_KEY)
-    verifier_agent = ChatGPTWrapper(default_model="o1-2024-12-17", api_key=OPENAI_API_KEY)
-    
-    status, output_dict, image_path = "VERIFY", {}, None
-    # status, output_dict, image_path = await process_verif_job( url_val, desc, promo, agent_s, agent_p, shopping_agent, verifier_agent )
+    # one budget for both agents; models get cheaper as it runs out
+    budget = JobBudget(JOB_BUDGET_USD)
+    shopping_agent = ChatGPTWrapper(default_model="o4-mini-2025-04-16", api_key=OPENAI_API_KEY, response_cache=LLM_CACHE, budget=budget)
+    verifier_agent = ChatGPTWrapper(default_model="o1-2024-12-17", api_key=OPENAI_API_KEY, response_cache=LLM_CACHE, budget=budget)
+    shopping_agent.cascade = verifier_agent.cascade = CASCADE
     
+    if browser_pool is not None:
+        async with browser_pool.lease() as lease:
+            browser_pool.bind(agent_p, lease)
+            promo_applied, promo_criteria, fin_out, pre_promo_img, apply_promo_img, replay = await process_verification( url_val, desc, promo, agent_p, shopping_agent, verifier_agent, trace )
+    else:
+        promo_applied, promo_criteria, fin_out, pre_promo_img, apply_promo_img, replay = await process_verification( url_val, desc, promo, agent_p, shopping_agent, verifier_agent, trace )
+
+    status = "PROCESSED"
+    output_dict = {
+        "promo_applied": promo_applied,
+        "promo_criteria": promo_criteria,
+        "fin_out": fin_out,
+        "verification": replay,
+    }
+    image_path = apply_promo_img or None
+    output_dict['action_memory'] = agent_p.action_memory.summary()
+    output_dict['llm_cache'] = {"shopping": shopping_agent.cache_stats, "verifier": verifier_agent.cache_stats}
+    output_dict['cost'] = budget.report()
+    output_dict['cascade'] = CASCADE.report() if CASCADE is not None else None
     output_dict['agent_p_log'] = agent_p.call_log
 
     return status, output_dict, image_path
 
 
+# ------------------------------------------------------------------------------
+#  Single job: run the pipeline and report back, never raises
+# ------------------------------------------------------------------------------
+
+async def handle_job(job_type, job, browser_pool=None, lease=None, leases=None):
+    """
+    Process one already-QUEUED (leased) job and report the result. Returns the
+    number of seconds this slot should rest before taking another job. The
+    lease is kept alive until the status upload has gone through.
+    """
+    job_id = job["job_id"]
+    checkpoint = None
+    timing = SCHEDULER.started(lease) if lease is not None else {}
+    started = time.monotonic()
+    try:
+        url_val     = job["url"]
+        description = job.get("description", "")
+        promo_code  = job["promo_code"]
+        if job.get("refresh_criteria"):
+            CRITERIA.invalidate(url_val, promo_code, description)
+
+        if job_type == 'VERIFY':
+            status, output_dict, image_path = await run_verif_agentic_pipeline(url_val, description, promo_code, job_id, browser_pool, job)
+        else:
+            # phase outputs of an earlier (HELD) attempt of this job, if any
+            checkpoint = JobCheckpoint.for_job(job_id, url_val, promo_code, description)
+            status, output_dict, image_path = await run_full_agentic_pipeline(url_val, description, promo_code, job_id, browser_pool, checkpoint)
+        SCHEDULER.finished(job_type, time.monotonic() - started)
+        SCHEDULER.succeeded(job_id)
+        output_dict['scheduling'] = dict(timing, job_type=job_type, **SCHEDULER.report())
+
+        # the uploader spools the result (images straight from the image store) and sends it off this slot
+        upload = UPLOADS.submit(job_id, status, text=output_dict, image_path=image_path)
+        if leases is not None:
+            leases.finish_when(lease, upload)
+        if checkpoint is not None:
+            upload.add_done_callback(lambda f: f.result() and checkpoint.clear())
+        return JOB_PROCESSED_INTERVAL
+
+    except Exception as exc:
+        error_message = str(exc)
+        error_trace = traceback.format_exc()
+
+        print(f"processing error ({job_id}):", error_message)
+        print("full traceback:", error_trace)
+
+        # only this job waits; the slot takes other work right away
+        SCHEDULER.finished(job_type, time.monotonic() - started)
+        retry_after = SCHEDULER.failed(job_id)
+
+        out_dict = {
+            "error": error_message,
+            "traceback": error_trace,
+            "retry_after": round(retry_after),
+        }
+        if isinstance(exc, BudgetExceeded):
+            # stopped before the next model call; the checkpoint keeps the finished phases
+            out_dict["cost"] = exc.report
+
+        upload = UPLOADS.submit(job_id, "HELD", text=out_dict)
+        if leases is not None:
+            leases.finish_when(lease, upload)
+        return JOB_PROCESSED_INTERVAL
+
+
+async def _job_slot(slots, lease, leases, browser_pool=None):
+    # Holds its semaphore slot through the cool-down so a failing job only idles itself
+    try:
+        rest = await handle_job(lease.job_type, lease.job, browser_pool, lease, leases)
+        await asyncio.sleep(rest)
+    finally:
+        slots.release()
+
+
 # ------------------------------------------------------------------------------
 #  Main loop  – minimal, no logging
 # ------------------------------------------------------------------------------
-def main():
+async def run_worker(concurrency=1, pooled_browser=True):
+    """
+    Lease jobs from the server and keep up to `concurrency` of them running on
+    this event loop. Each job owns its own browser context and artifact folder;
+    the LLM and server calls are non-blocking so the slots interleave while they
+    wait. With `pooled_browser`, Chromium is started once and shared through a
+    BrowserPool. Leases are renewed by heartbeat while their job runs and the
+    next batch is leased ahead of time, so a freed slot starts right away. The
+    scheduler decides which of PENDING / HELD / VERIFY is served next.
+    """
+    UPLOADS.start()  # also re-sends results a previous run left spooled
+    leases = await LeaseManager(JOB_SERVER, JOB_TYPES, prefetch=concurrency, ttl=LEASE_TTL, wait=LONG_POLL_SECONDS,
+                                idle_start=IDLE_BACKOFF_START, idle_max=NO_PENDING_INTERVAL, scheduler=SCHEDULER).start()
+    browser_pool = await BrowserPool(size=concurrency, headless=True).start() if pooled_browser else None
+    try:
+        await _poll_jobs(concurrency, leases, browser_pool)
+    finally:
+        await leases.close()
+        if browser_pool is not None:
+            await browser_pool.close()
+        await asyncio.to_thread(UPLOADS.drain, 60)
+
+
+async def _poll_jobs(concurrency, leases, browser_pool=None):
+    slots = asyncio.Semaphore(concurrency)
+    running = set()
+
     while True:
-        job_found = False
-        
-        # Get jobs, try to queue them then execute. different functions for pending/held or verify
-        #for job_type in ["PENDING", "HELD", "VERIFY"]:
-        
-        for job_type in ["PENDING", "HELD"]:
-            job = get_job(job_type) # Try to get a job of selected type
-            
-            if not job:
-                # try the next job type
-                time.sleep(4)
-                continue
-            
-            job_found = True
-            break
-        
-        # Completed checking for jobs, loop back if none found
-        if not job_found:
-            time.sleep(NO_PENDING_INTERVAL)
-            continue
-        
-        # Try to lock a found job
-        job_id = job["job_id"] # This is certain to be included, because the check gets made during get_job
-        if not update_job_status(job_id, "QUEUED"):
-            # wait for some time on failing to queue the job
-            time.sleep(QUEUE_FAILURE_INTERVAL)
-            continue
-
-        # If all went fine, then try to process the job with a safe try except block
-        try:
-            url_val     = job["url"]
-            description = job.get("description", "")
-            promo_code  = job["promo_code"]
-
-            if job_type == 'VERIFY':
-                status, output_dict, image_path = await run_verif_agentic_pipeline(url_val, description, promo_code)
-            else:
-                status, output_dict, image_path = await run_full_agentic_pipeline(url_val, description, promo_code)
-            
-            update_job_status(job_id, status, text=output_dict, image_path=image_path)
-            time.sleep(JOB_PROCESSED_INTERVAL)
-            
-        except Exception as exc:
-            time.sleep(EXCEPTION_INTERVAL)
-            error_message = str(exc)
-            error_trace = traceback.format_exc()
-        
-            print("processing error:", error_message)
-            print("full traceback:", error_trace)
-        
-            out_dict = {
-                "error": error_message,
-                "traceback": error_trace
-            }
-        
-            update_job_status(job_id, "HELD", out_dict)
+        await slots.acquire()
+        # already leased (prefetched) while the previous job was finishing
+        lease = await leases.next()
+
+        # Hand the leased job to its own task; the slot is released when it finishes
+        task = asyncio.create_task(_job_slot(slots, lease, leases, browser_pool))
+        running.add(task)
+        task.add_done_callback(running.discard)
+
 
+def main(concurrency=1, pooled_browser=True):
+    asyncio.run(run_worker(concurrency, pooled_browser))
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Agentic Shopper worker node")
+    parser.add_argument("--concurrency", type=int, default=1, help="number of jobs to run at once on this worker")
+    parser.add_argument("--no-browser-pool", action="store_true", help="launch a separate browser for every job")
+    args = parser.parse_args()
+    main(concurrency=max(1, args.concurrency), pooled_browser=not args.no_browser_pool)